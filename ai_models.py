@@ -7,7 +7,9 @@ from sklearn.model_selection import train_test_split
 import pickle
 import os
 
-class IrrigationModel:
+from model_artifacts import LazyArtifactMixin, artifact_path_for, save_artifact
+
+class IrrigationModel(LazyArtifactMixin):
     """Modèle IA pour prédire l'irrigation"""
     
     def __init__(self):
@@ -112,9 +114,25 @@ class IrrigationModel:
                 'is_trained': self.is_trained
             }, f)
         print(f"   💾 Modèle sauvegardé: {path}")
+        save_artifact(
+            artifact_path_for(path),
+            objects={
+                'classifier': self.classifier,
+                'regressor': self.regressor,
+                'label_encoder': self.label_encoder
+            },
+            meta={'is_trained': self.is_trained}
+        )
     
     def load(self, path='models/irrigation_model.pkl'):
         """Charge le modèle"""
+        meta = self._load_lazy_artifact(path)
+        if meta is not None:
+            # Estimateurs reconstruits au premier accès (tableaux mappés en mémoire)
+            self.is_trained = meta['is_trained']
+            print(f"   📂 Modèle chargé (artefact): {self._lazy_artifact.directory}")
+            return
+        
         with open(path, 'rb') as f:
             data = pickle.load(f)
             self.classifier = data['classifier']
@@ -124,7 +142,7 @@ class IrrigationModel:
         print(f"   📂 Modèle chargé: {path}")
 
 
-class DiseaseDetectionModel:
+class DiseaseDetectionModel(LazyArtifactMixin):
     """Modèle IA pour détecter les maladies"""
     
     def __init__(self):
@@ -194,9 +212,23 @@ class DiseaseDetectionModel:
                 'is_trained': self.is_trained
             }, f)
         print(f"   💾 Modèle sauvegardé: {path}")
+        save_artifact(
+            artifact_path_for(path),
+            objects={
+                'model': self.model
+            },
+            meta={'is_trained': self.is_trained}
+        )
     
     def load(self, path='models/disease_model.pkl'):
         """Charge le modèle"""
+        meta = self._load_lazy_artifact(path)
+        if meta is not None:
+            # Estimateurs reconstruits au premier accès (tableaux mappés en mémoire)
+            self.is_trained = meta['is_trained']
+            print(f"   📂 Modèle chargé (artefact): {self._lazy_artifact.directory}")
+            return
+        
         with open(path, 'rb') as f:
             data = pickle.load(f)
             self.model = data['model']
@@ -204,7 +236,7 @@ class DiseaseDetectionModel:
         print(f"   📂 Modèle chargé: {path}")
 
 
-class ExportRecommendationModel:
+class ExportRecommendationModel(LazyArtifactMixin):
     """Modèle pour recommander cultures et exports"""
     
     def __init__(self):
@@ -336,9 +368,27 @@ class ExportRecommendationModel:
                 'is_trained': self.is_trained
             }, f)
         print(f"   💾 Modèle sauvegardé: {path}")
+        save_artifact(
+            artifact_path_for(path),
+            objects={
+                'culture_model': self.culture_model,
+                'pays_model': self.pays_model,
+                'label_encoder_sol': self.label_encoder_sol,
+                'label_encoder_region': self.label_encoder_region,
+                'label_encoder_culture': self.label_encoder_culture
+            },
+            meta={'is_trained': self.is_trained}
+        )
     
     def load(self, path='models/export_model.pkl'):
         """Charge le modèle"""
+        meta = self._load_lazy_artifact(path)
+        if meta is not None:
+            # Estimateurs reconstruits au premier accès (tableaux mappés en mémoire)
+            self.is_trained = meta['is_trained']
+            print(f"   📂 Modèle chargé (artefact): {self._lazy_artifact.directory}")
+            return
+        
         with open(path, 'rb') as f:
             data = pickle.load(f)
             self.culture_model = data['culture_model']
@@ -8,9 +8,12 @@ from sklearn.neural_network import MLPClassifier, MLPRegressor
 import pickle
 import os
 import warnings
+
+from model_artifacts import LazyArtifactMixin, artifact_path_for, save_artifact
+
 warnings.filterwarnings('ignore')
 
-class AdvancedIrrigationModel:
+class AdvancedIrrigationModel(LazyArtifactMixin):
     """Modèle IA ULTRA-PUISSANT pour l'irrigation avec Feature Engineering"""
     
     def __init__(self):
@@ -203,9 +206,27 @@ class AdvancedIrrigationModel:
                 'is_trained': self.is_trained
             }, f)
         print(f"   💾 Modèle avancé sauvegardé: {path}")
+        save_artifact(
+            artifact_path_for(path),
+            objects={
+                'classifier': self.classifier,
+                'regressor': self.regressor,
+                'label_encoder': self.label_encoder,
+                'scaler': self.scaler
+            },
+            meta={'feature_cols': self.feature_cols, 'is_trained': self.is_trained}
+        )
     
     def load(self, path='models/irrigation_model_advanced.pkl'):
         """Charge le modèle"""
+        meta = self._load_lazy_artifact(path)
+        if meta is not None:
+            # Estimateurs reconstruits au premier accès (tableaux mappés en mémoire)
+            self.is_trained = meta['is_trained']
+            self.feature_cols = meta['feature_cols']
+            print(f"   📂 Modèle avancé chargé (artefact): {self._lazy_artifact.directory}")
+            return
+        
         with open(path, 'rb') as f:
             data = pickle.load(f)
             self.classifier = data['classifier']
@@ -217,7 +238,7 @@ class AdvancedIrrigationModel:
         print(f"   📂 Modèle avancé chargé: {path}")
 
 
-class AdvancedDiseaseDetectionModel:
+class AdvancedDiseaseDetectionModel(LazyArtifactMixin):
     """Modèle IA ULTRA-PUISSANT pour la détection de maladies"""
     
     def __init__(self):
@@ -348,9 +369,25 @@ class AdvancedDiseaseDetectionModel:
                 'is_trained': self.is_trained
             }, f)
         print(f"   💾 Modèle avancé sauvegardé: {path}")
+        save_artifact(
+            artifact_path_for(path),
+            objects={
+                'model': self.model,
+                'scaler': self.scaler
+            },
+            meta={'feature_cols': self.feature_cols, 'is_trained': self.is_trained}
+        )
     
     def load(self, path='models/disease_model_advanced.pkl'):
         """Charge"""
+        meta = self._load_lazy_artifact(path)
+        if meta is not None:
+            # Estimateurs reconstruits au premier accès (tableaux mappés en mémoire)
+            self.is_trained = meta['is_trained']
+            self.feature_cols = meta['feature_cols']
+            print(f"   📂 Modèle avancé chargé (artefact): {self._lazy_artifact.directory}")
+            return
+        
         with open(path, 'rb') as f:
             data = pickle.load(f)
             self.model = data['model']
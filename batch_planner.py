@@ -0,0 +1,167 @@
+"""
+Feralyx V2.0 - Regroupement des requêtes satellite de parcelles voisines
+Les bbox proches sont fusionnées en un raster couvrant par groupe ; les
+statistiques de chaque parcelle sont ensuite extraites en une passe
+(image d'étiquettes + np.bincount)
+"""
+
+import numpy as np
+
+from sentinel_rasters import BAND_NAMES, DN_SCALE, INDEX_BANDS, SENTINEL_BANDS, index_rasters
+
+# Côté maximal d'une requête Sentinel Hub (pixels)
+MAX_REQUEST_SIDE_PX = 2500
+METERS_PER_DEGREE = 111000.0
+
+
+def plan_batches(bboxes, resolution=10, max_gap_m=200.0, max_side_px=MAX_REQUEST_SIDE_PX):
+    """
+    Regroupe les bbox voisines en requêtes couvrantes
+
+    Deux bbox distantes de moins de max_gap_m sont dans le même groupe
+    (liaison simple, par balayage trié sur la longitude) ; un groupe dont
+    le raster couvrant dépasserait max_side_px pixels de côté est coupé
+    récursivement à la médiane des centres le long de son grand axe.
+
+    Args:
+        bboxes: liste ou tableau (n, 4) de [min_lon, min_lat, max_lon, max_lat]
+        resolution: résolution en mètres
+        max_gap_m: écart maximal entre deux parcelles d'un même groupe
+        max_side_px: côté maximal du raster couvrant
+
+    Returns:
+        liste de dicts {'bbox': bbox couvrante, 'members': indices des parcelles}
+    """
+    boxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+    n = len(boxes)
+    if not n:
+        return []
+    cos_lat = np.cos(np.radians((boxes[:, 1] + boxes[:, 3]).mean() / 2))
+    gap_lat = max_gap_m / METERS_PER_DEGREE
+    gap_lon = gap_lat / cos_lat
+
+    parent = np.arange(n)
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # Balayage : seules les bbox qui commencent avant la fin (élargie) de i sont candidates
+    order = np.argsort(boxes[:, 0], kind='stable')
+    sorted_boxes = boxes[order]
+    reach = np.searchsorted(sorted_boxes[:, 0], sorted_boxes[:, 2] + gap_lon, side='right')
+    for a in range(n):
+        candidates = np.arange(a + 1, reach[a])
+        if not len(candidates):
+            continue
+        near = ((sorted_boxes[candidates, 1] <= sorted_boxes[a, 3] + gap_lat)
+                & (sorted_boxes[candidates, 3] >= sorted_boxes[a, 1] - gap_lat))
+        root_a = find(order[a])
+        for b in order[candidates[near]]:
+            root_b = find(b)
+            if root_b != root_a:
+                parent[root_b] = root_a
+
+    roots = np.array([find(i) for i in range(n)])
+    batches = []
+    for root in np.unique(roots):
+        batches.extend(_split(boxes, np.flatnonzero(roots == root), resolution, max_side_px))
+    return batches
+
+
+def _split(boxes, members, resolution, max_side_px):
+    cover = np.array([boxes[members, 0].min(), boxes[members, 1].min(),
+                      boxes[members, 2].max(), boxes[members, 3].max()])
+    height, width = raster_shape(cover, resolution)
+    if max(height, width) <= max_side_px or len(members) == 1:
+        return [{'bbox': cover.tolist(), 'members': members}]
+    axis = 1 if height >= width else 0
+    centers = (boxes[members, axis] + boxes[members, axis + 2]) / 2
+    order = members[np.argsort(centers, kind='stable')]
+    half = len(order) // 2
+    return (_split(boxes, np.sort(order[:half]), resolution, max_side_px)
+            + _split(boxes, np.sort(order[half:]), resolution, max_side_px))
+
+
+def raster_shape(bbox, resolution=10):
+    """Dimensions (h, w) en pixels d'une bbox (même convention que synthetic_bands)"""
+    lat_center = (bbox[1] + bbox[3]) / 2
+    height = max(1, int(round((bbox[3] - bbox[1]) * METERS_PER_DEGREE / resolution)))
+    width = max(1, int(round((bbox[2] - bbox[0]) * METERS_PER_DEGREE
+                             * np.cos(np.radians(lat_center)) / resolution)))
+    return height, width
+
+
+def label_image(cover, shape, bboxes):
+    """
+    Image d'étiquettes d'un raster couvrant (0 = hors parcelle)
+
+    La parcelle k reçoit l'étiquette k + 1 sur les pixels dont le centre
+    tombe dans sa bbox ; ligne 0 = nord. Les parcelles sont peintes par
+    surface décroissante : sur un recouvrement la plus petite l'emporte,
+    si bien qu'une parcelle incluse dans une plus grande garde ses
+    pixels. Une parcelle plus petite qu'un pixel garde le pixel de son
+    centre, sauf s'il revient à une parcelle encore plus petite.
+    """
+    height, width = shape
+    min_lon, min_lat, max_lon, max_lat = cover
+    labels = np.zeros(shape, dtype=np.int32)
+    pixel_lat = (max_lat - min_lat) / height
+    pixel_lon = (max_lon - min_lon) / width
+    boxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+    area = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    for k in np.argsort(-area, kind='stable'):
+        x0, y0, x1, y1 = boxes[k]
+        row0 = int(np.clip(np.ceil((max_lat - y1) / pixel_lat - 0.5), 0, height - 1))
+        row1 = int(np.clip(np.floor((max_lat - y0) / pixel_lat - 0.5), row0, height - 1))
+        col0 = int(np.clip(np.ceil((x0 - min_lon) / pixel_lon - 0.5), 0, width - 1))
+        col1 = int(np.clip(np.floor((x1 - min_lon) / pixel_lon - 0.5), col0, width - 1))
+        labels[row0:row1 + 1, col0:col1 + 1] = k + 1
+    return labels
+
+
+def zonal_statistics(data, labels, n_zones, bands=SENTINEL_BANDS, indices=INDEX_BANDS):
+    """
+    Statistiques par parcelle d'un raster de bandes, en une passe
+
+    Chaque somme par zone est un np.bincount pondéré sur l'image
+    d'étiquettes aplatie ; les indices viennent de index_rasters (NaN hors
+    pixels valides, exclus des moyennes).
+
+    Args:
+        data: raster (h, w, n_bandes) en DN
+        labels: image d'étiquettes (0 = ignoré, 1..n_zones)
+        n_zones: nombre de parcelles
+
+    Returns:
+        dict de tableaux (n_zones,) : moyenne et écart-type de chaque indice
+        ('ndvi', 'ndvi_std'...), réflectance moyenne par bande ('red'...),
+        'n_pixels' et 'valid_ratio'
+    """
+    flat_labels = labels.ravel()
+    size = n_zones + 1
+    n_pixels = np.bincount(flat_labels, minlength=size)
+    rasters, _, _ = index_rasters(data, bands, indices)
+
+    stats = {'n_pixels': n_pixels[1:]}
+    valid_pixels = np.bincount(flat_labels, weights=data.any(axis=2).ravel(), minlength=size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for k, band in enumerate(bands):
+            sums = np.bincount(flat_labels, weights=data[:, :, k].ravel(), minlength=size)
+            stats[BAND_NAMES.get(band, band)] = (sums / valid_pixels / DN_SCALE)[1:]
+
+        for name, raster in rasters.items():
+            values = raster.ravel()
+            valid = ~np.isnan(values)
+            zone = flat_labels[valid]
+            v = values[valid].astype(np.float64)
+            count = np.bincount(zone, minlength=size)
+            mean = np.bincount(zone, weights=v, minlength=size) / count
+            square = np.bincount(zone, weights=v * v, minlength=size) / count
+            stats[name] = mean[1:]
+            stats[f'{name}_std'] = np.sqrt(np.maximum(square - mean ** 2, 0.0))[1:]
+            stats[f'{name}_valid_ratio'] = (count / n_pixels)[1:]
+        stats['valid_ratio'] = (valid_pixels / n_pixels)[1:]
+    return stats
@@ -0,0 +1,64 @@
+"""
+Feralyx V2.0 - Benchmark des modes d'entraînement satellite
+Compare temps d'entraînement et R² (jeu de test) : estimateurs exacts
+historiques vs boosting par histogrammes
+"""
+
+import argparse
+import time
+
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
+
+from satellite_analyzer import SatelliteParcelAnalyzer, SATELLITE_MODELS, build_satellite_model
+
+
+def benchmark_training_modes(n_parcels=200000, test_size=0.2, modes=('exact', 'hist'), random_state=0):
+    """
+    Entraîne chaque modèle satellite dans chaque mode sur le même jeu
+
+    Args:
+        n_parcels: nombre de parcelles synthétiques
+        test_size: part réservée au calcul du R²
+        modes: modes à comparer
+        random_state: graine des données et du découpage
+
+    Returns:
+        liste de dicts (modele, mode, fit_seconds, r2_test)
+    """
+    analyzer = SatelliteParcelAnalyzer()
+    df = analyzer.generate_training_data(n_parcels, output_path=None, random_state=random_state)
+
+    X = analyzer._build_feature_matrix(df)
+    X_train, X_test, idx_train, idx_test = train_test_split(
+        X, df.index.to_numpy(), test_size=test_size, random_state=random_state
+    )
+    scaler = StandardScaler().fit(X_train)
+    X_train = scaler.transform(X_train)
+    X_test = scaler.transform(X_test)
+
+    results = []
+    for name, target, *_ in SATELLITE_MODELS:
+        y = df[target].to_numpy()
+        for mode in modes:
+            model = build_satellite_model(name, mode=mode)
+            start = time.perf_counter()
+            model.fit(X_train, y[idx_train])
+            fit_seconds = time.perf_counter() - start
+            r2 = model.score(X_test, y[idx_test])
+            results.append({'modele': name, 'mode': mode, 'fit_seconds': fit_seconds, 'r2_test': r2})
+            print(f"   {name:<18} {mode:<6} {fit_seconds:8.1f}s   R² test {r2*100:6.2f}%")
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark des modes d'entraînement satellite")
+    parser.add_argument('--parcels', type=int, default=200000, help="nombre de parcelles synthétiques")
+    parser.add_argument('--modes', nargs='+', default=['exact', 'hist'], help="modes à comparer")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print(f"⏱️ BENCHMARK ENTRAÎNEMENT SATELLITE ({args.parcels} parcelles)")
+    print("=" * 70)
+    benchmark_training_modes(args.parcels, modes=args.modes)
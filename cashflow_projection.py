@@ -0,0 +1,265 @@
+"""
+Feralyx V2.0 - Projection pluriannuelle des flux de trésorerie (VAN / TRI)
+Tenseur parcelles x scénarios x années calculé en NumPy, résumé par
+percentiles pour une région entière
+"""
+
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from satellite_analyzer import CULTURES
+
+# Coût d'exploitation annuel en part de la valeur d'acquisition (comme analyze_parcel)
+OPERATING_COST_RATE = 0.08
+
+# Paramètres d'un scénario (valeurs par défaut) :
+# price_factor / yield_factor = niveau des prix de vente / rendements en
+# année 1, *_growth = évolution annuelle, land_growth = appréciation du
+# foncier (valeur de revente en dernière année), culture_prices =
+# multiplicateurs de prix par culture
+SCENARIO_DEFAULTS = {
+    'price_factor': 1.0,
+    'price_growth': 0.0,
+    'yield_factor': 1.0,
+    'yield_growth': 0.0,
+    'cost_growth': 0.0,
+    'land_growth': 0.0,
+    'culture_prices': {},
+}
+
+DEFAULT_SCENARIOS = {
+    'central': {'price_growth': 0.02, 'yield_growth': 0.005, 'cost_growth': 0.02, 'land_growth': 0.02},
+    'prix_bas': {'price_factor': 0.8, 'cost_growth': 0.02, 'land_growth': 0.01},
+    'prix_haut': {'price_factor': 1.15, 'price_growth': 0.03, 'cost_growth': 0.02, 'land_growth': 0.03},
+    'secheresse': {'yield_factor': 0.75, 'yield_growth': -0.01, 'price_growth': 0.02,
+                   'cost_growth': 0.02, 'land_growth': 0.0},
+    'inflation_couts': {'price_growth': 0.02, 'cost_growth': 0.05, 'land_growth': 0.02},
+}
+
+PROJECTION_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def project_cashflows(results, scenarios=None, years=15, discount_rate=0.06,
+                      percentiles=PROJECTION_PERCENTILES, terminal_value=True, chunk_size=50000):
+    """
+    Projette les flux annuels de chaque parcelle sous plusieurs scénarios
+
+    Flux de l'année t (t = 1..years), pour chaque parcelle p et scénario s :
+        gain_annuel_brut[p] x prix[s, t] x rendement[s, t] x prix_culture[s, culture[p]]
+        - valeur_totale[p] x OPERATING_COST_RATE x coûts[s, t]
+    plus, en dernière année, la revente du foncier (valeur_totale x
+    (1 + land_growth)^years) si terminal_value. L'achat (valeur_totale)
+    est décaissé en année 0.
+
+    Le tenseur (parcelles, scénarios, années) est construit par diffusion
+    NumPy, par blocs de chunk_size parcelles pour borner la mémoire. Le TRI
+    est résolu pour toutes les paires (parcelle, scénario) à la fois par
+    Newton sécurisé par encadrement (bissection si le pas sort de
+    l'intervalle).
+
+    Args:
+        results: DataFrame ou tableau structuré d'analyze_parcels
+                 (valeur_totale, gain_annuel_brut, culture_recommandee)
+        scenarios: dict {nom: paramètres} (voir SCENARIO_DEFAULTS), défaut DEFAULT_SCENARIOS
+        years: horizon en années
+        discount_rate: taux d'actualisation de la VAN
+        percentiles: percentiles du résumé
+        terminal_value: inclure la revente du foncier en dernière année
+        chunk_size: parcelles par bloc de calcul
+
+    Returns:
+        dict avec 'summary' (DataFrame scénario x indicateur → percentiles
+        et moyenne), 'region' (DataFrame par scénario : investissement,
+        VAN totale, part de parcelles à VAN positive), 'npv', 'irr',
+        'payback_years' (tableaux (n, n_scénarios)), 'scenarios', 'seconds'
+    """
+    scenarios = scenarios or DEFAULT_SCENARIOS
+    if not 1 <= years <= 100:
+        raise ValueError(f"Horizon invalide : {years} ans")
+    for name, params in scenarios.items():
+        unknown = set(params) - set(SCENARIO_DEFAULTS)
+        if unknown:
+            raise ValueError(f"Paramètres inconnus pour le scénario {name} : {sorted(unknown)}")
+
+    start = time.perf_counter()
+    names = list(scenarios)
+    params = {key: np.array([scenarios[s].get(key, default) for s in names])
+              for key, default in SCENARIO_DEFAULTS.items() if key != 'culture_prices'}
+    culture_names = [c[0] for c in CULTURES]
+    culture_prices = np.array([[scenarios[s].get('culture_prices', {}).get(c, 1.0) for c in culture_names]
+                               for s in names])
+
+    # Indices (scénarios, années) communs à toutes les parcelles
+    t = np.arange(1, years + 1)
+    elapsed = t - 1
+    revenue_index = (params['price_factor'][:, np.newaxis] * params['yield_factor'][:, np.newaxis]
+                     * ((1 + params['price_growth'][:, np.newaxis]) * (1 + params['yield_growth'][:, np.newaxis]))
+                     ** elapsed)
+    cost_index = (1 + params['cost_growth'][:, np.newaxis]) ** elapsed
+    land_index = (1 + params['land_growth']) ** years if terminal_value else np.zeros(len(names))
+    discount = (1 + discount_rate) ** -t.astype(np.float64)
+
+    acquisition = np.asarray(results['valeur_totale'], dtype=np.float64)
+    revenue = np.asarray(results['gain_annuel_brut'], dtype=np.float64)
+    culture = _culture_codes(results['culture_recommandee'], culture_names)
+
+    n = len(acquisition)
+    npv = np.empty((n, len(names)))
+    irr = np.empty((n, len(names)))
+    payback = np.empty((n, len(names)))
+    for lo in range(0, n, chunk_size):
+        hi = min(lo + chunk_size, n)
+        acq = acquisition[lo:hi, np.newaxis]
+        # Tenseur des flux d'exploitation (parcelles, scénarios, années)
+        cash = (revenue[lo:hi, np.newaxis] * culture_prices[:, culture[lo:hi]].T)[:, :, np.newaxis] * revenue_index
+        cash -= (acq * OPERATING_COST_RATE)[:, :, np.newaxis] * cost_index
+
+        # Retour sur investissement : première année où le cumul couvre l'achat
+        covered = np.cumsum(cash, axis=2) >= acq[:, :, np.newaxis]
+        payback[lo:hi] = np.where(covered.any(axis=2), covered.argmax(axis=2) + 1.0, np.nan)
+
+        cash[:, :, -1] += acq * land_index
+        npv[lo:hi] = cash @ discount - acq
+        irr[lo:hi] = _irr(acq, cash)
+
+    seconds = time.perf_counter() - start
+    summary = _summary(names, {'npv': npv, 'irr': irr, 'payback_years': payback}, percentiles)
+    region = pd.DataFrame({
+        'investment': acquisition.sum(),
+        'npv_total': npv.sum(axis=0),
+        'share_npv_positive': (npv > 0).mean(axis=0) if n else np.zeros(len(names))
+    }, index=pd.Index(names, name='scenario'))
+
+    print(f"   📈 Projection {n} parcelles x {len(names)} scénarios x {years} ans "
+          f"en {seconds:.2f}s")
+    return {
+        'summary': summary,
+        'region': region,
+        'npv': npv,
+        'irr': irr,
+        'payback_years': payback,
+        'scenarios': names,
+        'years': years,
+        'discount_rate': discount_rate,
+        'seconds': seconds
+    }
+
+
+def _culture_codes(values, culture_names):
+    """Index dans CULTURES (libellés ou codes compacts)"""
+    values = values.to_numpy() if isinstance(values, pd.Series) else np.asarray(values)
+    if values.dtype.kind in 'iu':
+        return values.astype(np.intp)
+    lookup = {name: code for code, name in enumerate(culture_names)}
+    codes, uniques = pd.factorize(values.astype(object))
+    missing = [u for u in uniques if u not in lookup]
+    if missing:
+        raise ValueError(f"Cultures inconnues : {missing}")
+    return np.array([lookup[u] for u in uniques], dtype=np.intp)[codes]
+
+
+def _irr(acquisition, cash, low=-0.99, high=10.0, iterations=60, tol=1e-9):
+    """
+    TRI de chaque paire (parcelle, scénario) : taux annulant la VAN
+
+    Résolu sur le facteur d'actualisation x = 1 / (1 + r), où la VAN est
+    un polynôme (convexe si les flux sont positifs) : Newton vectorisé
+    depuis x = 1, borné par un encadrement resserré à chaque itération
+    (bissection si le pas en sort) ; seules les paires non convergées
+    sont recalculées. NaN si la VAN ne change pas de signe sur [low, high].
+    """
+    n_years = cash.shape[2]
+    t = np.arange(1, n_years + 1)
+    flows = cash.reshape(-1, n_years)
+    acq = np.broadcast_to(acquisition, cash.shape[:2]).ravel()
+
+    def npv_at(x, flows, acq, derivative=False):
+        powers = np.cumprod(np.broadcast_to(x[:, np.newaxis], flows.shape), axis=1)
+        value = np.einsum('ij,ij->i', flows, powers) - acq
+        if not derivative:
+            return value
+        return value, np.einsum('ij,ij->i', flows, powers * t) / x
+
+    n = len(flows)
+    x_lo = np.full(n, 1 / (1 + high))
+    x_hi = np.full(n, 1 / (1 + low))
+    sign_lo = np.sign(npv_at(x_lo, flows, acq))
+    valid = sign_lo * np.sign(npv_at(x_hi, flows, acq)) < 0
+
+    result = np.full(n, np.nan)
+    active = np.flatnonzero(valid)
+    flows, acq = flows[active], acq[active]
+    x_lo, x_hi, sign_lo = x_lo[active], x_hi[active], sign_lo[active]
+    # Départ : rente perpétuelle équivalente (flux moyen / achat), proche
+    # de la racine pour les TRI élevés où Newton seul avance lentement
+    guess = np.maximum(flows.mean(axis=1) / acq, 0.0)
+    x = np.clip(1 / (1 + guess), x_lo, x_hi)
+    last_step = x_hi - x_lo
+    for _ in range(iterations):
+        if not len(active):
+            break
+        value, slope = npv_at(x, flows, acq, derivative=True)
+        same = np.sign(value) == sign_lo
+        x_lo = np.where(same, x, x_lo)
+        x_hi = np.where(same, x_hi, x)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step = x - value / slope
+        # Bissection si le pas sort de l'encadrement ou converge trop lentement
+        newton = (np.isfinite(step) & (step > x_lo) & (step < x_hi)
+                  & (np.abs(2 * value) <= np.abs(last_step * slope)))
+        new_x = np.where(newton, step, (x_lo + x_hi) / 2)
+        last_step = np.abs(new_x - x)
+
+        # Les paires convergées sortent du calcul
+        done = np.abs(new_x - x) < tol * new_x
+        result[active[done]] = new_x[done]
+        keep = ~done
+        active, x, x_lo, x_hi, sign_lo = active[keep], new_x[keep], x_lo[keep], x_hi[keep], sign_lo[keep]
+        last_step = last_step[keep]
+        flows, acq = flows[keep], acq[keep]
+    result[active] = x
+    return (1 / result - 1).reshape(cash.shape[:2])
+
+
+def _summary(names, metrics, percentiles):
+    """DataFrame (scénario, indicateur) → percentiles sur les parcelles + moyenne"""
+    rows = []
+    index = []
+    for j, name in enumerate(names):
+        for metric, values in metrics.items():
+            column = values[:, j]
+            finite = column[np.isfinite(column)]
+            row = {f"p{p}": np.percentile(finite, p) if finite.size else np.nan for p in percentiles}
+            row['mean'] = finite.mean() if finite.size else np.nan
+            row['defined_share'] = finite.size / len(column) if len(column) else 0.0
+            rows.append(row)
+            index.append((name, metric))
+    return pd.DataFrame(rows, index=pd.MultiIndex.from_tuples(index, names=['scenario', 'metric']))
+
+
+# Test et démonstration
+if __name__ == "__main__":
+    from satellite_analyzer import SatelliteParcelAnalyzer
+
+    print("=" * 70)
+    print("📈 FERALYX V2.0 - PROJECTION VAN / TRI")
+    print("=" * 70)
+
+    analyzer = SatelliteParcelAnalyzer()
+    if os.path.exists('models/satellite_analyzer.pkl'):
+        analyzer.load('models/satellite_analyzer.pkl')
+    else:
+        analyzer.train_models()
+
+    parcels = analyzer.generate_training_data(100000, output_path=None, random_state=0)
+    results = analyzer.analyze_parcels(parcels)
+
+    projection = project_cashflows(results, years=20)
+    pd.set_option('display.width', 140)
+    print("\n📊 Percentiles par scénario (VAN €, TRI, retour en années)")
+    print(projection['summary'].round(3))
+    print("\n🌍 Région entière")
+    print(projection['region'].round(3))
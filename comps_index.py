@@ -0,0 +1,145 @@
+"""
+Feralyx V2.0 - Index des parcelles comparables ("comps") pour la valorisation
+k plus proches parcelles de référence dans l'espace des features normalisées
+(sortie du scaler) complété par la localisation
+"""
+
+import numpy as np
+from sklearn.neighbors import KDTree
+
+# Colonnes de référence renvoyées avec chaque comparable
+COMPS_COLUMNS = ['pays', 'region', 'lat', 'lon', 'surface', 'value_per_ha']
+
+
+class ComparableParcelIndex:
+    """
+    k-NN exact (KD-tree) sur les parcelles d'entraînement
+
+    Chaque parcelle de référence est un point (features normalisées,
+    lat/lon standardisées x location_weight). Au-delà de max_references
+    parcelles, l'index garde un échantillon uniforme : chaque ligne reçoit
+    une priorité aléatoire et seules les max_references plus petites sont
+    conservées, ce qui reste un échantillon uniforme après chaque ajout
+    et borne le temps de requête.
+    """
+
+    def __init__(self, location_weight=1.0, max_references=20000, leaf_size=40, random_state=0):
+        """
+        Args:
+            location_weight: poids de la localisation face aux features
+            max_references: nombre maximal de parcelles indexées
+            leaf_size: taille des feuilles du KD-tree
+            random_state: graine des priorités d'échantillonnage
+        """
+        self.location_weight = float(location_weight)
+        self.max_references = max_references
+        self.leaf_size = leaf_size
+        self.rng = np.random.default_rng(random_state)
+
+        self.location_mean = None
+        self.location_scale = None
+        self.points = None
+        self.priority = np.empty(0)
+        self.reference_id = np.empty(0, dtype=np.int64)
+        self.columns = {}
+        self.n_seen = 0
+        self.tree = None
+
+    def __len__(self):
+        return 0 if self.points is None else len(self.points)
+
+    def add(self, X_scaled, lat, lon, columns):
+        """
+        Ajoute des parcelles de référence ; l'arbre est reconstruit
+        paresseusement à la requête suivante (une fois pour plusieurs ajouts)
+
+        Args:
+            X_scaled: features normalisées (n, n_features)
+            lat, lon: coordonnées (n,)
+            columns: dict {colonne de COMPS_COLUMNS: valeurs (n,)}
+        """
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        if self.location_mean is None:
+            # Standardisation de la localisation figée au premier lot
+            self.location_mean = np.array([lat.mean(), lon.mean()])
+            self.location_scale = np.array([lat.std() or 1.0, lon.std() or 1.0])
+
+        n = len(lat)
+        points = np.hstack([np.asarray(X_scaled, dtype=np.float32), self._location(lat, lon)])
+        priority = self.rng.random(n)
+        reference_id = np.arange(self.n_seen, self.n_seen + n, dtype=np.int64)
+        self.n_seen += n
+
+        if self.points is not None:
+            points = np.concatenate([self.points, points])
+            priority = np.concatenate([self.priority, priority])
+            reference_id = np.concatenate([self.reference_id, reference_id])
+            columns = {name: np.concatenate([self.columns[name], _column_array(columns[name])])
+                       for name in COMPS_COLUMNS}
+        else:
+            columns = {name: _column_array(columns[name]) for name in COMPS_COLUMNS}
+
+        if len(points) > self.max_references:
+            keep = np.sort(np.argpartition(priority, self.max_references)[:self.max_references])
+            points, priority, reference_id = points[keep], priority[keep], reference_id[keep]
+            columns = {name: values[keep] for name, values in columns.items()}
+
+        self.points = np.ascontiguousarray(points)
+        self.priority = priority
+        self.reference_id = reference_id
+        self.columns = columns
+        self.tree = None
+        return self
+
+    def query_many(self, X_scaled, lat, lon, k=5):
+        """
+        k plus proches références de chaque ligne
+
+        Returns:
+            (distances, indices) de forme (n, k), triés par distance
+        """
+        if self.points is None:
+            raise ValueError("Index de comparables vide")
+        if self.tree is None:
+            self.tree = KDTree(self.points, leaf_size=self.leaf_size)
+        points = np.hstack([np.asarray(X_scaled, dtype=np.float32),
+                            self._location(np.asarray(lat, dtype=np.float64),
+                                           np.asarray(lon, dtype=np.float64))])
+        return self.tree.query(points, k=min(k, len(self)))
+
+    def query(self, x_scaled, lat, lon, k=5):
+        """
+        Comparables d'une parcelle
+
+        Returns:
+            liste de dicts (référence, pays, région, coordonnées, surface,
+            valeur par ha et totale, distance de similarité)
+        """
+        distances, indices = self.query_many(np.atleast_2d(x_scaled), [lat], [lon], k)
+        comps = []
+        for distance, i in zip(distances[0], indices[0]):
+            value_per_ha = float(self.columns['value_per_ha'][i])
+            surface = float(self.columns['surface'][i])
+            comps.append({
+                'reference': int(self.reference_id[i]),
+                'pays': str(self.columns['pays'][i]),
+                'region': str(self.columns['region'][i]),
+                'lat': round(float(self.columns['lat'][i]), 4),
+                'lon': round(float(self.columns['lon'][i]), 4),
+                'surface': round(surface, 1),
+                'valeur_par_ha': round(value_per_ha, 0),
+                'valeur_totale': round(value_per_ha * surface, 0),
+                'distance': round(float(distance), 3)
+            })
+        return comps
+
+    def _location(self, lat, lon):
+        location = (np.column_stack([lat, lon]) - self.location_mean) / self.location_scale
+        return (location * self.location_weight).astype(np.float32)
+
+
+def _column_array(values):
+    """Texte en dtype unicode (pas d'objets Python : sérialisation hors pickle)"""
+    values = np.asarray(values)
+    return values.astype(str) if values.dtype == object else values
@@ -0,0 +1,217 @@
+"""
+Feralyx V2.0 - Surface continue des prix fonciers (€/ha)
+Raster par pays interpolé (IDW) depuis des points de prix de référence,
+stocké en artefact mappé en mémoire et échantillonné par interpolation
+bilinéaire vectorisée
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from model_artifacts import ModelArtifact, find_artifact, save_artifact
+
+# Prix de référence 2024 (€/ha) par pays et région ; chaque région est
+# placée au centre de sa bande de latitude (nord = tiers supérieur)
+LAND_PRICE_REFERENCES = {
+    'tunisie': {'nord': 8000, 'centre': 12000, 'sud': 6000},
+    'france': {'nord': 45000, 'centre': 35000, 'sud': 55000},
+    'italie': {'nord': 40000, 'centre': 38000, 'sud': 28000},
+    'espagne': {'nord': 30000, 'centre': 25000, 'sud': 32000}
+}
+REGION_BANDS = {'nord': 2.5, 'centre': 1.5, 'sud': 0.5}  # position en tiers de latitude
+
+# Points de prix locaux supplémentaires (CSV pays,lat,lon,prix_ha), optionnels
+LAND_PRICE_POINTS_PATH = 'data/land_price_points.csv'
+LAND_PRICE_ARTIFACT = 'models/land_prices.artifact'
+
+
+def reference_points(bounds, extra_points_path=LAND_PRICE_POINTS_PATH):
+    """
+    Points de prix par pays : centres de région + points locaux du CSV
+
+    Args:
+        bounds: dict {pays: {'lat': (min, max), 'lon': (min, max)}}
+        extra_points_path: CSV optionnel de points supplémentaires
+
+    Returns:
+        dict {pays: (lat, lon, prix) en tableaux}
+    """
+    points = {}
+    for pays, prices in LAND_PRICE_REFERENCES.items():
+        lat_min, lat_max = bounds[pays]['lat']
+        lon_mid = sum(bounds[pays]['lon']) / 2
+        lat = [lat_min + (lat_max - lat_min) * REGION_BANDS[r] / 3 for r in prices]
+        points[pays] = (np.array(lat), np.full(len(lat), lon_mid), np.array(list(prices.values()), dtype=float))
+
+    if extra_points_path and os.path.exists(extra_points_path):
+        extra = pd.read_csv(extra_points_path)
+        for pays, group in extra.groupby('pays'):
+            lat, lon, price = points.get(pays, (np.empty(0), np.empty(0), np.empty(0)))
+            points[pays] = (np.concatenate([lat, group['lat'].to_numpy(dtype=float)]),
+                            np.concatenate([lon, group['lon'].to_numpy(dtype=float)]),
+                            np.concatenate([price, group['prix_ha'].to_numpy(dtype=float)]))
+    return points
+
+
+def idw_grid(lat_nodes, lon_nodes, lat, lon, price, power=2.0, block_rows=64):
+    """
+    Interpolation par pondération inverse à la distance sur une grille
+
+    Distances en km approchés (longitude corrigée par cos(latitude)) ;
+    un nœud confondu avec un point de référence prend sa valeur.
+
+    Returns:
+        grille float32 (len(lat_nodes), len(lon_nodes))
+    """
+    grid = np.empty((len(lat_nodes), len(lon_nodes)), dtype=np.float32)
+    cos_lat = np.cos(np.radians(np.mean(lat_nodes)))
+    for start in range(0, len(lat_nodes), block_rows):
+        rows = lat_nodes[start:start + block_rows]
+        d_lat = (rows[:, np.newaxis, np.newaxis] - lat) * 111.0
+        d_lon = (lon_nodes[np.newaxis, :, np.newaxis] - lon) * 111.0 * cos_lat
+        distance = np.sqrt(d_lat ** 2 + d_lon ** 2)
+        with np.errstate(divide='ignore'):
+            weights = distance ** -power
+        exact = np.isinf(weights)
+        weights[exact.any(axis=2)] = exact[exact.any(axis=2)]
+        grid[start:start + len(rows)] = (weights * price).sum(axis=2) / weights.sum(axis=2)
+    return grid
+
+
+class LandPriceSurface:
+    """
+    Rasters de prix fonciers par pays, échantillonnés par lat/lon
+
+    Toutes les grilles sont concaténées dans un seul tableau plat (un
+    décalage par pays) : une recherche sur des millions de points de pays
+    mélangés reste une poignée d'opérations NumPy. Les nœuds couvrent les
+    bornes du pays ; hors bornes, la valeur du bord est utilisée.
+    """
+
+    def __init__(self, values, countries, origin, step, shape):
+        """
+        Args:
+            values: prix des nœuds, toutes grilles à plat (float32)
+            countries: noms des pays dans l'ordre des grilles
+            origin: (n_pays, 2) lat/lon du nœud [0, 0] de chaque grille
+            step: pas de grille en degrés
+            shape: (n_pays, 2) nombre de nœuds en lat/lon
+        """
+        self.values = np.asarray(values)  # vue ndarray (évite le surcoût de np.memmap)
+        self.countries = list(countries)
+        self.origin = np.asarray(origin, dtype=np.float64)
+        self.step = float(step)
+        self.shape = np.asarray(shape, dtype=np.int64)
+        self.offset = np.concatenate([[0], np.cumsum(self.shape.prod(axis=1))[:-1]])
+        self.country_codes = {pays: code for code, pays in enumerate(self.countries)}
+        self._mean = np.array([values[o:o + n].mean() for o, n in zip(self.offset, self.shape.prod(axis=1))])
+
+    @classmethod
+    def build(cls, bounds, step=0.05, power=2.0, extra_points_path=LAND_PRICE_POINTS_PATH):
+        """
+        Construit les rasters de tous les pays
+
+        Args:
+            bounds: dict {pays: {'lat': (min, max), 'lon': (min, max)}}
+            step: pas de grille en degrés (0.05° ≈ 5,5 km)
+            power: exposant IDW
+            extra_points_path: CSV optionnel de points de prix locaux
+        """
+        points = reference_points(bounds, extra_points_path)
+        countries, grids, origin, shape = [], [], [], []
+        for pays, (lat, lon, price) in points.items():
+            if pays not in bounds:
+                continue
+            lat_min, lat_max = bounds[pays]['lat']
+            lon_min, lon_max = bounds[pays]['lon']
+            lat_nodes = lat_min + step * np.arange(int(np.ceil((lat_max - lat_min) / step)) + 1)
+            lon_nodes = lon_min + step * np.arange(int(np.ceil((lon_max - lon_min) / step)) + 1)
+            grids.append(idw_grid(lat_nodes, lon_nodes, lat, lon, price, power).ravel())
+            countries.append(pays)
+            origin.append((lat_min, lon_min))
+            shape.append((len(lat_nodes), len(lon_nodes)))
+        return cls(np.concatenate(grids), countries, origin, step, shape)
+
+    @classmethod
+    def load_or_build(cls, bounds, path=LAND_PRICE_ARTIFACT, step=0.05):
+        """Ouvre l'artefact (tableau mappé) ; le construit et l'enregistre s'il manque"""
+        directory = find_artifact(path)
+        if directory:
+            return cls.load(directory)
+        surface = cls.build(bounds, step=step)
+        surface.save(path)
+        return surface
+
+    def price_per_ha(self, lat, lon, country):
+        """
+        Prix €/ha par interpolation bilinéaire
+
+        Args:
+            lat, lon: tableaux (ou scalaires) de coordonnées
+            country: nom de pays unique ou tableau de noms par point
+
+        Returns:
+            tableau float64 des prix (NaN pour un pays sans raster ou des
+            coordonnées absentes)
+        """
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        code = self._codes(country, len(lat))
+        known = code >= 0
+        # NaN → nœud 0 (sinon INT64_MIN après conversion), prix masqué ensuite
+        finite = np.isfinite(lat) & np.isfinite(lon)
+        c = np.where(known, code, 0)
+
+        n_lat, n_lon = self.shape[c, 0], self.shape[c, 1]
+        fi = np.clip(np.where(finite, (lat - self.origin[c, 0]) / self.step, 0.0), 0, n_lat - 1)
+        fj = np.clip(np.where(finite, (lon - self.origin[c, 1]) / self.step, 0.0), 0, n_lon - 1)
+        i = np.minimum(fi.astype(np.int64), n_lat - 2)
+        j = np.minimum(fj.astype(np.int64), n_lon - 2)
+        ti, tj = fi - i, fj - j
+
+        base = self.offset[c] + i * n_lon + j
+        v00 = self.values[base]
+        v01 = self.values[base + 1]
+        v10 = self.values[base + n_lon]
+        v11 = self.values[base + n_lon + 1]
+        price = (v00 * (1 - ti) * (1 - tj) + v01 * (1 - ti) * tj
+                 + v10 * ti * (1 - tj) + v11 * ti * tj)
+        return np.where(known & finite, price, np.nan)
+
+    def mean_price(self, country):
+        """Prix moyen du raster d'un pays (ou tableau de pays), NaN si inconnu"""
+        if isinstance(country, str):
+            code = self.country_codes.get(country)
+            return np.nan if code is None else float(self._mean[code])
+        codes = self._codes(country, len(country))
+        return np.where(codes >= 0, self._mean[np.maximum(codes, 0)], np.nan)
+
+    def _codes(self, country, n):
+        """Index de grille par point (-1 = pays inconnu) ; hachage des libellés distincts"""
+        if isinstance(country, str):
+            return np.full(n, self.country_codes.get(country, -1), dtype=np.int64)
+        labels, uniques = pd.factorize(np.asarray(country, dtype=object))
+        lookup = np.array([self.country_codes.get(u, -1) for u in uniques] + [-1], dtype=np.int64)
+        return lookup[labels]
+
+    def save(self, path=LAND_PRICE_ARTIFACT):
+        """Sauvegarde (valeurs .npy mappables + géoréférencement)"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        save_artifact(path, arrays={'values': self.values}, meta={
+            'kind': 'land_price_surface',
+            'countries': self.countries,
+            'origin': self.origin.tolist(),
+            'step': self.step,
+            'shape': self.shape.tolist()
+        })
+        print(f"   💾 Raster des prix fonciers sauvegardé : {path} ({len(self.values)} nœuds)")
+        return path
+
+    @classmethod
+    def load(cls, path=LAND_PRICE_ARTIFACT):
+        """Charge les rasters ; les valeurs restent mappées en mémoire"""
+        artifact = ModelArtifact(path)
+        meta = artifact.meta
+        return cls(artifact.array('values'), meta['countries'], meta['origin'], meta['step'], meta['shape'])
@@ -0,0 +1,225 @@
+"""
+Feralyx V2.0 - Format d'artefact de modèles mappable en mémoire
+Manifeste JSON versionné + tableaux .npy ouverts avec mmap_mode='r'
+
+Disposition d'un artefact (dossier <nom>.artifact/) :
+    manifest.json           format, version, métadonnées, index des fichiers
+    <tableau>.npy           tableaux NumPy bruts (ex. arbres compilés)
+    <objet>.pkl             squelette pickle (protocole 5) d'un estimateur
+    <objet>.buffers.npy     données des tableaux de l'estimateur, hors pickle
+
+Les données volumineuses ne passent jamais par pickle : elles sont relues
+par mmap et chargées à la demande. Seuls les tableaux bruts (array(), ex.
+arbres compilés, rasters) restent des vues du fichier, partagées entre
+processus (mêmes pages physiques). Les objets sont reconstruits au
+premier accès ; un estimateur sklearn copie alors une partie de ses
+buffers (Tree.__setstate__ recopie les nœuds de chaque arbre), qui
+occupent de la mémoire privée dans chaque processus.
+"""
+
+import json
+import os
+import pickle
+import shutil
+from datetime import datetime
+
+import numpy as np
+
+FORMAT_NAME = 'feralyx-model-artifact'
+FORMAT_VERSION = 1
+MANIFEST_FILE = 'manifest.json'
+ARTIFACT_SUFFIX = '.artifact'
+
+# Alignement des segments dans les fichiers de buffers (octets)
+ALIGNMENT = 64
+
+
+def artifact_path_for(pkl_path):
+    """Dossier d'artefact associé à un fichier .pkl (models/x.pkl → models/x.artifact)"""
+    return os.path.splitext(pkl_path)[0] + ARTIFACT_SUFFIX
+
+
+def find_artifact(path):
+    """
+    Renvoie le dossier d'artefact à utiliser pour path, ou None
+
+    path peut être le dossier lui-même ou le .pkl historique ; dans ce
+    dernier cas l'artefact voisin n'est retenu que s'il est au moins aussi
+    récent que le pickle.
+    """
+    if os.path.isdir(path):
+        return path if os.path.exists(os.path.join(path, MANIFEST_FILE)) else None
+
+    candidate = artifact_path_for(path)
+    manifest = os.path.join(candidate, MANIFEST_FILE)
+    if not os.path.exists(manifest):
+        return None
+    if os.path.exists(path) and os.path.getmtime(manifest) < os.path.getmtime(path):
+        return None
+    return candidate
+
+
+def save_artifact(directory, objects=None, arrays=None, meta=None):
+    """
+    Écrit un artefact (écriture dans un dossier temporaire puis renommage)
+
+    Args:
+        directory: dossier de destination (<nom>.artifact)
+        objects: dict {nom: objet picklable} reconstruit paresseusement
+        arrays: dict {nom: np.ndarray} relu par mmap
+        meta: dict JSON-sérialisable libre
+    """
+    objects = objects or {}
+    arrays = arrays or {}
+    tmp_dir = directory + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    manifest = {
+        'format': FORMAT_NAME,
+        'format_version': FORMAT_VERSION,
+        'created': datetime.now().isoformat(),
+        'numpy_version': np.__version__,
+        'meta': meta or {},
+        'arrays': {},
+        'objects': {}
+    }
+
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        filename = f"{name}.npy"
+        np.save(os.path.join(tmp_dir, filename), array)
+        manifest['arrays'][name] = {
+            'file': filename,
+            'dtype': array.dtype.str,
+            'shape': list(array.shape)
+        }
+
+    for name, obj in objects.items():
+        manifest['objects'][name] = _write_object(tmp_dir, name, obj)
+
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    # Les processus qui ont déjà mappé l'ancienne version gardent leurs pages
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_dir, directory)
+    return directory
+
+
+def _write_object(directory, name, obj):
+    """Pickle protocole 5 avec buffers hors bande concaténés dans un .npy"""
+    buffers = []
+    skeleton = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+
+    pickle_file = f"{name}.pkl"
+    with open(os.path.join(directory, pickle_file), 'wb') as f:
+        f.write(skeleton)
+
+    segments = []
+    offset = 0
+    raws = []
+    for buffer in buffers:
+        raw = buffer.raw()
+        offset = -(-offset // ALIGNMENT) * ALIGNMENT
+        segments.append([offset, raw.nbytes])
+        raws.append(raw)
+        offset += raw.nbytes
+
+    entry = {'pickle': pickle_file, 'buffers': None, 'segments': segments}
+    if raws:
+        buffers_file = f"{name}.buffers.npy"
+        out = np.lib.format.open_memmap(
+            os.path.join(directory, buffers_file), mode='w+', dtype=np.uint8, shape=(offset,)
+        )
+        for (start, nbytes), raw in zip(segments, raws):
+            out[start:start + nbytes] = np.frombuffer(raw, dtype=np.uint8)
+        out.flush()
+        del out
+        entry['buffers'] = buffers_file
+    return entry
+
+
+class ModelArtifact:
+    """Artefact ouvert : manifeste en mémoire, tableaux et objets à la demande"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST_FILE), encoding='utf-8') as f:
+            self.manifest = json.load(f)
+
+        if self.manifest.get('format') != FORMAT_NAME:
+            raise ValueError(f"Artefact invalide : {directory}")
+        version = self.manifest.get('format_version')
+        if not isinstance(version, int) or version > FORMAT_VERSION:
+            raise ValueError(
+                f"Version d'artefact non supportée : {version} (max {FORMAT_VERSION})"
+            )
+        self._arrays = {}
+
+    @property
+    def meta(self):
+        return self.manifest['meta']
+
+    @property
+    def object_names(self):
+        return list(self.manifest['objects'])
+
+    @property
+    def array_names(self):
+        return list(self.manifest['arrays'])
+
+    def array(self, name):
+        """Tableau en lecture seule, mappé en mémoire"""
+        if name not in self._arrays:
+            entry = self.manifest['arrays'][name]
+            self._arrays[name] = np.load(os.path.join(self.directory, entry['file']), mmap_mode='r')
+        return self._arrays[name]
+
+    def load_object(self, name):
+        """
+        Reconstruit un objet à partir de ses buffers mappés
+
+        Les tableaux NumPy de l'objet restent des vues du fichier, sauf si
+        sa classe les recopie à la reconstruction (nœuds des arbres sklearn).
+        """
+        entry = self.manifest['objects'][name]
+        with open(os.path.join(self.directory, entry['pickle']), 'rb') as f:
+            skeleton = f.read()
+
+        buffers = []
+        if entry['buffers']:
+            data = np.load(os.path.join(self.directory, entry['buffers']), mmap_mode='r')
+            buffers = [data[start:start + nbytes] for start, nbytes in entry['segments']]
+        return pickle.loads(skeleton, buffers=buffers)
+
+
+class LazyArtifactMixin:
+    """
+    Attributs reconstruits au premier accès depuis un artefact
+
+    _attach_artifact() retire les attributs concernés de l'instance ;
+    le premier accès passe alors par __getattr__, qui charge l'objet et
+    le met en cache comme un attribut ordinaire.
+    """
+
+    def __getattr__(self, name):
+        artifact = self.__dict__.get('_lazy_artifact')
+        if artifact is not None and name in artifact.manifest['objects']:
+            value = artifact.load_object(name)
+            setattr(self, name, value)
+            return value
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    def _attach_artifact(self, artifact):
+        for name in artifact.object_names:
+            self.__dict__.pop(name, None)
+        self._lazy_artifact = artifact
+
+    def _load_lazy_artifact(self, path):
+        """Attache l'artefact associé à path s'il existe ; renvoie ses métadonnées ou None"""
+        directory = find_artifact(path)
+        if directory is None:
+            return None
+        self._attach_artifact(ModelArtifact(directory))
+        return self._lazy_artifact.meta
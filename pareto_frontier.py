@@ -0,0 +1,231 @@
+"""
+Feralyx V2.0 - Frontière de Pareto (skyline) des parcelles scorées
+Garde les parcelles qu'aucune autre ne bat sur tous les critères à la fois
+(opportunité, fertilité, prix à l'hectare, nombre de risques)
+
+Usage :
+    python pareto_frontier.py data/satellite_parcels.csv --layers 3 --output reports/frontiere.csv
+    python pareto_frontier.py reports/scores.csv --criteria score_opportunite:max valeur_par_ha:min
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from satellite_analyzer import AUCUN_RISQUE, SatelliteParcelAnalyzer
+
+# Critère → sens d'optimisation ('n_risques' est dérivé de la colonne risques)
+SKYLINE_CRITERIA = {
+    'score_opportunite': 'max',
+    'fertilite': 'max',
+    'valeur_par_ha': 'min',
+    'n_risques': 'min',
+}
+SKYLINE_BLOCK = 1024
+
+
+def pareto_frontier(results, criteria=None, max_layers=1, block_size=SKYLINE_BLOCK):
+    """
+    Couches de Pareto d'un lot de résultats d'analyse
+
+    Une parcelle en domine une autre si elle est au moins aussi bonne sur
+    tous les critères et strictement meilleure sur un. La couche 1 est la
+    skyline (parcelles non dominées) ; la couche 2 est la skyline des
+    parcelles restantes, etc.
+
+    Algorithme sort-filter-skyline : les vecteurs de critères distincts
+    sont triés par somme normalisée (une parcelle dominante passe toujours
+    avant celles qu'elle domine), puis filtrés par blocs contre la skyline
+    déjà construite. Les doublons exacts partagent la même couche.
+
+    Args:
+        results: DataFrame ou tableau structuré d'analyze_parcels (la
+                 colonne risques peut être une liste, un texte ' | ' ou un
+                 masque de bits compact)
+        criteria: dict {colonne: 'max' | 'min'} (défaut SKYLINE_CRITERIA)
+        max_layers: nombre de couches à calculer
+        block_size: taille des blocs de filtrage
+
+    Returns:
+        tableau int (n,) : numéro de couche (1 = frontière), 0 au-delà de max_layers
+    """
+    criteria = criteria or SKYLINE_CRITERIA
+    for col, sense in criteria.items():
+        if sense not in ('max', 'min'):
+            raise ValueError(f"Sens inconnu pour {col} : {sense} (attendu : 'max' ou 'min')")
+
+    start = time.perf_counter()
+    points = criteria_matrix(results, criteria)
+    # Vecteurs distincts : les doublons (scores arrondis) sont traités une fois
+    unique_points, inverse = np.unique(points, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+
+    unique_layers = np.zeros(len(unique_points), dtype=np.int32)
+    remaining = np.arange(len(unique_points))
+    for layer in range(1, max_layers + 1):
+        if not len(remaining):
+            break
+        front = remaining[_skyline(unique_points[remaining], block_size)]
+        unique_layers[front] = layer
+        remaining = remaining[unique_layers[remaining] == 0]
+
+    layers = unique_layers[inverse]
+    seconds = time.perf_counter() - start
+    print(f"   🏔️ Frontière de Pareto : {np.count_nonzero(layers == 1)} parcelles non dominées "
+          f"sur {len(layers)} ({len(unique_points)} vecteurs distincts, {seconds:.2f}s)")
+    return layers
+
+
+def pareto_front(results, criteria=None):
+    """Lignes non dominées d'un DataFrame de résultats"""
+    df = results if isinstance(results, pd.DataFrame) else pd.DataFrame(results)
+    return df[pareto_frontier(df, criteria) == 1]
+
+
+def criteria_matrix(results, criteria):
+    """Matrice (n, n_critères) orientée en minimisation"""
+    columns = []
+    for col, sense in criteria.items():
+        if col == 'n_risques' and 'n_risques' not in _fields(results):
+            values = risk_counts(results['risques'])
+        else:
+            values = np.asarray(results[col], dtype=np.float64)
+        columns.append(-values if sense == 'max' else values)
+    return np.column_stack(columns).astype(np.float64) + 0.0
+
+
+def risk_counts(risques):
+    """Nombre de risques par parcelle (liste, texte ' | ' ou masque de bits)"""
+    values = np.asarray(risques) if not isinstance(risques, pd.Series) else risques.to_numpy()
+    if values.dtype.kind in 'iu':
+        counts = np.zeros(len(values), dtype=np.float64)
+        masks = values.astype(np.int64)
+        while masks.any():
+            counts += masks & 1
+            masks >>= 1
+        return counts
+    counts = []
+    for risks in values:
+        if isinstance(risks, str):
+            risks = risks.split(' | ')
+        counts.append(sum(1 for risk in risks if risk != AUCUN_RISQUE))
+    return np.array(counts, dtype=np.float64)
+
+
+def _fields(results):
+    if isinstance(results, pd.DataFrame):
+        return set(results.columns)
+    return set(results.dtype.names or ())
+
+
+def _skyline(points, block_size):
+    """Indices des lignes non dominées (lignes distinctes, minimisation)"""
+    # Somme des critères normalisés : strictement croissante le long de la dominance
+    low = points.min(axis=0)
+    span = np.where(points.max(axis=0) > low, points.max(axis=0) - low, 1.0)
+    order = np.argsort(((points - low) / span).sum(axis=1), kind='stable')
+    ordered = points[order]
+
+    # Les meilleurs points au sens de la somme éliminent d'emblée la
+    # plupart des autres : un premier filtrage global contre leur skyline
+    # évite de reparcourir ces points bloc par bloc
+    pivots = ordered[:block_size]
+    pivots = pivots[~_dominated_within(pivots)]
+    candidates = np.flatnonzero(~_dominated_by(ordered, pivots, strict=True))
+
+    skyline = np.empty((0, points.shape[1]))
+    kept = []
+    for start in range(0, len(candidates), block_size):
+        block_idx = candidates[start:start + block_size]
+        block_idx = block_idx[~_dominated_by(ordered[block_idx], skyline)]
+        block = ordered[block_idx]
+        survivors = ~_dominated_within(block)
+        skyline = np.concatenate([skyline, block[survivors]])
+        kept.append(block_idx[survivors])
+    return order[np.concatenate(kept)] if kept else np.empty(0, dtype=np.intp)
+
+
+def _dominated_within(points):
+    """Masque des points dominés par un autre point du même lot (lignes distinctes)"""
+    dominates = np.ones((len(points), len(points)), dtype=bool)
+    for k in range(points.shape[1]):
+        dominates &= points[:, np.newaxis, k] <= points[np.newaxis, :, k]
+    np.fill_diagonal(dominates, False)
+    return dominates.any(axis=0)
+
+
+def _dominated_by(points, skyline, strict=False, max_elements=1 << 22):
+    """
+    Masque des points dominés par au moins une ligne de la skyline
+
+    Les lignes étant distinctes, <= sur tous les critères suffit, sauf si
+    les points peuvent figurer dans la skyline elle-même (strict=True).
+    """
+    dominated = np.zeros(len(points), dtype=bool)
+    if not len(skyline) or not len(points):
+        return dominated
+    step = max(1, max_elements // len(skyline))
+    for start in range(0, len(points), step):
+        chunk = points[start:start + step]
+        better_or_equal = np.ones((len(chunk), len(skyline)), dtype=bool)
+        for k in range(points.shape[1]):
+            better_or_equal &= skyline[np.newaxis, :, k] <= chunk[:, np.newaxis, k]
+        if strict:
+            strictly = np.zeros_like(better_or_equal)
+            for k in range(points.shape[1]):
+                strictly |= skyline[np.newaxis, :, k] < chunk[:, np.newaxis, k]
+            better_or_equal &= strictly
+        dominated[start:start + step] = better_or_equal.any(axis=1)
+    return dominated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Frontière de Pareto des parcelles scorées")
+    parser.add_argument('input', help="CSV de parcelles (scoré ou au format data/satellite_parcels.csv)")
+    parser.add_argument('--output', default='reports/frontiere_pareto.csv', help="CSV de sortie")
+    parser.add_argument('--layers', type=int, default=1, help="nombre de couches de Pareto")
+    parser.add_argument('--criteria', nargs='+', default=None,
+                        help="critères colonne:max|min (défaut : opportunité, fertilité, prix/ha, risques)")
+    parser.add_argument('--all', action='store_true', help="écrire toutes les lignes avec leur couche")
+    parser.add_argument('--model', default='models/satellite_analyzer.pkl', help="modèles satellite")
+    args = parser.parse_args()
+
+    criteria = SKYLINE_CRITERIA
+    if args.criteria:
+        criteria = dict(item.split(':', 1) for item in args.criteria)
+
+    print("=" * 70)
+    print("🏔️ FERALYX V2.0 - FRONTIÈRE DE PARETO")
+    print("=" * 70)
+
+    df = pd.read_csv(args.input)
+    needed = {col for col in criteria if col != 'n_risques'}
+    if 'n_risques' in criteria and 'n_risques' not in df.columns:
+        needed.add('risques')
+    if not needed <= set(df.columns):
+        # Fichier brut : scoring par les modèles satellite
+        analyzer = SatelliteParcelAnalyzer()
+        analyzer.load(args.model)
+        results = analyzer.analyze_parcels(df)
+        df = pd.concat([df.drop(columns=[c for c in results.columns if c in df.columns]), results], axis=1)
+        df['risques'] = df['risques'].map(' | '.join)
+
+    df['couche_pareto'] = pareto_frontier(df, criteria, max_layers=args.layers)
+    if not args.all:
+        df = df[df['couche_pareto'] > 0]
+    order = ['couche_pareto'] + (['score_opportunite'] if 'score_opportunite' in df.columns else [])
+    df = df.sort_values(order, ascending=[True, False][:len(order)], kind='stable')
+    for layer, count in df['couche_pareto'].value_counts().sort_index().items():
+        if layer:
+            print(f"   • Couche {layer} : {count} parcelles")
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    df.to_csv(args.output, index=False)
+    print(f"   💾 {len(df)} lignes écrites : {args.output}")
+
+
+if __name__ == "__main__":
+    main()
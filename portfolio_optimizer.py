@@ -0,0 +1,301 @@
+"""
+Feralyx V2.0 - Sélection de portefeuille de parcelles sous budget
+Sac à dos coût (valeur_totale) / gain (gain_annuel_net), plafonds
+optionnels par pays ou région
+"""
+
+import os
+import time
+from bisect import bisect_right
+
+import numpy as np
+import pandas as pd
+
+PORTFOLIO_METHODS = ('auto', 'exact', 'greedy')
+
+
+def select_portfolio(parcels, budget, caps=None, method='auto', exact_max_items=2000,
+                     max_nodes=200000, cost_col='valeur_totale', gain_col='gain_annuel_net'):
+    """
+    Choisit les parcelles maximisant le gain annuel net total sous budget
+
+    Deux chemins :
+    - 'exact' : séparation et évaluation (branch and bound) sur les coûts
+      réels, parcelles triées par rendement gain/coût. Une branche est
+      élaguée quand sa borne de relaxation linéaire (sac à dos
+      fractionnaire sous budget et plafonds d'une colonne) ne peut plus
+      battre la meilleure solution connue, initialisée par le glouton.
+      Optimum prouvé, ou ValueError si max_nodes nœuds ne suffisent pas
+      à la preuve.
+    - 'greedy' : tri par rendement gain/coût puis remplissage, pour
+      100k+ candidats ; comparé à la meilleure parcelle seule.
+    'auto' tente 'exact' jusqu'à exact_max_items candidats et retombe sur
+    'greedy' au-delà ou si la preuve dépasse max_nodes nœuds.
+
+    La borne de relaxation linéaire (sac à dos fractionnaire, plafonds
+    ignorés) est toujours calculée : elle majore l'optimum et donne
+    l'écart maximal de la solution retenue.
+
+    Args:
+        parcels: DataFrame de résultats (analyze_parcels, avec pays/région
+                 si des plafonds sont demandés)
+        budget: budget d'acquisition (€)
+        caps: dict {colonne: {valeur: plafond €}}, ex. {'pays': {'france': 2e6}}
+        method: 'auto', 'exact' ou 'greedy'
+        exact_max_items: taille maximale pour le chemin exact en mode auto
+        max_nodes: nœuds explorés au plus par le chemin exact
+        cost_col, gain_col: colonnes de coût et de gain
+
+    Returns:
+        dict avec 'portfolio' (lignes retenues), 'mask', 'total_cost',
+        'total_gain', 'upper_bound', 'gap', 'method', 'solve_seconds'
+    """
+    if method not in PORTFOLIO_METHODS:
+        raise ValueError(f"Méthode inconnue : {method} (attendu : {PORTFOLIO_METHODS})")
+    caps = caps or {}
+    for col in caps:
+        if col not in parcels:
+            raise ValueError(f"Colonne de plafond absente : {col}")
+
+    start = time.perf_counter()
+    cost = parcels[cost_col].to_numpy(dtype=np.float64)
+    gain = parcels[gain_col].to_numpy(dtype=np.float64)
+
+    # Seules les parcelles rentables et abordables peuvent améliorer le portefeuille
+    candidates = np.flatnonzero((gain > 0) & (cost > 0) & (cost <= budget))
+    groups, limits = _group_limits(parcels, caps, candidates)
+
+    chosen = _solve_greedy(cost[candidates], gain[candidates], budget, groups, limits)
+    if method == 'exact' or (method == 'auto' and len(candidates) <= exact_max_items):
+        exact = _solve_exact(cost[candidates], gain[candidates], budget, groups, limits,
+                             incumbent=chosen, max_nodes=max_nodes)
+        if exact is not None:
+            chosen, method = exact, 'exact'
+        elif method == 'exact':
+            raise ValueError(f"Optimum non prouvé en {max_nodes} nœuds "
+                             f"({len(candidates)} candidats) : augmentez max_nodes ou utilisez 'greedy'")
+        else:
+            method = 'greedy'
+    else:
+        method = 'greedy'
+
+    mask = np.zeros(len(parcels), dtype=bool)
+    mask[candidates[chosen]] = True
+    upper_bound = _lp_bound(cost[candidates], gain[candidates], budget)
+    seconds = time.perf_counter() - start
+
+    total_gain = gain[mask].sum()
+    result = {
+        'portfolio': parcels[mask],
+        'mask': mask,
+        'total_cost': cost[mask].sum(),
+        'total_gain': total_gain,
+        'upper_bound': upper_bound,
+        'gap': (upper_bound - total_gain) / upper_bound if upper_bound > 0 else 0.0,
+        'method': method,
+        'solve_seconds': seconds
+    }
+    print(f"   💼 {mask.sum()} parcelles retenues sur {len(parcels)} ({method}, {seconds*1000:.0f} ms) : "
+          f"{result['total_cost']:,.0f} € investis, {total_gain:,.0f} €/an "
+          f"(écart max {result['gap']*100:.2f}%)")
+    return result
+
+
+def _group_limits(parcels, caps, candidates):
+    """Codes de groupe des candidats et plafond (€) par code, une entrée par colonne"""
+    groups, limits = [], []
+    for col, col_caps in caps.items():
+        values = parcels[col].to_numpy()[candidates]
+        labels, codes = np.unique(values.astype(str), return_inverse=True)
+        groups.append(codes)
+        limits.append(np.array([col_caps.get(label, np.inf) for label in labels], dtype=np.float64))
+    return groups, limits
+
+
+def _lp_bound(cost, gain, budget):
+    """Optimum du sac à dos fractionnaire (borne supérieure du problème entier)"""
+    order = np.argsort(-gain / cost, kind='stable')
+    spent = np.cumsum(cost[order])
+    full = np.searchsorted(spent, budget, side='right')
+    bound = gain[order[:full]].sum()
+    if full < len(order):
+        remaining = budget - (spent[full - 1] if full else 0.0)
+        bound += gain[order[full]] * remaining / cost[order[full]]
+    return bound
+
+
+def _solve_greedy(cost, gain, budget, groups, limits):
+    """Remplissage par rendement décroissant ; renvoie les indices retenus"""
+    order = np.argsort(-gain / cost, kind='stable')
+    remaining = budget
+    group_remaining = [limit.copy() for limit in limits]
+    min_cost = cost.min() if len(cost) else 0.0
+    chosen = []
+    for i in order:
+        if remaining < min_cost:
+            break
+        c = cost[i]
+        if c > remaining:
+            continue
+        if any(c > left[codes[i]] for codes, left in zip(groups, group_remaining)):
+            continue
+        chosen.append(i)
+        remaining -= c
+        for codes, left in zip(groups, group_remaining):
+            left[codes[i]] -= c
+
+    # Garantie classique : jamais moins bon que la meilleure parcelle seule
+    feasible = np.ones(len(cost), dtype=bool)
+    for codes, limit in zip(groups, limits):
+        feasible &= cost <= limit[codes]
+    if feasible.any():
+        best_single = np.flatnonzero(feasible)[np.argmax(gain[feasible])]
+        if gain[best_single] > gain[chosen].sum():
+            chosen = [best_single]
+    return np.array(chosen, dtype=np.intp)
+
+
+def _solve_exact(cost, gain, budget, groups, limits, incumbent=(), max_nodes=200000):
+    """
+    Sac à dos 0/1 exact par séparation et évaluation, plafonds compris
+
+    Parcours en profondeur sur les parcelles triées par rendement : à
+    chaque pas, la parcelle est prise si elle tient (budget et plafonds),
+    l'alternative « sans elle » étant empilée. Borne d'une branche = gain
+    acquis + relaxation linéaire des parcelles restantes sous le budget
+    restant et les plafonds restants d'une colonne (la plus serrée des
+    colonnes s'il y en a plusieurs).
+
+    Returns:
+        indices de la solution optimale (triés), ou None si max_nodes
+        pas de recherche ne suffisent pas à prouver l'optimalité
+    """
+    n = len(cost)
+    order = np.argsort(-gain / cost, kind='stable')
+    c = cost[order].tolist()
+    g = gain[order].tolist()
+    group_of = [codes[order].tolist() for codes in groups]
+
+    def relaxation(items):
+        """Sommes préfixes (coût, gain) d'une liste de positions triées"""
+        return (np.concatenate([[0.0], np.cumsum(cost[order][items])]).tolist(),
+                np.concatenate([[0.0], np.cumsum(gain[order][items])]).tolist(),
+                [c[i] for i in items], [g[i] for i in items])
+
+    everything = relaxation(np.arange(n))
+    # Par colonne et par groupe : relaxation + rang local de chaque position globale
+    # (spent(t) : coût des positions k..t-1 du groupe, plafonné)
+    group_relax = []
+    for codes, limit in zip(group_of, limits):
+        codes = np.asarray(codes, dtype=np.int64)
+        per_group = []
+        for code in range(len(limit)):
+            members = np.flatnonzero(codes == code)
+            rank = np.searchsorted(members, np.arange(n + 1)).tolist()
+            per_group.append((relaxation(members), rank))
+        group_relax.append(per_group)
+
+    def lp(relax, first, capacity):
+        prefix_c, prefix_g, item_c, item_g = relax
+        limit_c = prefix_c[first] + capacity
+        last = bisect_right(prefix_c, limit_c, first) - 1
+        value = prefix_g[last] - prefix_g[first]
+        if last < len(item_c):
+            value += item_g[last] * (limit_c - prefix_c[last]) / item_c[last]
+        return value
+
+    def column_bound(k, capacity, per_group, left):
+        """
+        Relaxation linéaire exacte sous budget + plafonds d'une colonne
+
+        Remplissage fractionnaire par rendement, chaque groupe étant
+        tronqué à son plafond restant : on cherche par dichotomie la
+        dernière position t dont le préfixe (plafonné par groupe) tient
+        dans le budget, puis on complète avec une fraction de t.
+        """
+        starts = [rank[k] for _, rank in per_group]
+
+        def spent(t):
+            return sum(min(relax[0][rank[t]] - relax[0][first], room)
+                       for (relax, rank), first, room in zip(per_group, starts, left))
+
+        lo, hi = k, n
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if spent(mid) <= capacity:
+                lo = mid
+            else:
+                hi = mid - 1
+        value = 0.0
+        for (relax, rank), first, room in zip(per_group, starts, left):
+            used = min(relax[0][rank[lo]] - relax[0][first], room)
+            if used > 0:
+                value += lp(relax, first, used)
+        if lo < n:
+            value += (capacity - spent(lo)) * g[lo] / c[lo]
+        return value
+
+    def bound(k, capacity, left):
+        if not group_relax:
+            return lp(everything, k, capacity)
+        return min(column_bound(k, capacity, per_group, group_left)
+                   for per_group, group_left in zip(group_relax, left))
+
+    incumbent = np.asarray(incumbent, dtype=np.intp)
+    best_value = float(gain[incumbent].sum())
+    rank_of = np.empty(n, dtype=np.intp)
+    rank_of[order] = np.arange(n)
+    best_path = sorted(rank_of[incumbent].tolist())
+    tolerance = 1e-9 * max(best_value, 1.0)
+
+    path = []
+    stack = [(0, float(budget), 0.0, 0, tuple(tuple(limit.tolist()) for limit in limits))]
+    steps = 0
+    while stack:
+        k, capacity, value, depth, left = stack.pop()
+        del path[depth:]
+        left = [list(group_left) for group_left in left]
+        while k < n:
+            steps += 1
+            if steps > max_nodes:
+                return None
+            if value + bound(k, capacity, left) <= best_value + tolerance:
+                break
+            ck = c[k]
+            if ck <= capacity and all(ck <= group_left[codes[k]]
+                                      for codes, group_left in zip(group_of, left)):
+                stack.append((k + 1, capacity, value, len(path),
+                              tuple(tuple(group_left) for group_left in left)))
+                path.append(k)
+                capacity -= ck
+                value += g[k]
+                for codes, group_left in zip(group_of, left):
+                    group_left[codes[k]] -= ck
+            k += 1
+        if value > best_value + tolerance:
+            best_value, best_path = value, list(path)
+    return np.sort(order[np.asarray(best_path, dtype=np.intp)])
+
+
+# Test et démonstration
+if __name__ == "__main__":
+    from satellite_analyzer import SatelliteParcelAnalyzer
+
+    print("=" * 70)
+    print("💼 FERALYX V2.0 - PORTEFEUILLE DE PARCELLES")
+    print("=" * 70)
+
+    analyzer = SatelliteParcelAnalyzer()
+    if os.path.exists('models/satellite_analyzer.pkl'):
+        analyzer.load('models/satellite_analyzer.pkl')
+    else:
+        analyzer.train_models()
+
+    parcels = analyzer.generate_training_data(100000, output_path=None, random_state=0)
+    results = pd.concat([parcels[['pays', 'region']], analyzer.analyze_parcels(parcels)], axis=1)
+
+    print("\n📍 100 000 candidats, budget 20 M€ (glouton)")
+    select_portfolio(results, 20e6)
+
+    print("\n📍 1 000 candidats, budget 5 M€, France plafonnée à 1 M€ (auto : exact si prouvé)")
+    select_portfolio(results.iloc[:1000], 5e6, caps={'pays': {'france': 1e6}})
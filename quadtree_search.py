@@ -0,0 +1,109 @@
+"""
+Feralyx V2.0 - Recherche adaptative par quadtree des meilleures zones
+Score une grille grossière puis ne subdivise que les cellules qui peuvent
+encore contenir un résultat du top-k
+"""
+
+import numpy as np
+
+
+def adaptive_topk_search(score_fn, lat_range, lon_range, k=20, coarse_resolution=16,
+                         min_cell_size=0.01, safety=1.5, max_evaluations=2000000):
+    """
+    Recherche top-k grossier → fin
+
+    Chaque cellule est représentée par son centre. À chaque niveau, les
+    cellules actives sont coupées en 4 et tous les nouveaux centres sont
+    scorés en un seul appel. Une cellule reste active si son score plus
+    une marge locale (safety x écart maximal entre ses sœurs et leur
+    parent, i.e. la rugosité du score à cette échelle) peut encore
+    dépasser le k-ième meilleur score déjà trouvé.
+
+    Args:
+        score_fn: fonction (lat, lon) → dict de tableaux contenant 'score'
+        lat_range, lon_range: (min, max) de la zone
+        k: nombre de meilleurs points recherchés
+        coarse_resolution: points par axe de la grille initiale
+        min_cell_size: taille de cellule (degrés) où l'on arrête de subdiviser
+        safety: multiplicateur de la marge de rugosité
+        max_evaluations: garde-fou sur le nombre total d'évaluations
+
+    Returns:
+        dict avec 'top' (dict de tableaux triés par score décroissant) et
+        'stats' (évaluations, équivalent grille dense, gain)
+    """
+    lat_min, lat_max = lat_range
+    lon_min, lon_max = lon_range
+    size_lat = (lat_max - lat_min) / coarse_resolution
+    size_lon = (lon_max - lon_min) / coarse_resolution
+
+    # Grille grossière : centres des cellules
+    lat_c = lat_min + (np.arange(coarse_resolution) + 0.5) * size_lat
+    lon_c = lon_min + (np.arange(coarse_resolution) + 0.5) * size_lon
+    cell_lat = np.repeat(lat_c, coarse_resolution)
+    cell_lon = np.tile(lon_c, coarse_resolution)
+
+    values = score_fn(cell_lat, cell_lon)
+    evaluated = {name: [np.asarray(v)] for name, v in values.items()}
+    evaluated['lat'] = [cell_lat]
+    evaluated['lon'] = [cell_lon]
+    cell_score = np.asarray(values['score'], dtype=np.float64)
+    # Pas encore de rugosité mesurée au niveau grossier : marge = écart-type global
+    cell_slack = np.full(len(cell_score), safety * cell_score.std())
+    n_evaluations = len(cell_score)
+    levels = 0
+
+    offsets = np.array([[-0.25, -0.25], [-0.25, 0.25], [0.25, -0.25], [0.25, 0.25]])
+
+    while max(size_lat, size_lon) > min_cell_size and n_evaluations < max_evaluations:
+        threshold = _kth_best(np.concatenate(evaluated['score']), k)
+        active = cell_score + cell_slack >= threshold
+        if not active.any():
+            break
+
+        parent_lat = cell_lat[active]
+        parent_lon = cell_lon[active]
+        parent_score = cell_score[active]
+
+        # 4 enfants par cellule active, scorés en un seul lot
+        cell_lat = (parent_lat[:, np.newaxis] + offsets[:, 0] * size_lat).ravel()
+        cell_lon = (parent_lon[:, np.newaxis] + offsets[:, 1] * size_lon).ravel()
+        size_lat /= 2
+        size_lon /= 2
+
+        values = score_fn(cell_lat, cell_lon)
+        for name, v in values.items():
+            evaluated[name].append(np.asarray(v))
+        evaluated['lat'].append(cell_lat)
+        evaluated['lon'].append(cell_lon)
+        cell_score = np.asarray(values['score'], dtype=np.float64)
+        n_evaluations += len(cell_score)
+        levels += 1
+
+        # Rugosité locale : écart max entre les 4 enfants et leur parent
+        roughness = np.abs(cell_score.reshape(-1, 4) - parent_score[:, np.newaxis]).max(axis=1)
+        cell_slack = np.repeat(safety * roughness, 4)
+
+    points = {name: np.concatenate(parts) for name, parts in evaluated.items()}
+    order = np.argsort(-points['score'], kind='stable')[:k]
+    top = {name: values[order] for name, values in points.items()}
+
+    # Grille uniforme de même finesse que le niveau effectivement atteint
+    # (arrêt anticipé : plus de cellule active ou max_evaluations)
+    n_dense = (coarse_resolution * 2 ** levels) ** 2
+    stats = {
+        'evaluations': n_evaluations,
+        'dense_equivalent': n_dense,
+        'evaluations_saved': max(n_dense - n_evaluations, 0),
+        'reduction_factor': n_dense / max(n_evaluations, 1),
+        'levels': levels,
+        'final_cell_size': (size_lat, size_lon)
+    }
+    return {'top': top, 'stats': stats}
+
+
+def _kth_best(scores, k):
+    """k-ième meilleur score (ou -inf s'il y a moins de k points)"""
+    if len(scores) < k:
+        return -np.inf
+    return np.partition(scores, len(scores) - k)[len(scores) - k]
@@ -1,7 +1,8 @@
 import os
 from datetime import datetime
 
-def generate_combined_report(satellite=None, irrigation=None, disease=None, export=None, heatmaps=[]):
+def generate_combined_report(satellite=None, irrigation=None, disease=None, export=None, heatmaps=[],
+                             explanation=None):
     """
     Génère un rapport HTML complet avec toutes les sections.
     
@@ -10,6 +11,7 @@ def generate_combined_report(satellite=None, irrigation=None, disease=None, expo
     disease : dict du dernier diagnostic maladies
     export : dict de la recommandation export
     heatmaps : liste des chemins vers les images heatmaps
+    explanation : dict de SatelliteParcelAnalyzer.explain_parcel()
     """
     if not os.path.exists('reports'):
         os.makedirs('reports')
@@ -42,6 +44,15 @@ def generate_combined_report(satellite=None, irrigation=None, disease=None, expo
             html += f"{k} : {v}\n"
         html += "</pre></section>"
 
+    # Section Explication des scores
+    if explanation:
+        html += "<section><h2>🔍 Explication des scores</h2><pre>"
+        for output, detail in explanation.items():
+            html += f"{output} (base {detail['base']})\n"
+            for feature, contribution in detail['contributions'].items():
+                html += f"  {feature} : {contribution:+.2f}\n"
+        html += "</pre></section>"
+
     # Section Heatmaps
     if heatmaps:
         html += "<section><h2>🗺️ Heatmaps</h2>"
@@ -5,22 +5,357 @@ Détection de parcelles, NDVI, fertilité, opportunités d'investissement
 
 import numpy as np
 import pandas as pd
-from sklearn.ensemble import RandomForestRegressor, GradientBoostingClassifier, GradientBoostingRegressor
+from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor, HistGradientBoostingRegressor
 from sklearn.preprocessing import StandardScaler
 import pickle
+import copy
+import hashlib
 import os
-import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 from datetime import datetime
 import matplotlib.pyplot as plt
 import matplotlib
 matplotlib.use('Agg')
 
-class SatelliteParcelAnalyzer:
+from tree_engine import CompiledTreeEnsemble
+from quadtree_search import adaptive_topk_search
+from score_cache import ScoreCache
+from comps_index import COMPS_COLUMNS, ComparableParcelIndex
+from land_price_surface import LandPriceSurface
+from surrogate_scorer import LookupTableSurrogate
+from model_artifacts import LazyArtifactMixin, ModelArtifact, artifact_path_for, find_artifact, save_artifact
+
+# Encodage pays/région utilisé à l'inférence
+PAYS_MAP = {'tunisie': 0, 'france': 1, 'italie': 2, 'espagne': 3}
+REGION_MAP = {'nord': 0, 'centre': 1, 'sud': 2}
+
+# Colonnes brutes attendues (avant encodage pays/région)
+RAW_FEATURE_COLS = ['ndvi', 'ndwi', 'temp_surface', 'albedo', 'soil_texture',
+                    'slope', 'altitude', 'distance_water', 'distance_road', 'surface']
+
+# Cultures candidates : (nom, rendement t/ha, prix de vente €/tonne)
+CULTURES = [
+    ('tomate', 55, 520),
+    ('ble', 8, 240),
+    ('mais', 12, 210),
+    ('olivier', 2.5, 3000),
+    ('pomme_de_terre', 35, 230),
+]
+
+CATEGORIES = [
+    "🌟 OPPORTUNITÉ EXCEPTIONNELLE",
+    "✅ BONNE OPPORTUNITÉ",
+    "⚠️ OPPORTUNITÉ MODÉRÉE",
+    "❌ OPPORTUNITÉ FAIBLE",
+]
+
+RISQUES = [
+    "Éloignement sources d'eau",
+    "Terrain en pente (mécanisation difficile)",
+    "Accès routier limité",
+    "Végétation faible ou absente",
+    "Fertilité du sol insuffisante",
+]
+AUCUN_RISQUE = "Aucun risque majeur identifié"
+
+SANTE_VEGETATION = ['Excellente', 'Bonne', 'Moyenne', 'Faible']
+DISPONIBILITE_EAU = ['Élevée', 'Moyenne', 'Faible']
+
+# Résultat compact d'analyze_parcels(compact=True) : float32 et codes
+# (index dans CATEGORIES, CULTURES, SANTE_VEGETATION, DISPONIBILITE_EAU ;
+# pays/région selon PAYS_MAP/REGION_MAP, -1 si absents ; risques = masque
+# de bits sur RISQUES, 0 = aucun risque)
+COMPACT_RESULT_DTYPE = np.dtype([
+    ('pays', 'i1'),
+    ('region', 'i1'),
+    ('fertilite', 'f4'),
+    ('valeur_par_ha', 'f4'),
+    ('valeur_totale', 'f4'),
+    ('score_opportunite', 'f4'),
+    ('categorie', 'i1'),
+    ('culture_recommandee', 'i1'),
+    ('rendement_estime', 'f4'),
+    ('gain_annuel_brut', 'f4'),
+    ('gain_annuel_net', 'f4'),
+    ('roi_annuel', 'f4'),
+    ('risques', 'u1'),
+    ('sante_vegetation', 'i1'),
+    ('disponibilite_eau', 'i1'),
+])
+
+# Zones géographiques par pays
+COUNTRY_BOUNDS = {
+    'tunisie': {'lat': (33.0, 37.5), 'lon': (7.5, 11.5)},
+    'france': {'lat': (42.0, 51.0), 'lon': (-5.0, 8.0)},
+    'italie': {'lat': (36.0, 47.0), 'lon': (6.0, 18.5)},
+    'espagne': {'lat': (36.0, 43.8), 'lon': (-9.3, 3.3)}
+}
+
+# Analyse de sensibilité : demi-largeur du balayage par défaut, bornes
+# physiques des features et sorties suivies
+SENSITIVITY_SPANS = {
+    'ndvi': 0.2, 'ndwi': 0.2, 'temp_surface': 5.0, 'albedo': 0.05, 'soil_texture': 0.2,
+    'slope': 5.0, 'altitude': 100.0, 'distance_water': 5.0, 'distance_road': 2.0, 'surface': 5.0
+}
+FEATURE_BOUNDS = {
+    'ndvi': (-1.0, 1.0), 'ndwi': (-1.0, 1.0), 'albedo': (0.0, 1.0), 'soil_texture': (0.0, 1.0),
+    'slope': (0.0, None), 'altitude': (0.0, None), 'distance_water': (0.0, None),
+    'distance_road': (0.0, None), 'surface': (0.01, None)
+}
+SENSITIVITY_OUTPUTS = ['score_opportunite', 'fertilite', 'valeur_totale', 'gain_annuel_net', 'roi_annuel']
+
+# Sorties explicables → modèle qui les produit
+EXPLAINED_OUTPUTS = {
+    'score_opportunite': 'opportunity_model',
+    'fertilite': 'fertility_model',
+    'valeur_par_ha': 'value_estimator',
+}
+# Sorties produites par la forêt (150+ arbres profonds, ~60 ms/parcelle en
+# TreeSHAP exact) : expliquées seulement sur demande (allow_forest=True)
+FOREST_EXPLAINED_OUTPUTS = {'valeur_par_ha'}
+
+# Modèles approchés par le substitut tabulé (colonnes : score, fertilité)
+SURROGATE_OUTPUTS = ['opportunity_model', 'fertility_model']
+
+# Modèles satellite : (attribut, colonne cible, clé du score, message, libellé R²)
+SATELLITE_MODELS = [
+    ('fertility_model', 'fertility', 'fertility_score',
+     "🌱 Entraînement modèle fertilité...", "R² fertilité"),
+    ('value_estimator', 'value_per_ha', 'value_score',
+     "💰 Entraînement estimateur valeur...", "R² valeur"),
+    ('opportunity_model', 'opportunity_score', 'opportunity_score',
+     "🎯 Entraînement scoring opportunité...", "R² opportunité"),
+]
+
+
+# Modes d'entraînement : 'exact' (estimateurs historiques) ou 'hist'
+# (boosting par histogrammes + arrêt précoce, pour 1-5M de parcelles)
+MODEL_MODES = ('exact', 'hist')
+
+
+def compact_frame(df):
+    """
+    Version compacte d'un DataFrame de parcelles : float32 pour les
+    colonnes numériques, catégories pour pays/région/culture
+    """
+    out = {}
+    for col in df.columns:
+        values = df[col]
+        if col in ('pays', 'region', 'culture_recommandee'):
+            out[col] = values.astype('category')
+        elif pd.api.types.is_float_dtype(values.dtype):
+            out[col] = values.astype(np.float32)
+        else:
+            out[col] = values
+    return pd.DataFrame(out, index=df.index)
+
+
+def decode_compact_results(results):
+    """Tableau structuré COMPACT_RESULT_DTYPE → DataFrame lisible (libellés, listes de risques)"""
+    pays_names = np.array(sorted(PAYS_MAP, key=PAYS_MAP.get) + [None], dtype=object)
+    region_names = np.array(sorted(REGION_MAP, key=REGION_MAP.get) + [None], dtype=object)
+    bits = (results['risques'][:, np.newaxis] >> np.arange(len(RISQUES))) & 1
+    return pd.DataFrame({
+        'pays': pays_names[results['pays']],
+        'region': region_names[results['region']],
+        'fertilite': results['fertilite'],
+        'valeur_par_ha': results['valeur_par_ha'],
+        'valeur_totale': results['valeur_totale'],
+        'score_opportunite': results['score_opportunite'],
+        'categorie': np.array(CATEGORIES, dtype=object)[results['categorie']],
+        'culture_recommandee': np.array([c[0] for c in CULTURES], dtype=object)[results['culture_recommandee']],
+        'rendement_estime': results['rendement_estime'],
+        'gain_annuel_brut': results['gain_annuel_brut'],
+        'gain_annuel_net': results['gain_annuel_net'],
+        'roi_annuel': results['roi_annuel'],
+        'risques': [[RISQUES[k] for k in np.flatnonzero(row)] or [AUCUN_RISQUE] for row in bits],
+        'sante_vegetation': np.array(SANTE_VEGETATION, dtype=object)[results['sante_vegetation']],
+        'disponibilite_eau': np.array(DISPONIBILITE_EAU, dtype=object)[results['disponibilite_eau']]
+    })
+
+
+def bytes_per_parcel(data):
+    """Mémoire occupée par parcelle (octets) d'un DataFrame, tableau NumPy ou dict de tableaux"""
+    if isinstance(data, pd.DataFrame):
+        total, n = data.memory_usage(index=False, deep=True).sum(), len(data)
+    elif isinstance(data, dict):
+        total = sum(np.asarray(v).nbytes for v in data.values())
+        n = len(next(iter(data.values()))) if data else 0
+    else:
+        total, n = data.nbytes, len(data)
+    return total / n if n else 0.0
+
+
+def _category_codes(values, mapping, default):
+    """Codes d'une colonne de libellés (objet ou catégorielle) selon mapping"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        lookup = np.array([mapping.get(c, default) for c in values.cat.categories] + [default])
+        return lookup[values.cat.codes.to_numpy()]
+    return values.map(mapping).fillna(default).to_numpy()
+
+
+def build_satellite_model(name, n_jobs=None, mode='exact'):
+    """Instancie un modèle satellite non entraîné avec ses hyperparamètres"""
+    if mode not in MODEL_MODES:
+        raise ValueError(f"Mode d'entraînement inconnu : {mode} (attendu : {MODEL_MODES})")
+    if mode == 'hist':
+        # Features discrétisées en 255 classes, arrêt précoce sur 10% de validation
+        return HistGradientBoostingRegressor(
+            max_iter=500,
+            learning_rate=0.1,
+            max_leaf_nodes=63,
+            early_stopping=True,
+            validation_fraction=0.1,
+            n_iter_no_change=20,
+            random_state=42
+        )
+    if name == 'fertility_model':
+        return GradientBoostingRegressor(
+            n_estimators=200,
+            learning_rate=0.05,
+            max_depth=6,
+            random_state=42
+        )
+    if name == 'value_estimator':
+        return RandomForestRegressor(
+            n_estimators=150,
+            max_depth=15,
+            random_state=42,
+            n_jobs=n_jobs
+        )
+    if name == 'opportunity_model':
+        return GradientBoostingRegressor(
+            n_estimators=200,
+            learning_rate=0.08,
+            max_depth=7,
+            random_state=42
+        )
+    raise ValueError(f"Modèle satellite inconnu : {name}")
+
+
+def _proc_status_mb(field):
+    """Champ mémoire de /proc/self/status (VmRSS, VmHWM...) en Mo, None si indisponible"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1e3
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    """
+    Remet le pic de mémoire résidente (VmHWM) au niveau actuel
+    
+    Linux uniquement (/proc/self/clear_refs) ; renvoie la mémoire
+    résidente au moment de la remise à zéro (Mo), None si impossible.
+    ru_maxrss ne convient pas : c'est le pic de toute la vie du processus.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        return None
+    return _proc_status_mb('VmRSS')
+
+
+def _fit_satellite_model(name, X, y, n_jobs=None, mode='exact'):
+    """
+    Entraîne un modèle et renvoie (modèle, R², durée en s, pic mémoire en Mo)
+    
+    Le pic mémoire est propre au modèle : surcroît de mémoire résidente
+    pendant son entraînement, au-delà de ce qui était occupé avant
+    (None hors Linux).
+    """
+    baseline = _reset_peak_rss()
+    start = time.perf_counter()
+    model = build_satellite_model(name, n_jobs, mode)
+    model.fit(X, y)
+    score = model.score(X, y)
+    seconds = time.perf_counter() - start
+    peak = _proc_status_mb('VmHWM') if baseline is not None else None
+    if n_jobs is not None and 'n_jobs' in model.get_params():
+        # Le parallélisme ne sert qu'à l'entraînement
+        model.set_params(n_jobs=None)
+    return model, score, seconds, None if peak is None else max(peak - baseline, 0.0)
+
+
+def _fit_satellite_model_shared(name, shm_name, shape, dtype, y, n_jobs=None, mode='exact'):
+    """Point d'entrée worker : attache la matrice partagée puis entraîne"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        X = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        result = _fit_satellite_model(name, X, y, n_jobs, mode)
+        del X
+        return result
+    finally:
+        shm.close()
+
+
+def _frame_digest(df, columns):
+    """Empreinte SHA-256 du contenu de colonnes d'un DataFrame (indépendante de l'index)"""
+    hashes = pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+    return hashlib.sha256(hashes.tobytes()).hexdigest()
+
+
+def _warm_start_fit(model, X, y, n_new_trees, n_new_stages):
+    """
+    Complète un modèle entraîné avec de nouvelles données (warm start)
+    
+    Forêt : n_new_trees arbres ajoutés, entraînés sur X. Boosting :
+    n_new_stages étages ajoutés, ajustés sur les résidus du modèle
+    actuel sur X. Les arbres existants ne sont pas modifiés.
+    
+    Returns:
+        nombre d'arbres ou d'étages ajoutés
+    """
+    size = _ensemble_size(model)
+    if isinstance(model, RandomForestRegressor):
+        model.set_params(warm_start=True, n_estimators=size + n_new_trees)
+    elif isinstance(model, GradientBoostingRegressor):
+        model.set_params(warm_start=True, n_estimators=size + n_new_stages)
+    elif isinstance(model, HistGradientBoostingRegressor):
+        # Le warm start sklearn réapprend la discrétisation sur les nouvelles
+        # données, ce qui fausse les étages existants : les nouveaux étages
+        # sont appris à part sur les résidus puis ajoutés au modèle
+        params = {**model.get_params(), 'max_iter': n_new_stages,
+                  'early_stopping': False, 'warm_start': False}
+        booster = HistGradientBoostingRegressor(**params).fit(X, y - model.predict(X))
+        stages = booster._predictors
+        # Prédiction initiale du booster intégrée aux feuilles du premier étage
+        stages[0][0].nodes['value'] += booster._baseline_prediction.ravel()[0]
+        model._predictors.extend(stages)
+        model.set_params(max_iter=max(model.max_iter, model.n_iter_))
+        return len(stages)
+    else:
+        raise TypeError(f"Warm start non supporté : {type(model).__name__}")
+    model.fit(X, y)
+    model.set_params(warm_start=False)
+    return _ensemble_size(model) - size
+
+
+def _ensemble_size(model):
+    """Nombre d'arbres (forêt) ou d'étages (boosting) d'un modèle entraîné"""
+    if isinstance(model, RandomForestRegressor):
+        return len(model.estimators_)
+    if isinstance(model, HistGradientBoostingRegressor):
+        return model.n_iter_
+    return model.n_estimators_
+
+
+class SatelliteParcelAnalyzer(LazyArtifactMixin):
     """
     Analyse satellite avancée pour détection d'opportunités agricoles
     Utilise Computer Vision + ML pour évaluer parcelles
     """
     
+    # Taille de lot maximale servie par le moteur compilé
+    COMPILED_MAX_ROWS = 512
+    
     def __init__(self):
         self.ndvi_model = None
         self.fertility_model = None
@@ -29,232 +364,597 @@ class SatelliteParcelAnalyzer:
         self.scaler = StandardScaler()
         self.is_trained = False
         self.feature_cols = []  # AJOUTÉ : liste des features
+        self.compiled_models = {}  # Moteur d'inférence compilé (optionnel)
+        self.score_cache = None  # Cache LRU des prédictions (optionnel)
+        self.model_version = 0  # Incrémentée à chaque changement de modèles
+        self._explainers = {}  # Arbres compilés avec couverture, pour explain_parcels
+        self.surrogates = {}  # Tables de substitution par (pays, région), pour les heatmaps
+        self.model_modes = {name: 'exact' for name, *_ in SATELLITE_MODELS}
+        self.dataset_info = None  # Empreinte et volume des données d'entraînement
+        self.comps_index = None  # Parcelles de référence comparables (k-NN)
         
-        # Base de données des prix fonciers (€/hectare) - données réelles 2024
-        self.land_prices = {
-            'tunisie': {'nord': 8000, 'centre': 12000, 'sud': 6000},
-            'france': {'nord': 45000, 'centre': 35000, 'sud': 55000},
-            'italie': {'nord': 40000, 'centre': 38000, 'sud': 28000},
-            'espagne': {'nord': 30000, 'centre': 25000, 'sud': 32000}
-        }
+        # Prix fonciers (€/hectare) : raster continu par pays, ouvert au premier usage
+        self._land_prices = None
         
         print("🛰️ Analyseur Satellite Feralyx V2.0 initialisé")
     
-    def generate_training_data(self, n_parcels=1000):
+    @property
+    def land_prices(self):
+        """Surface des prix fonciers (models/land_prices.artifact, construite si absente)"""
+        if self._land_prices is None:
+            self._land_prices = LandPriceSurface.load_or_build(COUNTRY_BOUNDS)
+        return self._land_prices
+    
+    def land_price_factor(self, lat, lon, pays):
+        """
+        Correction locale du prix : prix du raster au point / prix moyen du pays
+        
+        Les modèles de valeur ne voient pas la localisation fine ; ce
+        facteur ramène leur estimation au prix foncier du point. Vaut 1
+        pour un pays sans raster ou des coordonnées absentes (NaN).
+        N'a de sens que si les modèles ont appris des prix du raster
+        (voir trained_on_raster_prices) : sur des prix régionaux, la
+        localisation serait comptée deux fois.
+        """
+        factor = self.land_prices.price_per_ha(lat, lon, pays) / self.land_prices.mean_price(pays)
+        return np.where(np.isfinite(factor), factor, 1.0)
+    
+    @property
+    def trained_on_raster_prices(self):
+        """Vrai si toutes les parcelles d'entraînement sont valorisées par le raster de prix"""
+        return (self.dataset_info or {}).get('land_prices') == 'raster'
+    
+    def _priced_by_raster(self, df):
+        """
+        Vrai si value_per_ha suit le raster de prix (données de generate_training_data)
+        
+        value_per_ha / (0.5 + fertilité/100) doit redonner le prix du
+        raster au point ; toute autre source (barème régional, ventes
+        réelles) est traitée comme non valorisée par le raster.
+        """
+        if df.empty or not {'lat', 'lon', 'fertility', 'value_per_ha'} <= set(df.columns):
+            return False
+        base = df['value_per_ha'].to_numpy() / (0.5 + df['fertility'].to_numpy() / 100)
+        price = self.land_prices.price_per_ha(df['lat'].to_numpy(), df['lon'].to_numpy(),
+                                              df['pays'].to_numpy())
+        return bool(np.allclose(base, price, rtol=1e-4, equal_nan=False))
+    
+    def generate_training_data(self, n_parcels=1000, output_path='data/satellite_parcels.csv',
+                               random_state=None, compact=False):
         """
         Génère dataset synthétique mais réaliste pour entraînement
-        Simule données satellite + terrain
+        Simule données satellite + terrain (tirages vectorisés : plusieurs
+        millions de parcelles en quelques secondes)
+        
+        Args:
+            n_parcels: nombre de parcelles
+            output_path: CSV de sortie (None = pas de sauvegarde)
+            random_state: graine (optionnel)
+            compact: DataFrame renvoyé en float32 + catégories (voir compact_frame)
         """
         print(f"📊 Génération de {n_parcels} parcelles virtuelles...")
         
-        data = []
+        rng = np.random.default_rng(random_state)
+        n = n_parcels
         
-        for _ in range(n_parcels):
-            # Localisation
-            pays = np.random.choice(['tunisie', 'france', 'italie', 'espagne'])
-            region = np.random.choice(['nord', 'centre', 'sud'])
-            
-            # Coordonnées GPS (simulées)
-            if pays == 'tunisie':
-                lat = np.random.uniform(33.0, 37.5)
-                lon = np.random.uniform(7.5, 11.5)
-            elif pays == 'france':
-                lat = np.random.uniform(42.0, 51.0)
-                lon = np.random.uniform(-5.0, 8.0)
-            elif pays == 'italie':
-                lat = np.random.uniform(36.0, 47.0)
-                lon = np.random.uniform(6.0, 18.5)
-            else:  # espagne
-                lat = np.random.uniform(36.0, 43.8)
-                lon = np.random.uniform(-9.3, 3.3)
-            
-            # Indices satellite (simulés mais réalistes)
-            # NDVI : -1 à 1 (végétation saine > 0.6)
-            ndvi = np.random.uniform(-0.2, 0.95)
-            
-            # NDWI : -1 à 1 (présence d'eau > 0.3)
-            ndwi = np.random.uniform(-0.3, 0.8)
-            
-            # Température surface (°C)
-            temp_surface = np.random.uniform(15, 45)
-            
-            # Albedo (réflectance)
-            albedo = np.random.uniform(0.1, 0.4)
-            
-            # Texture du sol (rugosité radar)
-            soil_texture = np.random.uniform(0, 1)
-            
-            # Pente terrain (%)
-            slope = np.random.exponential(5)
-            
-            # Altitude (m)
-            altitude = np.random.uniform(0, 800)
-            
-            # Distance à l'eau (km)
-            distance_water = np.random.exponential(10)
-            
-            # Distance à la route (km)
-            distance_road = np.random.exponential(3)
-            
-            # Surface parcelle (hectares)
-            surface = np.random.uniform(0.5, 50)
-            
-            # Calcul fertilité (0-100)
-            fertility = (
-                ndvi * 30 +
-                (1 - abs(ndwi - 0.3) / 0.7) * 20 +
-                (1 - soil_texture) * 15 +
-                max(0, 40 - temp_surface) / 40 * 15 +
-                max(0, 20 - slope) / 20 * 10 +
-                max(0, 10 - distance_water) / 10 * 10
-            )
-            fertility = np.clip(fertility, 0, 100)
-            
-            # Valeur estimée (€/ha)
-            base_price = self.land_prices[pays][region]
-            value_per_ha = base_price * (0.5 + fertility / 100)
-            
-            # Score opportunité (0-100)
-            opportunity_score = (
-                fertility * 0.4 +
-                (1 - distance_road / 20) * 20 +
-                (1 - distance_water / 20) * 15 +
-                (surface / 50) * 10 +
-                (ndvi > 0.6) * 15
-            )
-            opportunity_score = np.clip(opportunity_score, 0, 100)
-            
-            # Culture recommandée (basée sur conditions)
-            if ndvi > 0.7 and fertility > 70:
-                culture = 'tomate'
-            elif ndvi > 0.5 and temp_surface < 30:
-                culture = 'ble'
-            elif distance_water < 5 and fertility > 60:
-                culture = 'mais'
-            elif temp_surface > 30 and altitude < 200:
-                culture = 'olivier'
-            else:
-                culture = 'pomme_de_terre'
-            
-            data.append({
-                'pays': pays,
-                'region': region,
-                'lat': lat,
-                'lon': lon,
-                'ndvi': ndvi,
-                'ndwi': ndwi,
-                'temp_surface': temp_surface,
-                'albedo': albedo,
-                'soil_texture': soil_texture,
-                'slope': slope,
-                'altitude': altitude,
-                'distance_water': distance_water,
-                'distance_road': distance_road,
-                'surface': surface,
-                'fertility': fertility,
-                'value_per_ha': value_per_ha,
-                'opportunity_score': opportunity_score,
-                'culture_recommandee': culture
-            })
-        
-        df = pd.DataFrame(data)
+        # Localisation
+        pays_list = np.array(['tunisie', 'france', 'italie', 'espagne'], dtype=object)
+        region_list = np.array(['nord', 'centre', 'sud'], dtype=object)
+        pays_idx = rng.integers(0, len(pays_list), n)
+        region_idx = rng.integers(0, len(region_list), n)
+        pays = pays_list[pays_idx]
+        region = region_list[region_idx]
         
-        # Sauvegarder
-        os.makedirs('data', exist_ok=True)
-        df.to_csv('data/satellite_parcels.csv', index=False)
+        # Coordonnées GPS (simulées) dans la zone du pays
+        lat_bounds = np.array([COUNTRY_BOUNDS[p]['lat'] for p in pays_list])
+        lon_bounds = np.array([COUNTRY_BOUNDS[p]['lon'] for p in pays_list])
+        lat = rng.uniform(lat_bounds[pays_idx, 0], lat_bounds[pays_idx, 1])
+        lon = rng.uniform(lon_bounds[pays_idx, 0], lon_bounds[pays_idx, 1])
+        
+        # Indices satellite (simulés mais réalistes)
+        # NDVI : -1 à 1 (végétation saine > 0.6)
+        ndvi = rng.uniform(-0.2, 0.95, n)
+        
+        # NDWI : -1 à 1 (présence d'eau > 0.3)
+        ndwi = rng.uniform(-0.3, 0.8, n)
+        
+        # Température surface (°C)
+        temp_surface = rng.uniform(15, 45, n)
+        
+        # Albedo (réflectance)
+        albedo = rng.uniform(0.1, 0.4, n)
+        
+        # Texture du sol (rugosité radar)
+        soil_texture = rng.uniform(0, 1, n)
+        
+        # Pente terrain (%)
+        slope = rng.exponential(5, n)
         
-        print(f"   ✅ Dataset sauvegardé : data/satellite_parcels.csv")
+        # Altitude (m)
+        altitude = rng.uniform(0, 800, n)
+        
+        # Distance à l'eau (km)
+        distance_water = rng.exponential(10, n)
+        
+        # Distance à la route (km)
+        distance_road = rng.exponential(3, n)
+        
+        # Surface parcelle (hectares)
+        surface = rng.uniform(0.5, 50, n)
+        
+        # Calcul fertilité (0-100)
+        fertility = (
+            ndvi * 30 +
+            (1 - np.abs(ndwi - 0.3) / 0.7) * 20 +
+            (1 - soil_texture) * 15 +
+            np.maximum(0, 40 - temp_surface) / 40 * 15 +
+            np.maximum(0, 20 - slope) / 20 * 10 +
+            np.maximum(0, 10 - distance_water) / 10 * 10
+        )
+        fertility = np.clip(fertility, 0, 100)
+        
+        # Valeur estimée (€/ha) : prix foncier interpolé au point
+        base_price = self.land_prices.price_per_ha(lat, lon, pays)
+        value_per_ha = base_price * (0.5 + fertility / 100)
+        
+        # Score opportunité (0-100)
+        opportunity_score = (
+            fertility * 0.4 +
+            (1 - distance_road / 20) * 20 +
+            (1 - distance_water / 20) * 15 +
+            (surface / 50) * 10 +
+            (ndvi > 0.6) * 15
+        )
+        opportunity_score = np.clip(opportunity_score, 0, 100)
+        
+        # Culture recommandée (basée sur conditions)
+        culture_code = self._culture_codes(ndvi, temp_surface, distance_water, altitude, fertility)
+        culture = np.array([c[0] for c in CULTURES], dtype=object)[culture_code]
+        
+        df = pd.DataFrame({
+            'pays': pays,
+            'region': region,
+            'lat': lat,
+            'lon': lon,
+            'ndvi': ndvi,
+            'ndwi': ndwi,
+            'temp_surface': temp_surface,
+            'albedo': albedo,
+            'soil_texture': soil_texture,
+            'slope': slope,
+            'altitude': altitude,
+            'distance_water': distance_water,
+            'distance_road': distance_road,
+            'surface': surface,
+            'fertility': fertility,
+            'value_per_ha': value_per_ha,
+            'opportunity_score': opportunity_score,
+            'culture_recommandee': culture
+        })
+        
+        # Sauvegarder
+        if output_path:
+            os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+            df.to_csv(output_path, index=False)
+            print(f"   ✅ Dataset sauvegardé : {output_path}")
+        if compact:
+            df = compact_frame(df)
         return df
     
-    def train_models(self, data_path='data/satellite_parcels.csv'):
+    def train_models(self, data_path='data/satellite_parcels.csv', n_jobs=1, modes=None,
+                     chunksize=None):
         """
         Entraîne les modèles IA sur données satellite
+        
+        Args:
+            data_path: CSV d'entraînement
+            n_jobs: 1 = entraînement séquentiel ; > 1 (ou -1 = tous les
+                    cœurs) = les trois modèles sont entraînés en parallèle
+                    dans un pool de processus, la matrice normalisée étant
+                    partagée en mémoire. Les cœurs restants sont donnés à
+                    la forêt aléatoire.
+            modes: dict {nom du modèle: 'exact' | 'hist'} ; les modèles non
+                   cités gardent leur mode actuel (self.model_modes)
+            chunksize: si renseigné, le CSV est lu par blocs de chunksize
+                       lignes directement en float32 (gros historiques)
+        
+        Returns:
+            dict avec les R² et un rapport par modèle (durée, surcroît de
+            mémoire résidente pendant son entraînement)
         """
         print("\n🤖 Entraînement des modèles satellite...")
         
+        if modes:
+            for name, mode in modes.items():
+                if name not in self.model_modes:
+                    raise ValueError(f"Modèle satellite inconnu : {name}")
+                if mode not in MODEL_MODES:
+                    raise ValueError(f"Mode d'entraînement inconnu : {mode} (attendu : {MODEL_MODES})")
+            self.model_modes.update(modes)
+        
+        # Features
+        feature_cols = ['ndvi', 'ndwi', 'temp_surface', 'albedo', 'soil_texture',
+                       'slope', 'altitude', 'distance_water', 'distance_road',
+                       'surface', 'pays_encoded', 'region_encoded']
+        
         # Charger données
         if not os.path.exists(data_path):
             print("   📊 Dataset non trouvé, génération...")
-            df = self.generate_training_data(1000)
-        else:
+            df = self.generate_training_data(1000, output_path=data_path)
+        elif not chunksize:
             df = pd.read_csv(data_path)
         
-        # Encoder pays/région
-        df['pays_encoded'] = pd.Categorical(df['pays']).codes
-        df['region_encoded'] = pd.Categorical(df['region']).codes
+        if chunksize:
+            X_scaled, targets, fingerprint, raster_prices = self._load_training_chunks(
+                data_path, feature_cols, chunksize)
+        else:
+            fingerprint = _frame_digest(df, self._dataset_columns())
+            raster_prices = self._priced_by_raster(df)
+            # Encoder pays/région (mêmes codes qu'à l'inférence)
+            df['pays_encoded'] = _category_codes(df['pays'], PAYS_MAP, 0)
+            df['region_encoded'] = _category_codes(df['region'], REGION_MAP, 1)
+            
+            X = df[feature_cols]
+            
+            # Normalisation
+            X_scaled = self.scaler.fit_transform(X)
+            targets = {name: df[target].to_numpy() for name, target, *_ in SATELLITE_MODELS}
         
-        # Features
-        feature_cols = ['ndvi', 'ndwi', 'temp_surface', 'albedo', 'soil_texture',
-                       'slope', 'altitude', 'distance_water', 'distance_road',
-                       'surface', 'pays_encoded', 'region_encoded']
+        if n_jobs == -1:
+            n_jobs = os.cpu_count() or 1
         
-        X = df[feature_cols]
+        if n_jobs > 1:
+            fitted = self._train_parallel(X_scaled, targets, n_jobs)
+        else:
+            fitted = {}
+            for name, _, _, label, _ in SATELLITE_MODELS:
+                print(f"   {label}")
+                fitted[name] = _fit_satellite_model(name, X_scaled, targets[name],
+                                                    mode=self.model_modes[name])
         
-        # Normalisation
-        X_scaled = self.scaler.fit_transform(X)
+        scores = {}
+        training_report = {}
+        for name, _, score_key, _, r2_label in SATELLITE_MODELS:
+            model, score, seconds, peak_mb = fitted[name]
+            setattr(self, name, model)
+            scores[score_key] = score
+            training_report[name] = {
+                'mode': self.model_modes[name],
+                'fit_seconds': seconds,
+                'peak_rss_delta_mb': peak_mb
+            }
+            peak = f", pic +{peak_mb:.0f} Mo" if peak_mb is not None else ""
+            if isinstance(model, HistGradientBoostingRegressor):
+                peak += f", {model.n_iter_} itérations"
+            print(f"      ✅ {r2_label} : {score*100:.1f}% ({seconds:.1f}s{peak})")
         
-        # --- MODÈLE 1 : Prédiction fertilité ---
-        print("   🌱 Entraînement modèle fertilité...")
-        y_fertility = df['fertility']
+        self.is_trained = True
+        self.feature_cols = feature_cols
+        self.compiled_models = {}
+        self._invalidate_cache()
+        self.dataset_info = {
+            'fingerprint': fingerprint,
+            'n_rows': len(X_scaled),
+            'n_rows_initial': len(X_scaled),
+            'land_prices': 'raster' if raster_prices else None,
+            'updates': []
+        }
         
-        self.fertility_model = GradientBoostingRegressor(
-            n_estimators=200,
-            learning_rate=0.05,
-            max_depth=6,
-            random_state=42
-        )
-        self.fertility_model.fit(X_scaled, y_fertility)
+        # Index des comparables (mêmes encodages que les requêtes)
+        self.comps_index = ComparableParcelIndex()
+        if chunksize:
+            for chunk in pd.read_csv(data_path, chunksize=chunksize,
+                                     usecols=list(dict.fromkeys(RAW_FEATURE_COLS + COMPS_COLUMNS))):
+                self._add_comps(chunk)
+        else:
+            self._add_comps(df)
+        print(f"   ✅ Index des comparables : {len(self.comps_index)} parcelles de référence")
         
-        score_fertility = self.fertility_model.score(X_scaled, y_fertility)
-        print(f"      ✅ R² fertilité : {score_fertility*100:.1f}%")
+        # Sauvegarder
+        self.save()
         
-        # --- MODÈLE 2 : Estimation valeur ---
-        print("   💰 Entraînement estimateur valeur...")
-        y_value = df['value_per_ha']
+        return {**scores, 'training_report': training_report}
+    
+    def update(self, new_rows, n_new_trees=None, n_new_stages=None):
+        """
+        Met à jour les modèles avec de nouvelles parcelles étiquetées
         
-        self.value_estimator = RandomForestRegressor(
-            n_estimators=150,
-            max_depth=15,
-            random_state=42
-        )
-        self.value_estimator.fit(X_scaled, y_value)
+        Pas de réentraînement complet : la forêt reçoit n_new_trees arbres
+        entraînés sur les nouvelles lignes, les modèles de boosting
+        n_new_stages étages ajustés sur leurs résidus. Le scaler est
+        conservé pour que les seuils des arbres existants restent valides.
         
-        score_value = self.value_estimator.score(X_scaled, y_value)
-        print(f"      ✅ R² valeur : {score_value*100:.1f}%")
+        Args:
+            new_rows: DataFrame ou CSV au format data/satellite_parcels.csv
+            n_new_trees: arbres ajoutés à la forêt (défaut : 10% de la forêt, min 10)
+            n_new_stages: étages de boosting ajoutés (défaut : 20% des étages, min 10)
         
-        # --- MODÈLE 3 : Score opportunité ---
-        print("   🎯 Entraînement scoring opportunité...")
-        y_opportunity = df['opportunity_score']
+        Returns:
+            dict avec le R² de chaque modèle sur les nouvelles lignes
+            (avant/après), la durée et l'état du jeu de données
+        """
+        if not self.is_trained:
+            raise ValueError("Modèles non entraînés. Appelez .train_models() d'abord.")
         
-        self.opportunity_model = GradientBoostingRegressor(
-            n_estimators=200,
-            learning_rate=0.08,
-            max_depth=7,
-            random_state=42
-        )
-        self.opportunity_model.fit(X_scaled, y_opportunity)
+        df = pd.read_csv(new_rows) if isinstance(new_rows, str) else new_rows.copy()
+        if df.empty:
+            raise ValueError("Aucune nouvelle parcelle")
         
-        score_opp = self.opportunity_model.score(X_scaled, y_opportunity)
-        print(f"      ✅ R² opportunité : {score_opp*100:.1f}%")
+        print(f"\n🔄 Mise à jour incrémentale ({len(df)} nouvelles parcelles)...")
+        start = time.perf_counter()
         
-        self.is_trained = True
-        self.feature_cols = feature_cols
+        # Mêmes codes que l'entraînement et l'inférence (PAYS_MAP / REGION_MAP)
+        df['pays_encoded'] = _category_codes(df['pays'], PAYS_MAP, 0)
+        df['region_encoded'] = _category_codes(df['region'], REGION_MAP, 1)
+        X_scaled = self.scaler.transform(df[self.feature_cols])
         
-        # Sauvegarder
+        report = {}
+        for name, target, _, _, r2_label in SATELLITE_MODELS:
+            model = getattr(self, name)
+            if self.__dict__.get('_lazy_artifact') is not None:
+                # Tableaux mappés en lecture seule : copie modifiable avant warm start
+                model = copy.deepcopy(model)
+                setattr(self, name, model)
+            y = df[target].to_numpy()
+            r2_before = model.score(X_scaled, y)
+            
+            size = _ensemble_size(model)
+            n_added = _warm_start_fit(model, X_scaled, y,
+                                      n_new_trees or max(10, size // 10),
+                                      n_new_stages or max(10, size // 5))
+            
+            r2_after = model.score(X_scaled, y)
+            report[name] = {'added': n_added, 'r2_before': r2_before, 'r2_after': r2_after}
+            print(f"   ✅ {r2_label} (nouvelles parcelles) : {r2_before*100:.1f}% → "
+                  f"{r2_after*100:.1f}% (+{n_added} arbres)")
+        
+        fingerprint = _frame_digest(df, self._dataset_columns())
+        info = self.dataset_info or {'fingerprint': None, 'n_rows': 0,
+                                     'n_rows_initial': None, 'updates': []}
+        info['fingerprint'] = hashlib.sha256(
+            f"{info['fingerprint']}:{fingerprint}".encode()
+        ).hexdigest()
+        info['n_rows'] += len(df)
+        if not self._priced_by_raster(df):
+            # Lot valorisé autrement : plus de correction locale du prix
+            info['land_prices'] = None
+        info['updates'].append({
+            'date': datetime.now().isoformat(),
+            'n_rows': len(df),
+            'fingerprint': fingerprint
+        })
+        self.dataset_info = info
+        if self.comps_index is not None:
+            self._add_comps(df)
+        self.compiled_models = {}
+        self._invalidate_cache()
+        
+        seconds = time.perf_counter() - start
+        print(f"   ⏱️ Mise à jour en {seconds:.1f}s ({info['n_rows']} parcelles au total)")
         self.save()
         
-        return {
-            'fertility_score': score_fertility,
-            'value_score': score_value,
-            'opportunity_score': score_opp
+        return {'models': report, 'seconds': seconds, 'dataset_info': info}
+    
+    @staticmethod
+    def _dataset_columns():
+        """Colonnes couvertes par l'empreinte du jeu d'entraînement"""
+        return ['pays', 'region'] + RAW_FEATURE_COLS + [target for _, target, *_ in SATELLITE_MODELS]
+    
+    def _add_comps(self, df):
+        """Ajoute des lignes d'entraînement à l'index des comparables"""
+        X_scaled = self.scaler.transform(self._build_feature_matrix(df))
+        self.comps_index.add(X_scaled, df['lat'].to_numpy(), df['lon'].to_numpy(),
+                             {col: df[col].to_numpy() for col in COMPS_COLUMNS})
+    
+    def find_comparables(self, parcel_data, k=5):
+        """
+        Parcelles de référence les plus proches d'une parcelle
+        
+        Similarité = distance euclidienne sur les features normalisées et
+        la localisation ; sans lat/lon, le centre du pays est utilisé.
+        
+        Args:
+            parcel_data: dict au format d'analyze_parcel
+            k: nombre de comparables
+        
+        Returns:
+            liste de dicts triés par similarité (valeur par ha et totale
+            observées, surface, localisation, distance)
+        """
+        if self.comps_index is None or not len(self.comps_index) or k <= 0:
+            return []
+        pays = parcel_data.get('pays', 'tunisie')
+        bounds = COUNTRY_BOUNDS.get(pays, COUNTRY_BOUNDS['tunisie'])
+        lat = parcel_data.get('lat', sum(bounds['lat']) / 2)
+        lon = parcel_data.get('lon', sum(bounds['lon']) / 2)
+        
+        x = np.array([parcel_data[col] for col in RAW_FEATURE_COLS]
+                     + [PAYS_MAP.get(pays, 0), REGION_MAP.get(parcel_data.get('region', 'centre'), 1)])
+        # Normalisation directe : évite le coût fixe de scaler.transform sur une ligne
+        x_scaled = (x - self.scaler.mean_) / self.scaler.scale_
+        return self.comps_index.query(x_scaled, lat, lon, k)
+    
+    def _load_training_chunks(self, data_path, feature_cols, chunksize):
+        """
+        Lit un gros CSV par blocs et renvoie (X normalisé float32, cibles,
+        empreinte, valorisation par le raster de prix)
+        
+        La normalisation est apprise au fil des blocs (partial_fit) ; pays
+        et région sont encodés par PAYS_MAP / REGION_MAP, comme à
+        l'inférence, pour que les codes ne dépendent pas du contenu de
+        chaque bloc.
+        """
+        print(f"   📦 Lecture par blocs de {chunksize} lignes...")
+        target_cols = [target for _, target, *_ in SATELLITE_MODELS]
+        
+        self.scaler = StandardScaler()
+        X_blocks, y_blocks = [], []
+        digest = hashlib.sha256()
+        raster_prices = True
+        for chunk in pd.read_csv(data_path, chunksize=chunksize):
+            digest.update(_frame_digest(chunk, self._dataset_columns()).encode())
+            raster_prices = raster_prices and self._priced_by_raster(chunk)
+            chunk['pays_encoded'] = _category_codes(chunk['pays'], PAYS_MAP, 0)
+            chunk['region_encoded'] = _category_codes(chunk['region'], REGION_MAP, 1)
+            self.scaler.partial_fit(chunk[feature_cols])
+            X_blocks.append(chunk[feature_cols].to_numpy(dtype=np.float32))
+            y_blocks.append(chunk[target_cols].to_numpy(dtype=np.float64))
+        
+        X = np.concatenate(X_blocks)
+        del X_blocks
+        y = np.concatenate(y_blocks)
+        
+        # Normalisation en place, bloc par bloc
+        mean = self.scaler.mean_.astype(np.float32)
+        scale = self.scaler.scale_.astype(np.float32)
+        for start in range(0, len(X), chunksize):
+            X[start:start + chunksize] -= mean
+            X[start:start + chunksize] /= scale
+        
+        print(f"   ✅ {len(X)} parcelles chargées ({X.nbytes / 1e6:.0f} Mo)")
+        targets = {name: y[:, j] for j, (name, *_) in enumerate(SATELLITE_MODELS)}
+        return X, targets, digest.hexdigest(), raster_prices
+    
+    def _train_parallel(self, X_scaled, targets, n_jobs):
+        """Entraîne les modèles dans un pool de processus (matrice en mémoire partagée)"""
+        n_models = len(SATELLITE_MODELS)
+        # Les arbres sklearn travaillent en float32 : partager directement ce
+        # format évite une copie par worker et donne des modèles identiques
+        X_shared = np.ascontiguousarray(X_scaled, dtype=np.float32)
+        shm = shared_memory.SharedMemory(create=True, size=X_shared.nbytes)
+        try:
+            np.ndarray(X_shared.shape, dtype=X_shared.dtype, buffer=shm.buf)[:] = X_shared
+            # Cœurs non utilisés par le pool → forêt aléatoire
+            rf_jobs = max(1, n_jobs - (n_models - 1))
+            
+            print(f"   ⚡ Entraînement parallèle ({min(n_jobs, n_models)} processus, "
+                  f"{X_shared.nbytes / 1e6:.1f} Mo partagés)")
+            with ProcessPoolExecutor(max_workers=min(n_jobs, n_models)) as pool:
+                futures = {
+                    name: pool.submit(
+                        _fit_satellite_model_shared, name, shm.name, X_shared.shape,
+                        X_shared.dtype.str, targets[name],
+                        rf_jobs if name == 'value_estimator' else None,
+                        self.model_modes[name]
+                    )
+                    for name, *_ in SATELLITE_MODELS
+                }
+                return {name: future.result() for name, future in futures.items()}
+        finally:
+            shm.close()
+            shm.unlink()
+    
+    def compile_models(self):
+        """
+        Exporte les trois modèles vers le moteur d'inférence compilé
+        
+        Les prédictions suivantes passent par des tableaux NumPy aplatis
+        (tree_engine.CompiledTreeEnsemble) au lieu du predict() sklearn.
+        Le moteur est invalidé par train_models() et load().
+        """
+        if not self.is_trained:
+            raise ValueError("Modèles non entraînés. Appelez .train_models() d'abord.")
+        
+        self.compiled_models = {
+            name: CompiledTreeEnsemble.from_sklearn(getattr(self, name))
+            for name, *_ in SATELLITE_MODELS
         }
+        n_nodes = sum(m.n_nodes for m in self.compiled_models.values())
+        print(f"   ⚙️ Modèles compilés : {n_nodes} nœuds")
+        return self.compiled_models
+    
+    def _model_predict(self, name, X_scaled):
+        """
+        Prédiction via le moteur compilé s'il existe, sinon sklearn
+        
+        Au-delà de COMPILED_MAX_ROWS lignes, la boucle C de sklearn reste
+        plus rapide que la traversée NumPy : le moteur compilé sert surtout
+        les appels unitaires et les petits lots (faible latence).
+        """
+        compiled = self.compiled_models.get(name)
+        if compiled is not None and len(X_scaled) <= self.COMPILED_MAX_ROWS:
+            return compiled.predict(X_scaled)
+        return getattr(self, name).predict(X_scaled)
+    
+    def _predict_all(self, X):
+        """
+        Prédictions des trois modèles pour une matrice brute (n, 12)
+        
+        Returns:
+            tableau (n, 3) : fertilité, valeur/ha, score d'opportunité
+        """
+        cache = self.score_cache
+        if cache is None:
+            X_scaled = self.scaler.transform(X)
+            return np.column_stack([
+                self._model_predict(name, X_scaled) for name, *_ in SATELLITE_MODELS
+            ])
+        
+        # Avec cache : prédiction sur les features de la clé (exactes, ou
+        # quantifiées si decimals), seulement pour les lignes absentes
+        X_quantized = cache.quantize(X)
+        keys = cache.keys(X_quantized, self.model_version)
+        cached = cache.get_many(keys)
+        missing = [i for i, value in enumerate(cached) if value is None]
+        
+        predictions = np.empty((len(keys), len(SATELLITE_MODELS)))
+        if missing:
+            X_scaled = self.scaler.transform(X_quantized[missing])
+            computed = np.column_stack([
+                self._model_predict(name, X_scaled) for name, *_ in SATELLITE_MODELS
+            ])
+            predictions[missing] = computed
+            cache.put_many([keys[i] for i in missing], computed)
+        hits = [i for i, value in enumerate(cached) if value is not None]
+        if hits:
+            predictions[hits] = [cached[i] for i in hits]
+        return predictions
+    
+    def enable_cache(self, max_size=100000, decimals=None):
+        """
+        Active le cache des prédictions (analyze_parcel, analyze_parcels,
+        score_locations) ; inactif par défaut
+        
+        Par défaut la clé est le vecteur de features exact : les résultats
+        sont identiques avec et sans cache. Avec decimals, les features
+        sont arrondies à decimals décimales avant prédiction : deux
+        parcelles identiques à cette précision partagent le même résultat,
+        qui peut s'écarter de la prédiction sans cache (perte de précision
+        acceptée contre plus de succès). Le cache est vidé à chaque
+        train_models(), update() ou load().
+        
+        Args:
+            max_size: nombre maximal de vecteurs en cache (LRU)
+            decimals: précision de quantification des features (None = exacte)
+        """
+        self.score_cache = ScoreCache(max_size=max_size, decimals=decimals)
+        return self.score_cache
+    
+    def disable_cache(self):
+        """Désactive le cache des prédictions"""
+        self.score_cache = None
+    
+    def cache_stats(self):
+        """Compteurs du cache (hits, misses, taux de succès...) ou None s'il est inactif"""
+        return self.score_cache.stats() if self.score_cache is not None else None
     
-    def analyze_parcel(self, parcel_data):
+    def _invalidate_cache(self):
+        """Nouvelle version des modèles : les prédictions en cache sont périmées"""
+        self.model_version += 1
+        self._explainers = {}
+        self.surrogates = {}
+        if self.score_cache is not None:
+            self.score_cache.clear()
+    
+    def analyze_parcel(self, parcel_data, n_comparables=0):
         """
         Analyse complète d'une parcelle satellite
         
         Args:
             parcel_data: dict avec clés ndvi, ndwi, temp_surface, etc.
+            n_comparables: nombre de parcelles de référence comparables
+                           renvoyées sous 'comparables' (0 = pas de
+                           recherche, clé absente)
         
         Returns:
             dict avec analyse complète
@@ -263,11 +963,8 @@ class SatelliteParcelAnalyzer:
             raise ValueError("Modèles non entraînés. Appelez .train_models() d'abord.")
         
         # Encoder pays/région
-        pays_map = {'tunisie': 0, 'france': 1, 'italie': 2, 'espagne': 3}
-        region_map = {'nord': 0, 'centre': 1, 'sud': 2}
-        
-        parcel_data['pays_encoded'] = pays_map.get(parcel_data.get('pays', 'tunisie'), 0)
-        parcel_data['region_encoded'] = region_map.get(parcel_data.get('region', 'centre'), 1)
+        parcel_data['pays_encoded'] = PAYS_MAP.get(parcel_data.get('pays', 'tunisie'), 0)
+        parcel_data['region_encoded'] = REGION_MAP.get(parcel_data.get('region', 'centre'), 1)
         
         # Préparer features
         X = np.array([[
@@ -285,12 +982,11 @@ class SatelliteParcelAnalyzer:
             parcel_data['region_encoded']
         ]])
         
-        X_scaled = self.scaler.transform(X)
-        
         # Prédictions
-        fertility = self.fertility_model.predict(X_scaled)[0]
-        value_per_ha = self.value_estimator.predict(X_scaled)[0]
-        opportunity_score = self.opportunity_model.predict(X_scaled)[0]
+        fertility, value_per_ha, opportunity_score = self._predict_all(X)[0]
+        if self.trained_on_raster_prices and 'lat' in parcel_data and 'lon' in parcel_data:
+            value_per_ha *= float(self.land_price_factor(parcel_data['lat'], parcel_data['lon'],
+                                                         parcel_data.get('pays', 'tunisie'))[0])
         
         # Culture recommandée (logique basée sur conditions)
         ndvi = parcel_data['ndvi']
@@ -354,7 +1050,7 @@ class SatelliteParcelAnalyzer:
         if not risques:
             risques.append("Aucun risque majeur identifié")
         
-        return {
+        result = {
             'fertilite': round(fertility, 1),
             'valeur_par_ha': round(value_per_ha, 0),
             'valeur_totale': round(cout_acquisition, 0),
@@ -369,72 +1065,593 @@ class SatelliteParcelAnalyzer:
             'sante_vegetation': 'Excellente' if ndvi > 0.7 else 'Bonne' if ndvi > 0.5 else 'Moyenne' if ndvi > 0.3 else 'Faible',
             'disponibilite_eau': 'Élevée' if parcel_data['distance_water'] < 3 else 'Moyenne' if parcel_data['distance_water'] < 7 else 'Faible'
         }
+        if n_comparables > 0:
+            result['comparables'] = self.find_comparables(parcel_data, n_comparables)
+        return result
+    
+    def analyze_parcels(self, parcels, compact=False):
+        """
+        Analyse vectorisée d'un lot de parcelles
+        
+        Une seule normalisation et une seule prédiction par modèle pour
+        tout le lot ; les règles métier (culture, ROI, risques, catégorie)
+        sont appliquées par masques NumPy. Chaque ligne est identique au
+        dict renvoyé par analyze_parcel() pour la même parcelle (sans
+        comparables : voir find_comparables).
+        
+        Args:
+            parcels: DataFrame ou tableau structuré NumPy (mêmes champs
+                     que analyze_parcel)
+            compact: features en float32 et résultat en tableau structuré
+                     COMPACT_RESULT_DTYPE (codes au lieu de chaînes,
+                     risques en masque de bits) ; la mémoire par parcelle
+                     est affichée. decode_compact_results() redonne le
+                     DataFrame.
+        
+        Avec un cache de prédictions quantifié (enable_cache(decimals=...)),
+        les prédictions portent sur les features arrondies et peuvent
+        s'écarter légèrement de celles obtenues sans cache ; le cache par
+        défaut (clé exacte) ne change aucun résultat.
+        
+        Returns:
+            DataFrame avec une ligne d'analyse par parcelle, ou tableau
+            structuré si compact=True
+        """
+        if not self.is_trained:
+            raise ValueError("Modèles non entraînés. Appelez .train_models() d'abord.")
+        
+        df = parcels if isinstance(parcels, pd.DataFrame) else pd.DataFrame(parcels)
+        
+        X = self._build_feature_matrix(df, dtype=np.float32 if compact else np.float64)
+        predictions = self._predict_all(X)
+        if self.trained_on_raster_prices and 'lat' in df and 'lon' in df:
+            predictions[:, 1] *= self.land_price_factor(
+                df['lat'].to_numpy(), df['lon'].to_numpy(),
+                df['pays'].to_numpy() if 'pays' in df else 'tunisie')
+        
+        if not compact:
+            return self._build_results(df, *predictions.T)
+        
+        results = self._build_results(df, *predictions.T, compact=True)
+        print(f"   📦 {len(results)} parcelles : {bytes_per_parcel(results):.0f} octets/parcelle "
+              f"(features {bytes_per_parcel(X):.0f} octets/parcelle)")
+        return results
+    
+    def _build_feature_matrix(self, df, dtype=np.float64):
+        """Construit la matrice (n, 12) dans l'ordre de feature_cols"""
+        n = len(df)
+        X = np.empty((n, len(RAW_FEATURE_COLS) + 2), dtype=dtype)
+        for j, col in enumerate(RAW_FEATURE_COLS):
+            X[:, j] = df[col].to_numpy(dtype=dtype)
+        
+        X[:, -2] = _category_codes(df['pays'], PAYS_MAP, 0) if 'pays' in df else PAYS_MAP['tunisie']
+        X[:, -1] = _category_codes(df['region'], REGION_MAP, 1) if 'region' in df else REGION_MAP['centre']
+        return X
+    
+    @staticmethod
+    def _culture_codes(ndvi, temp, water_dist, altitude, fertility):
+        """Culture recommandée (index dans CULTURES) : première condition vraie"""
+        culture_conditions = [
+            (ndvi > 0.7) & (fertility > 70),
+            (ndvi > 0.5) & (temp < 30),
+            (water_dist < 5) & (fertility > 60),
+            (temp > 30) & (altitude < 200),
+        ]
+        return np.select(culture_conditions, np.arange(4), default=4).astype(np.int8)
+    
+    def _build_results(self, df, fertility, value_per_ha, opportunity_score, compact=False):
+        """Applique les règles métier d'analyze_parcel sur des tableaux"""
+        ndvi = df['ndvi'].to_numpy(dtype=np.float64)
+        temp = df['temp_surface'].to_numpy(dtype=np.float64)
+        water_dist = df['distance_water'].to_numpy(dtype=np.float64)
+        altitude = df['altitude'].to_numpy(dtype=np.float64)
+        slope = df['slope'].to_numpy(dtype=np.float64)
+        road_dist = df['distance_road'].to_numpy(dtype=np.float64)
+        surface = df['surface'].to_numpy(dtype=np.float64)
+        
+        culture_code = self._culture_codes(ndvi, temp, water_dist, altitude, fertility)
+        noms = np.array([c[0] for c in CULTURES], dtype=object)
+        rendements = np.array([c[1] for c in CULTURES], dtype=np.float64)
+        prix = np.array([c[2] for c in CULTURES], dtype=np.float64)
+        rendement_estimate = rendements[culture_code]
+        
+        # Calcul ROI estimé
+        cout_acquisition = value_per_ha * surface
+        gain_annuel_brut = rendement_estimate * surface * prix[culture_code]
+        cout_exploitation = cout_acquisition * 0.08
+        gain_net = gain_annuel_brut - cout_exploitation
+        with np.errstate(divide='ignore', invalid='ignore'):
+            roi_annuel = np.where(cout_acquisition > 0, (gain_net / cout_acquisition) * 100, 0.0)
+        
+        # Catégorisation opportunité
+        categorie_code = np.select(
+            [opportunity_score > 80, opportunity_score > 60, opportunity_score > 40],
+            [0, 1, 2], default=3
+        )
+        categories = np.array(CATEGORIES, dtype=object)
+        
+        # Risques identifiés
+        risk_masks = np.column_stack([
+            water_dist > 10,
+            slope > 15,
+            road_dist > 5,
+            ndvi < 0.3,
+            fertility < 40,
+        ])
+        sante_code = np.select([ndvi > 0.7, ndvi > 0.5, ndvi > 0.3], [0, 1, 2], default=3)
+        eau_code = np.select([water_dist < 3, water_dist < 7], [0, 1], default=2)
+        
+        if compact:
+            results = np.empty(len(df), dtype=COMPACT_RESULT_DTYPE)
+            results['pays'] = _category_codes(df['pays'], PAYS_MAP, -1) if 'pays' in df else -1
+            results['region'] = _category_codes(df['region'], REGION_MAP, -1) if 'region' in df else -1
+            results['fertilite'] = np.round(fertility, 1)
+            results['valeur_par_ha'] = np.round(value_per_ha, 0)
+            results['valeur_totale'] = np.round(cout_acquisition, 0)
+            results['score_opportunite'] = np.round(opportunity_score, 1)
+            results['categorie'] = categorie_code
+            results['culture_recommandee'] = culture_code
+            results['rendement_estime'] = rendement_estimate
+            results['gain_annuel_brut'] = np.round(gain_annuel_brut, 0)
+            results['gain_annuel_net'] = np.round(gain_net, 0)
+            results['roi_annuel'] = np.round(roi_annuel, 1)
+            results['risques'] = risk_masks @ (1 << np.arange(len(RISQUES)))
+            results['sante_vegetation'] = sante_code
+            results['disponibilite_eau'] = eau_code
+            return results
+        
+        risques = [
+            [RISQUES[k] for k in np.flatnonzero(row)] or [AUCUN_RISQUE]
+            for row in risk_masks
+        ]
+        sante = np.array(SANTE_VEGETATION, dtype=object)[sante_code]
+        eau = np.array(DISPONIBILITE_EAU, dtype=object)[eau_code]
+        
+        return pd.DataFrame({
+            'fertilite': np.round(fertility, 1),
+            'valeur_par_ha': np.round(value_per_ha, 0),
+            'valeur_totale': np.round(cout_acquisition, 0),
+            'score_opportunite': np.round(opportunity_score, 1),
+            'categorie': categories[categorie_code],
+            'culture_recommandee': noms[culture_code],
+            'rendement_estime': rendement_estimate,
+            'gain_annuel_brut': np.round(gain_annuel_brut, 0),
+            'gain_annuel_net': np.round(gain_net, 0),
+            'roi_annuel': np.round(roi_annuel, 1),
+            'risques': risques,
+            'sante_vegetation': sante,
+            'disponibilite_eau': eau
+        }, index=df.index)
+    
+    def sensitivity_analysis(self, parcel_data, sweeps=None, n_points=11, outputs=None):
+        """
+        Analyse « what-if » : réponse des scores aux variations de chaque feature
+        
+        Toutes les variantes (balayages + points de différences finies)
+        sont empilées dans une seule matrice et scorées en un seul appel
+        à analyze_parcels.
+        
+        Args:
+            parcel_data: dict de parcelle (mêmes clés qu'analyze_parcel)
+            sweeps: dict {feature: valeurs à tester} ; par défaut chaque
+                    feature de RAW_FEATURE_COLS est balayée sur
+                    ±SENSITIVITY_SPANS autour de sa valeur
+            n_points: nombre de points des balayages par défaut
+            outputs: sorties suivies (défaut : SENSITIVITY_OUTPUTS)
+        
+        Returns:
+            dict avec 'base' (sorties de la parcelle), 'curves' ({feature:
+            DataFrame valeur → sorties}), 'derivatives' et 'elasticities'
+            (DataFrame features x sorties) et 'n_evaluations'
+        
+        Les dérivées sont des différences centrées sur x ± SENSITIVITY_SPANS/2
+        (les arbres sont constants par morceaux : un pas infinitésimal
+        donnerait 0). Élasticité = (Δy/y) / (Δx/x), NaN si x ou y est nul.
+        """
+        if not self.is_trained:
+            raise ValueError("Modèles non entraînés. Appelez .train_models() d'abord.")
+        
+        outputs = outputs or SENSITIVITY_OUTPUTS
+        base = {'pays': parcel_data.get('pays', 'tunisie'), 'region': parcel_data.get('region', 'centre')}
+        base.update({col: float(parcel_data[col]) for col in RAW_FEATURE_COLS})
+        
+        if sweeps is None:
+            sweeps = {
+                col: base[col] + np.linspace(-1, 1, n_points) * SENSITIVITY_SPANS[col]
+                for col in RAW_FEATURE_COLS
+            }
+        unknown = set(sweeps) - set(RAW_FEATURE_COLS)
+        if unknown:
+            raise ValueError(f"Features inconnues : {sorted(unknown)}")
+        sweeps = {col: self._clip_feature(col, np.asarray(values, dtype=np.float64))
+                  for col, values in sweeps.items()}
+        
+        # Différences finies : x - h et x + h pour chaque feature
+        steps = {
+            col: self._clip_feature(col, base[col] + np.array([-0.5, 0.5]) * SENSITIVITY_SPANS[col])
+            for col in RAW_FEATURE_COLS
+        }
+        
+        # Ligne 0 : parcelle de base ; puis un segment par balayage et par
+        # paire de différences finies, une seule colonne modifiée par segment
+        segments = list(sweeps.items()) + list(steps.items())
+        n_rows = 1 + sum(len(values) for _, values in segments)
+        variants = pd.DataFrame({col: [value] * n_rows for col, value in base.items()})
+        bounds = []
+        offset = 1
+        for col, values in segments:
+            variants.iloc[offset:offset + len(values), variants.columns.get_loc(col)] = values
+            bounds.append((offset, offset + len(values)))
+            offset += len(values)
+        
+        results = self.analyze_parcels(variants)[outputs].to_numpy(dtype=np.float64)
+        
+        y0 = results[0]
+        curves = {}
+        for (col, values), (start, stop) in zip(segments[:len(sweeps)], bounds):
+            curve = pd.DataFrame(results[start:stop], columns=outputs)
+            curve.insert(0, col, values)
+            curves[col] = curve
+        
+        derivatives = pd.DataFrame(index=RAW_FEATURE_COLS, columns=outputs, dtype=np.float64)
+        elasticities = pd.DataFrame(index=RAW_FEATURE_COLS, columns=outputs, dtype=np.float64)
+        for (col, (low, high)), (start, _) in zip(segments[len(sweeps):], bounds[len(sweeps):]):
+            y_low, y_high = results[start], results[start + 1]
+            dx = high - low
+            derivative = (y_high - y_low) / dx if dx > 0 else np.full(len(outputs), np.nan)
+            derivatives.loc[col] = derivative
+            with np.errstate(divide='ignore', invalid='ignore'):
+                elasticity = derivative * base[col] / y0
+            elasticity[(y0 == 0) | (base[col] == 0)] = np.nan
+            elasticities.loc[col] = elasticity
+        
+        return {
+            'base': dict(zip(outputs, y0)),
+            'curves': curves,
+            'derivatives': derivatives,
+            'elasticities': elasticities,
+            'n_evaluations': n_rows
+        }
+    
+    def explain_parcels(self, parcels, outputs=('score_opportunite', 'fertilite'), allow_forest=False):
+        """
+        Contributions SHAP par feature, calculées en lot sur les arbres
+        
+        Algorithme TreeSHAP exact vectorisé (CompiledTreeEnsemble.shap_values) :
+        pour chaque parcelle, base + somme des contributions = sortie du
+        modèle avant arrondi.
+        
+        Args:
+            parcels: DataFrame ou tableau structuré (comme analyze_parcels)
+            outputs: sorties à expliquer (clés de EXPLAINED_OUTPUTS)
+            allow_forest: autorise les sorties de la forêt aléatoire
+                          (FOREST_EXPLAINED_OUTPUTS), ~20x plus lentes que
+                          celles des deux modèles de boosting
+        
+        Returns:
+            dict {sortie: {'features': noms des colonnes, 'contributions':
+            matrice float32 (n, n_features), 'expected_value': base}}
+        """
+        if not self.is_trained:
+            raise ValueError("Modèles non entraînés. Appelez .train_models() d'abord.")
+        unknown = set(outputs) - set(EXPLAINED_OUTPUTS)
+        if unknown:
+            raise ValueError(f"Sorties non explicables : {sorted(unknown)}")
+        forest = set(outputs) & FOREST_EXPLAINED_OUTPUTS
+        if forest and not allow_forest:
+            raise ValueError(f"Sorties de la forêt aléatoire {sorted(forest)} : explication coûteuse "
+                             f"(~60 ms/parcelle), passez allow_forest=True")
+        
+        df = parcels if isinstance(parcels, pd.DataFrame) else pd.DataFrame(parcels)
+        X_scaled = self.scaler.transform(self._build_feature_matrix(df))
+        
+        explanations = {}
+        for output in outputs:
+            contributions, expected = self._explainer(EXPLAINED_OUTPUTS[output]).shap_values(X_scaled)
+            explanations[output] = {
+                'features': list(self.feature_cols),
+                'contributions': contributions.astype(np.float32),
+                'expected_value': expected
+            }
+        return explanations
+    
+    def explain_parcel(self, parcel_data, outputs=('score_opportunite', 'fertilite'), allow_forest=False):
+        """
+        Explication d'une parcelle, prête pour le rapport
+        
+        Returns:
+            dict {sortie: {'base': valeur de base, 'contributions':
+            {feature: contribution} trié par importance décroissante}}
+        """
+        df = pd.DataFrame([parcel_data])
+        explanations = self.explain_parcels(df, outputs, allow_forest=allow_forest)
+        summary = {}
+        for output, explanation in explanations.items():
+            row = explanation['contributions'][0]
+            order = np.argsort(-np.abs(row), kind='stable')
+            summary[output] = {
+                'base': round(explanation['expected_value'], 2),
+                'contributions': {explanation['features'][j]: round(float(row[j]), 2) for j in order}
+            }
+        return summary
     
-    def generate_heatmap_data(self, country='tunisie', resolution=50):
+    def _explainer(self, name):
+        """Ensemble compilé avec couverture des nœuds pour un modèle"""
+        compiled = self.compiled_models.get(name)
+        if compiled is not None and compiled.cover is not None:
+            return compiled
+        if name not in self._explainers:
+            self._explainers[name] = CompiledTreeEnsemble.from_sklearn(getattr(self, name))
+        return self._explainers[name]
+    
+    @staticmethod
+    def _clip_feature(col, values):
+        """Ramène des valeurs de feature dans leurs bornes physiques"""
+        low, high = FEATURE_BOUNDS.get(col, (None, None))
+        if low is None and high is None:
+            return values
+        return np.clip(values, low, high)
+    
+    def generate_heatmap_data(self, country='tunisie', resolution=50, chunk_size=50000,
+                              random_state=None, scorer='model'):
         """
         Génère données pour heatmap d'opportunités
         
+        La grille est scorée par blocs de chunk_size points : la mémoire
+        reste bornée quelle que soit la résolution (500x500 et plus).
+        
         Args:
             country: pays à analyser
-            resolution: nombre de points de grille
+            resolution: nombre de points de grille par axe
+            chunk_size: nombre de points scorés par appel aux modèles
+            random_state: graine pour les features simulées (optionnel)
+            scorer: 'model' (modèles complets) ou 'surrogate' (table
+                    interpolée construite au préalable par build_surrogate ;
+                    sans table, scoring exact avec avertissement)
         
         Returns:
-            dict avec lat, lon, scores
+            dict de tableaux NumPy : lat, lon, score, fertilite,
+            culture (code, index dans CULTURES)
         """
-        print(f"\n🗺️ Génération heatmap pour {country.upper()}...")
+        if not self.is_trained:
+            raise ValueError("Modèles non entraînés. Appelez .train_models() d'abord.")
+        if scorer not in ('model', 'surrogate'):
+            raise ValueError(f"Scorer inconnu : {scorer} (attendu : 'model' ou 'surrogate')")
         
-        # Définir zone géographique
-        bounds = {
-            'tunisie': {'lat': (33.0, 37.5), 'lon': (7.5, 11.5)},
-            'france': {'lat': (42.0, 51.0), 'lon': (-5.0, 8.0)},
-            'italie': {'lat': (36.0, 47.0), 'lon': (6.0, 18.5)},
-            'espagne': {'lat': (36.0, 43.8), 'lon': (-9.3, 3.3)}
-        }
+        print(f"\n🗺️ Génération heatmap pour {country.upper()}...")
         
-        bounds_data = bounds.get(country, bounds['tunisie'])
+        bounds_data = COUNTRY_BOUNDS.get(country, COUNTRY_BOUNDS['tunisie'])
         
-        # Grille de points
+        # Grille de points (ordre ligne par ligne : lat puis lon)
         lats = np.linspace(bounds_data['lat'][0], bounds_data['lat'][1], resolution)
         lons = np.linspace(bounds_data['lon'][0], bounds_data['lon'][1], resolution)
+        n_points = resolution * resolution
         
-        heatmap_data = []
-        
-        for lat in lats:
-            for lon in lons:
-                # Simuler données satellite pour ce point
-                parcel = {
-                    'pays': country,
-                    'region': 'centre',
-                    'lat': lat,
-                    'lon': lon,
-                    'ndvi': np.random.uniform(0.2, 0.9),
-                    'ndwi': np.random.uniform(0.1, 0.7),
-                    'temp_surface': np.random.uniform(20, 40),
-                    'albedo': np.random.uniform(0.15, 0.35),
-                    'soil_texture': np.random.uniform(0.2, 0.8),
-                    'slope': np.random.exponential(4),
-                    'altitude': np.random.uniform(0, 500),
-                    'distance_water': np.random.exponential(8),
-                    'distance_road': np.random.exponential(2.5),
-                    'surface': 10
-                }
-                
-                analysis = self.analyze_parcel(parcel)
-                
-                heatmap_data.append({
-                    'lat': lat,
-                    'lon': lon,
-                    'score': analysis['score_opportunite'],
-                    'fertilite': analysis['fertilite'],
-                    'culture': analysis['culture_recommandee']
-                })
-        
-        print(f"   ✅ {len(heatmap_data)} points analysés")
+        heatmap_data = {
+            'lat': np.repeat(lats, resolution),
+            'lon': np.tile(lons, resolution),
+            'score': np.empty(n_points),
+            'fertilite': np.empty(n_points),
+            'culture': np.empty(n_points, dtype=np.int8)
+        }
+        
+        rng = np.random.default_rng(random_state)
+        pays_code = PAYS_MAP.get(country, 0)
+        region_code = REGION_MAP['centre']
+        surrogate = None
+        if scorer == 'surrogate':
+            surrogate = self.surrogates.get((pays_code, region_code))
+            if surrogate is None:
+                # Construire la table coûte ~40 s : jamais à la volée
+                print(f"   ⚠️ Pas de substitut tabulé pour {country}/centre "
+                      f"(appelez build_surrogate) : scoring exact")
+        
+        for start in range(0, n_points, chunk_size):
+            stop = min(start + chunk_size, n_points)
+            X = self._simulate_grid_features(rng, stop - start, pays_code, region_code)
+            if surrogate is not None:
+                opportunity_score, fertility = surrogate.predict(X).T
+            else:
+                X_scaled = self.scaler.transform(X)
+                fertility = self._model_predict('fertility_model', X_scaled)
+                opportunity_score = self._model_predict('opportunity_model', X_scaled)
+            
+            heatmap_data['score'][start:stop] = np.round(opportunity_score, 1)
+            heatmap_data['fertilite'][start:stop] = np.round(fertility, 1)
+            heatmap_data['culture'][start:stop] = self._culture_codes(
+                X[:, 0], X[:, 2], X[:, 7], X[:, 6], fertility
+            )
+        
+        print(f"   ✅ {n_points} points analysés")
         
         return heatmap_data
     
+    def build_surrogate(self, country='tunisie', region='centre', n_features=4, n_bins=12,
+                        n_background=32, n_holdout=5000, random_state=0):
+        """
+        Construit la table de substitution des modèles d'opportunité et de
+        fertilité pour les heatmaps d'un pays
+        
+        Les features de la table sont celles dont les contributions SHAP
+        varient le plus sur les points simulés (features constantes sur la
+        grille exclues) ; les autres sont moyennées. L'erreur face aux vrais
+        modèles est mesurée sur un échantillon de contrôle indépendant et
+        conservée dans surrogate.errors. La table est jetée à chaque
+        changement de modèles.
+        
+        Args:
+            country, region: contexte de la grille
+            n_features: nombre de features tabulées (2^n_features lectures par point)
+            n_bins: nœuds par feature
+            n_background: points simulés moyennés par nœud
+            n_holdout: taille de l'échantillon de contrôle
+            random_state: graine des tirages
+        
+        Returns:
+            LookupTableSurrogate (sorties : score, fertilité)
+        """
+        if not self.is_trained:
+            raise ValueError("Modèles non entraînés. Appelez .train_models() d'abord.")
+        
+        start = time.perf_counter()
+        pays_code = PAYS_MAP.get(country, 0)
+        region_code = REGION_MAP.get(region, 1)
+        rng = np.random.default_rng(random_state)
+        sample = self._simulate_grid_features(rng, 20000, pays_code, region_code)
+        
+        def predict(X):
+            X_scaled = self.scaler.transform(X)
+            return np.column_stack([getattr(self, name).predict(X_scaled) for name in SURROGATE_OUTPUTS])
+        
+        # Importance = dispersion des contributions, à l'échelle de chaque sortie
+        X_scaled = self.scaler.transform(sample[:256])
+        importance = np.zeros(sample.shape[1])
+        for name in SURROGATE_OUTPUTS:
+            contributions, _ = self._explainer(name).shap_values(X_scaled)
+            spread = contributions.std(axis=0)
+            importance += spread / (spread.sum() or 1.0)
+        # Features constantes sur la grille (surface, pays, région) exclues :
+        # un seul nœud ne définit pas de cellule d'interpolation
+        varying = np.flatnonzero(np.ptp(sample, axis=0) > 0)
+        order = varying[np.argsort(-importance[varying], kind='stable')]
+        feature_index = np.sort(order[:n_features])
+        
+        surrogate = LookupTableSurrogate.fit(predict, sample, feature_index, SURROGATE_OUTPUTS,
+                                             n_bins=n_bins, n_background=n_background)
+        holdout = self._simulate_grid_features(rng, n_holdout, pays_code, region_code)
+        errors = surrogate.evaluate(predict, holdout)
+        self.surrogates[(pays_code, region_code)] = surrogate
+        
+        features = [self.feature_cols[j] if j < len(self.feature_cols) else str(j) for j in feature_index]
+        print(f"   📐 Substitut tabulé {country}/{region} : {', '.join(features)} "
+              f"({surrogate.tables[0].size} nœuds, {time.perf_counter() - start:.1f}s)")
+        for name in SURROGATE_OUTPUTS:
+            e = errors[name]
+            print(f"      • {name} : MAE {e['mae']:.2f}, RMSE {e['rmse']:.2f}, "
+                  f"max {e['max_abs']:.2f}, R² {e['r2']:.3f}")
+        print(f"      • Débit : {errors['rows_per_sec'] / 1e6:.1f} M points/s")
+        return surrogate
+    
+    def _simulate_grid_features(self, rng, n, pays_code, region_code):
+        """Simule les features satellite de n points de grille (matrice brute)"""
+        X = np.empty((n, len(RAW_FEATURE_COLS) + 2), dtype=np.float64)
+        X[:, 0] = rng.uniform(0.2, 0.9, n)       # ndvi
+        X[:, 1] = rng.uniform(0.1, 0.7, n)       # ndwi
+        X[:, 2] = rng.uniform(20, 40, n)         # temp_surface
+        X[:, 3] = rng.uniform(0.15, 0.35, n)     # albedo
+        X[:, 4] = rng.uniform(0.2, 0.8, n)       # soil_texture
+        X[:, 5] = rng.exponential(4, n)          # slope
+        X[:, 6] = rng.uniform(0, 500, n)         # altitude
+        X[:, 7] = rng.exponential(8, n)          # distance_water
+        X[:, 8] = rng.exponential(2.5, n)        # distance_road
+        X[:, 9] = 10                             # surface
+        X[:, 10] = pays_code
+        X[:, 11] = region_code
+        return X
+    
+    def score_locations(self, lat, lon, country='tunisie', region='centre'):
+        """
+        Score des positions avec des features déterministes et continues
+        
+        Contrairement à generate_heatmap_data (tirage aléatoire par point),
+        les features dépendent uniquement de (lat, lon) : le même point
+        donne toujours le même score et deux points voisins des scores
+        proches, ce qui permet la recherche adaptative.
+        
+        Returns:
+            dict de tableaux : score, fertilite, culture (code)
+        """
+        X = self._location_features(lat, lon, PAYS_MAP.get(country, 0), REGION_MAP.get(region, 1))
+        if self.score_cache is not None:
+            fertility, _, opportunity_score = self._predict_all(X).T
+        else:
+            X_scaled = self.scaler.transform(X)
+            fertility = self._model_predict('fertility_model', X_scaled)
+            opportunity_score = self._model_predict('opportunity_model', X_scaled)
+        return {
+            'score': np.round(opportunity_score, 1),
+            'fertilite': np.round(fertility, 1),
+            'culture': self._culture_codes(X[:, 0], X[:, 2], X[:, 7], X[:, 6], fertility)
+        }
+    
+    @staticmethod
+    def _location_features(lat, lon, pays_code, region_code, n_waves=4):
+        """
+        Features satellite simulées comme champs lisses de (lat, lon)
+        
+        Chaque feature est une somme de n_waves sinusoïdes (périodes de
+        0.5° à 10°, graine fixée par pays) ramenée dans les mêmes plages
+        que _simulate_grid_features.
+        """
+        lat = np.asarray(lat, dtype=np.float64).ravel()
+        lon = np.asarray(lon, dtype=np.float64).ravel()
+        rng = np.random.default_rng(1000 + pays_code)
+        
+        def field():
+            freq = rng.uniform(0.1, 2.0, (2, n_waves)) * rng.choice([-1, 1], (2, n_waves))
+            phase = rng.uniform(0, 2 * np.pi, n_waves)
+            waves = np.sin(2 * np.pi * (np.outer(lat, freq[0]) + np.outer(lon, freq[1])) + phase)
+            # Somme de sinusoïdes ramenée dans [0, 1]
+            return np.clip(0.5 + waves.sum(axis=1) / (2 * np.sqrt(2 * n_waves)), 0.0, 1.0)
+        
+        def exponential(scale):
+            return -scale * np.log1p(-np.minimum(field(), 0.999))
+        
+        n = len(lat)
+        X = np.empty((n, len(RAW_FEATURE_COLS) + 2), dtype=np.float64)
+        X[:, 0] = 0.2 + 0.7 * field()            # ndvi
+        X[:, 1] = 0.1 + 0.6 * field()            # ndwi
+        X[:, 2] = 20 + 20 * field()              # temp_surface
+        X[:, 3] = 0.15 + 0.2 * field()           # albedo
+        X[:, 4] = 0.2 + 0.6 * field()            # soil_texture
+        X[:, 5] = exponential(4)                 # slope
+        X[:, 6] = 500 * field()                  # altitude
+        X[:, 7] = exponential(8)                 # distance_water
+        X[:, 8] = exponential(2.5)               # distance_road
+        X[:, 9] = 10                             # surface
+        X[:, 10] = pays_code
+        X[:, 11] = region_code
+        return X
+    
+    def find_top_opportunities(self, country='tunisie', k=20, coarse_resolution=16,
+                               min_cell_size=0.01, safety=1.5):
+        """
+        Top-k des meilleures positions par raffinement adaptatif (quadtree)
+        
+        Une grille grossière est scorée, puis seules les cellules dont le
+        score plus une marge de rugosité locale peut encore entrer dans le
+        top-k sont subdivisées, jusqu'à min_cell_size degrés.
+        
+        Args:
+            country: pays à analyser
+            k: nombre de positions retournées
+            coarse_resolution: points par axe de la grille initiale
+            min_cell_size: taille de cellule finale (degrés)
+            safety: multiplicateur de la marge (plus grand = plus sûr, plus lent)
+        
+        Returns:
+            dict avec 'top' (lat, lon, score, fertilite, culture triés par
+            score décroissant) et 'stats' (évaluations vs grille dense)
+        """
+        if not self.is_trained:
+            raise ValueError("Modèles non entraînés. Appelez .train_models() d'abord.")
+        
+        print(f"\n🔎 Recherche top-{k} adaptative pour {country.upper()}...")
+        bounds_data = COUNTRY_BOUNDS.get(country, COUNTRY_BOUNDS['tunisie'])
+        result = adaptive_topk_search(
+            lambda lat, lon: self.score_locations(lat, lon, country),
+            bounds_data['lat'], bounds_data['lon'], k=k,
+            coarse_resolution=coarse_resolution, min_cell_size=min_cell_size, safety=safety
+        )
+        
+        stats = result['stats']
+        print(f"   ✅ {stats['evaluations']} évaluations au lieu de {stats['dense_equivalent']} "
+              f"(grille dense), {stats['evaluations_saved']} économisées "
+              f"(x{stats['reduction_factor']:.0f})")
+        return result
+    
     def save(self, path='models/satellite_analyzer.pkl'):
-        """Sauvegarde les modèles"""
+        """Sauvegarde les modèles (pickle + artefact mmap voisin)"""
         os.makedirs(os.path.dirname(path), exist_ok=True)
         with open(path, 'wb') as f:
             pickle.dump({
@@ -443,12 +1660,65 @@ class SatelliteParcelAnalyzer:
                 'opportunity_model': self.opportunity_model,
                 'scaler': self.scaler,
                 'feature_cols': self.feature_cols,
+                'model_modes': self.model_modes,
+                'dataset_info': self.dataset_info,
+                'comps_index': self.comps_index,
                 'is_trained': self.is_trained
             }, f)
         print(f"   💾 Modèles sauvegardés : {path}")
+        self.save_artifact(artifact_path_for(path))
+    
+    def save_artifact(self, path='models/satellite_analyzer.artifact'):
+        """
+        Sauvegarde au format artefact (manifeste JSON + .npy mappables)
+        
+        Les arbres compilés sont stockés en tableaux bruts : au chargement
+        ils sont servis directement depuis le fichier mappé, sans
+        reconstruire les estimateurs sklearn.
+        """
+        arrays = {}
+        compiled_meta = {}
+        for name, *_ in SATELLITE_MODELS:
+            compiled = self.compiled_models.get(name) or CompiledTreeEnsemble.from_sklearn(getattr(self, name))
+            model_arrays, compiled_meta[name] = compiled.to_arrays()
+            arrays.update({f"{name}.{field}": array for field, array in model_arrays.items()})
+        
+        objects = {
+            'fertility_model': self.fertility_model,
+            'value_estimator': self.value_estimator,
+            'opportunity_model': self.opportunity_model,
+            'scaler': self.scaler
+        }
+        if self.comps_index is not None:
+            objects['comps_index'] = self.comps_index
+        save_artifact(
+            path,
+            objects=objects,
+            arrays=arrays,
+            meta={
+                'feature_cols': self.feature_cols,
+                'model_modes': self.model_modes,
+                'dataset_info': self.dataset_info,
+                'is_trained': self.is_trained,
+                'compiled': compiled_meta
+            }
+        )
+        print(f"   💾 Artefact sauvegardé : {path}")
     
     def load(self, path='models/satellite_analyzer.pkl'):
-        """Charge les modèles"""
+        """
+        Charge les modèles
+        
+        Si un artefact à jour existe (path lui-même ou <path>.artifact),
+        il est préféré au pickle : chargement en quelques millisecondes,
+        arbres compilés mappés en mémoire, estimateurs sklearn reconstruits
+        seulement au premier accès.
+        """
+        artifact_dir = find_artifact(path)
+        if artifact_dir:
+            self._load_artifact(artifact_dir)
+            return
+        
         with open(path, 'rb') as f:
             data = pickle.load(f)
             self.fertility_model = data['fertility_model']
@@ -456,8 +1726,36 @@ class SatelliteParcelAnalyzer:
             self.opportunity_model = data['opportunity_model']
             self.scaler = data['scaler']
             self.feature_cols = data['feature_cols']
+            self.model_modes = data.get('model_modes', {name: 'exact' for name, *_ in SATELLITE_MODELS})
+            self.dataset_info = data.get('dataset_info')
+            self.comps_index = data.get('comps_index')
             self.is_trained = data['is_trained']
+        self.compiled_models = {}
+        self._lazy_artifact = None
+        self._invalidate_cache()
         print(f"   📂 Modèles chargés : {path}")
+    
+    def _load_artifact(self, directory):
+        """Ouvre un artefact : métadonnées et arbres compilés immédiats, sklearn paresseux"""
+        artifact = ModelArtifact(directory)
+        meta = artifact.meta
+        self.comps_index = None  # Remplacé paresseusement s'il figure dans l'artefact
+        self._attach_artifact(artifact)
+        self.feature_cols = meta['feature_cols']
+        self.model_modes = meta['model_modes']
+        self.dataset_info = meta.get('dataset_info')
+        self.is_trained = meta['is_trained']
+        
+        self.compiled_models = {}
+        for name, compiled_meta in meta['compiled'].items():
+            prefix = f"{name}."
+            arrays = {
+                array_name[len(prefix):]: artifact.array(array_name)
+                for array_name in artifact.array_names if array_name.startswith(prefix)
+            }
+            self.compiled_models[name] = CompiledTreeEnsemble.from_arrays(arrays, compiled_meta)
+        self._invalidate_cache()
+        print(f"   📂 Modèles chargés (artefact) : {directory}")
 
 
 # Test et démonstration
@@ -495,7 +1793,7 @@ if __name__ == "__main__":
         'surface': 10
     }
     
-    result1 = analyzer.analyze_parcel(parcelle1)
+    result1 = analyzer.analyze_parcel(parcelle1, n_comparables=3)
     
     print(f"\n✅ RÉSULTATS :")
     print(f"   {result1['categorie']}")
@@ -505,6 +1803,9 @@ if __name__ == "__main__":
     print(f"   🌾 Culture recommandée : {result1['culture_recommandee'].upper()}")
     print(f"   📈 ROI annuel : {result1['roi_annuel']:.1f}%")
     print(f"   💵 Gain net annuel : {result1['gain_annuel_net']:,} €")
+    for comp in result1['comparables']:
+        print(f"   🏘️ Comparable #{comp['reference']} ({comp['pays']} {comp['region']}, "
+              f"{comp['surface']} ha) : {comp['valeur_par_ha']:,.0f} €/ha")
     
     # Test 2 : Parcelle France (opportunité exceptionnelle)
     print("\n" + "-"*70)
@@ -537,6 +1838,20 @@ if __name__ == "__main__":
     print(f"   📈 ROI annuel : {result2['roi_annuel']:.1f}%")
     print(f"   💵 Gain net annuel : {result2['gain_annuel_net']:,} €")
     
+    # Test 3 : meilleures zones par recherche adaptative
+    print("\n" + "-"*70)
+    print("📍 TEST 3 : Top 5 zones Tunisie (quadtree)")
+    top = analyzer.find_top_opportunities('tunisie', k=5)['top']
+    for lat, lon, score in zip(top['lat'], top['lon'], top['score']):
+        print(f"   📍 ({lat:.3f}, {lon:.3f}) → {score}/100")
+    
+    # Test 4 : sensibilité du score aux features (parcelle 1)
+    print("\n" + "-"*70)
+    print("📍 TEST 4 : Élasticités du score opportunité (parcelle 1)")
+    sensitivity = analyzer.sensitivity_analysis(parcelle1)
+    for feature, elasticity in sensitivity['elasticities']['score_opportunite'].items():
+        print(f"   {feature:<16} {elasticity:+.3f}")
+    
     print("\n" + "="*70)
     print("✅ Analyseur satellite opérationnel !")
     print("="*70)
\ No newline at end of file
@@ -0,0 +1,91 @@
+"""
+Feralyx V2.0 - Cache LRU des prédictions de modèles
+Clé = vecteur de features (exact ou quantifié) + version des modèles
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+
+
+class ScoreCache:
+    """
+    Cache LRU de prédictions indexé par vecteur de features
+
+    Par défaut (decimals=None) la clé est le vecteur exact : un résultat
+    en cache est identique à une prédiction directe. Avec decimals, les
+    features sont arrondies avant la recherche et l'appelant prédit sur
+    ces valeurs quantifiées : plus de succès sur des données bruitées,
+    au prix d'un écart avec les prédictions sans cache (le résultat ne
+    dépend toutefois jamais de l'état du cache). La version des modèles
+    fait partie de la clé et clear() est appelé à chaque changement de
+    modèles.
+    """
+
+    def __init__(self, max_size=100000, decimals=None):
+        """
+        Args:
+            max_size: nombre maximal d'entrées (les moins récentes sont évincées)
+            decimals: précision de quantification des features (None = clé exacte)
+        """
+        if max_size < 1:
+            raise ValueError("max_size doit être >= 1")
+        self.max_size = max_size
+        self.decimals = decimals
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def quantize(self, X):
+        """Features de la clé, arrondies si decimals (+0.0 : -0.0 et 0.0 donnent la même clé)"""
+        X = np.asarray(X, dtype=np.float64)
+        if self.decimals is None:
+            return X + 0.0
+        return np.round(X, self.decimals) + 0.0
+
+    def keys(self, X_quantized, version):
+        """Une clé par ligne de la matrice quantifiée"""
+        return [(version, row.tobytes()) for row in np.ascontiguousarray(X_quantized)]
+
+    def get_many(self, keys):
+        """Valeurs en cache (None si absente) ; met à jour l'ordre LRU et les compteurs"""
+        values = []
+        for key in keys:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            values.append(value)
+        return values
+
+    def put_many(self, keys, values):
+        """Insère des valeurs et évince les entrées les moins récentes au-delà de max_size"""
+        for key, value in zip(keys, values):
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Vide le cache (les compteurs sont conservés)"""
+        self._entries.clear()
+
+    def stats(self):
+        """Compteurs d'utilisation"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'decimals': self.decimals,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
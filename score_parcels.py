@@ -0,0 +1,185 @@
+"""
+Feralyx V2.0 - Scoring en flux de fichiers de parcelles satellite
+Lit un CSV (format data/satellite_parcels.csv) par blocs de taille fixe,
+le score avec les modèles satellite et écrit une sortie colonnaire
+partitionnée par pays/région (Parquet ou fichiers .npy)
+
+Usage :
+    python score_parcels.py data/satellite_parcels.csv reports/scores --chunksize 100000
+    python score_parcels.py gros_fichier.csv reports/scores --resume
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from satellite_analyzer import SatelliteParcelAnalyzer
+
+# Parquet si pyarrow est installé, sinon fichiers .npy
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+PROGRESS_FILE = '_progress.json'
+PARTITION_COLS = ['pays', 'region']
+# Partition des lignes sans pays ou région (NaN dans le CSV)
+UNKNOWN_PARTITION = 'inconnu'
+
+# Colonnes d'analyse ajoutées à chaque ligne d'entrée
+SCORE_COLS = ['fertilite', 'valeur_par_ha', 'valeur_totale', 'score_opportunite', 'categorie',
+              'culture_recommandee', 'rendement_estime', 'gain_annuel_brut', 'gain_annuel_net',
+              'roi_annuel', 'risques', 'sante_vegetation', 'disponibilite_eau']
+
+
+def stream_score_csv(input_path, output_dir, analyzer, chunksize=100000, fmt=None, resume=False):
+    """
+    Score un CSV bloc par bloc ; la mémoire ne dépend que de chunksize
+
+    Chaque bloc terminé est enregistré dans <output_dir>/_progress.json.
+    Avec resume=True, les lignes déjà traitées sont sautées par le lecteur
+    CSV et les blocs suivants réécrivent leurs fichiers (noms
+    déterministes), ce qui rend la reprise idempotente.
+
+    Args:
+        input_path: CSV d'entrée
+        output_dir: dossier de sortie partitionné pays=<p>/region=<r>/
+        analyzer: SatelliteParcelAnalyzer entraîné
+        chunksize: lignes par bloc
+        fmt: 'parquet' ou 'npy' (par défaut parquet si pyarrow est installé)
+        resume: reprendre après le dernier bloc terminé
+
+    Returns:
+        dict avec lignes traitées, blocs, durée et débit (lignes/s)
+    """
+    fmt = fmt or ('parquet' if PARQUET_AVAILABLE else 'npy')
+    if fmt == 'parquet' and not PARQUET_AVAILABLE:
+        raise ValueError("pyarrow non installé : utilisez fmt='npy'")
+    if fmt not in ('parquet', 'npy'):
+        raise ValueError(f"Format inconnu : {fmt}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    progress_path = os.path.join(output_dir, PROGRESS_FILE)
+    progress = {'input': os.path.abspath(input_path), 'chunksize': chunksize,
+                'format': fmt, 'chunks_done': 0, 'rows_done': 0}
+
+    if resume and os.path.exists(progress_path):
+        with open(progress_path, encoding='utf-8') as f:
+            previous = json.load(f)
+        if previous['input'] != progress['input'] or previous['chunksize'] != chunksize \
+                or previous['format'] != fmt:
+            raise ValueError("Reprise impossible : entrée, chunksize ou format différents")
+        progress = previous
+        print(f"   ↪️ Reprise après {progress['chunks_done']} blocs ({progress['rows_done']} lignes)")
+
+    rows_done = progress['rows_done']
+    skip = (lambda i: 0 < i <= rows_done) if rows_done else None
+    reader = pd.read_csv(input_path, chunksize=chunksize, skiprows=skip)
+
+    start = time.perf_counter()
+    rows = 0
+    for chunk in reader:
+        if chunk.empty:
+            continue
+        chunk_start = time.perf_counter()
+        chunk_id = progress['chunks_done']
+
+        scored = _score_chunk(chunk, analyzer)
+        _write_partitions(scored, output_dir, chunk_id, fmt)
+
+        rows += len(chunk)
+        progress['chunks_done'] += 1
+        progress['rows_done'] += len(chunk)
+        _write_progress(progress_path, progress)
+
+        chunk_seconds = time.perf_counter() - chunk_start
+        print(f"   ✅ Bloc {chunk_id} : {len(chunk)} lignes "
+              f"({len(chunk) / max(chunk_seconds, 1e-9):,.0f} lignes/s)")
+
+    seconds = time.perf_counter() - start
+    rate = rows / seconds if seconds > 0 else 0.0
+    print(f"   📊 {rows} lignes en {seconds:.1f}s ({rate:,.0f} lignes/s)")
+    return {
+        'rows': rows,
+        'rows_total': progress['rows_done'],
+        'chunks_total': progress['chunks_done'],
+        'seconds': seconds,
+        'rows_per_sec': rate
+    }
+
+
+def _score_chunk(chunk, analyzer):
+    """Ajoute les colonnes d'analyse à un bloc d'entrée"""
+    results = analyzer.analyze_parcels(chunk)
+    results['risques'] = results['risques'].map(' | '.join)
+    # Les colonnes du CSV d'entraînement portant le même nom sont remplacées
+    inputs = chunk.drop(columns=[c for c in SCORE_COLS if c in chunk.columns])
+    return pd.concat([inputs, results[SCORE_COLS]], axis=1)
+
+
+def _write_partitions(scored, output_dir, chunk_id, fmt):
+    """
+    Écrit un fichier (ou dossier .npy) par partition pays/région
+
+    Les lignes sans pays ou région vont dans la partition UNKNOWN_PARTITION
+    au lieu d'être écartées par le groupby.
+    """
+    keys = scored[PARTITION_COLS].astype(object).fillna(UNKNOWN_PARTITION)
+    n_unknown = int((keys == UNKNOWN_PARTITION).any(axis=1).sum())
+    if n_unknown:
+        print(f"   ⚠️ Bloc {chunk_id} : {n_unknown} lignes sans pays/région → partition '{UNKNOWN_PARTITION}'")
+    for (pays, region), part in scored.groupby([keys[col] for col in PARTITION_COLS],
+                                               sort=False, dropna=False):
+        part_dir = os.path.join(output_dir, f"pays={pays}", f"region={region}")
+        os.makedirs(part_dir, exist_ok=True)
+        part = part.drop(columns=PARTITION_COLS).reset_index(drop=True)
+        name = f"part-{chunk_id:06d}"
+
+        if fmt == 'parquet':
+            part.to_parquet(os.path.join(part_dir, f"{name}.parquet"), index=False)
+        else:
+            shard_dir = os.path.join(part_dir, name)
+            os.makedirs(shard_dir, exist_ok=True)
+            for col in part.columns:
+                values = part[col].to_numpy()
+                if values.dtype == object:
+                    values = values.astype(str)
+                np.save(os.path.join(shard_dir, f"{col}.npy"), values)
+
+
+def _write_progress(path, progress):
+    """Écriture atomique de l'état de progression"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(progress, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scoring en flux de parcelles satellite")
+    parser.add_argument('input', help="CSV de parcelles (format data/satellite_parcels.csv)")
+    parser.add_argument('output', help="dossier de sortie partitionné par pays/région")
+    parser.add_argument('--chunksize', type=int, default=100000, help="lignes par bloc")
+    parser.add_argument('--format', choices=['parquet', 'npy'], default=None,
+                        help="format de sortie (parquet si pyarrow est installé)")
+    parser.add_argument('--model', default='models/satellite_analyzer.pkl', help="modèles satellite")
+    parser.add_argument('--resume', action='store_true', help="reprendre après le dernier bloc terminé")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("🛰️ FERALYX V2.0 - SCORING EN FLUX")
+    print("=" * 70)
+
+    analyzer = SatelliteParcelAnalyzer()
+    analyzer.load(args.model)
+    stream_score_csv(args.input, args.output, analyzer, chunksize=args.chunksize,
+                     fmt=args.format, resume=args.resume)
+
+
+if __name__ == "__main__":
+    main()
@@ -19,6 +19,11 @@ except ImportError:
     print("⚠️ sentinelhub non installé - Mode simulation activé")
 
 from satellite_analyzer import SatelliteParcelAnalyzer
+from batch_planner import MAX_REQUEST_SIDE_PX, label_image, plan_batches, raster_shape, zonal_statistics
+from sentinel_fetch import AsyncSentinelFetcher
+from sentinel_rasters import SENTINEL_BANDS, bbox_seed, index_rasters, synthetic_bands
+from tile_cache import TILE_CACHE_DIR, TILE_CACHE_MAX_BYTES, TileCache
+from timeseries_store import TIMESERIES_DIR, IndexTimeSeriesStore
 
 class SentinelParcelAnalyzer:
     """
@@ -26,13 +31,19 @@ class SentinelParcelAnalyzer:
     + Fallback mode simulation si API non disponible
     """
     
-    def __init__(self, client_id=None, client_secret=None):
+    def __init__(self, client_id=None, client_secret=None, tile_cache_dir=TILE_CACHE_DIR,
+                 tile_cache_max_bytes=TILE_CACHE_MAX_BYTES, timeseries_dir=TIMESERIES_DIR):
         """
         Args:
             client_id: ID client Sentinel Hub (optionnel)
             client_secret: Secret client Sentinel Hub (optionnel)
+            tile_cache_dir: cache disque des rasters téléchargés (None = désactivé)
+            tile_cache_max_bytes: budget disque du cache (éviction LRU)
+            timeseries_dir: stockage des séries temporelles d'indices
         """
         self.use_sentinel = SENTINEL_AVAILABLE and client_id and client_secret
+        self.tile_cache = TileCache(tile_cache_dir, tile_cache_max_bytes) if tile_cache_dir else None
+        self.timeseries = IndexTimeSeriesStore(timeseries_dir)
         
         if self.use_sentinel:
             self.config = SHConfig()
@@ -50,7 +61,7 @@ class SentinelParcelAnalyzer:
             print("📊 Entraînement modèles IA...")
             self.ai_analyzer.train_models()
     
-    def get_sentinel_data(self, bbox, date_from, date_to, resolution=10):
+    def get_sentinel_data(self, bbox, date_from, date_to, resolution=10, raster=False):
         """
         Récupère données Sentinel-2 réelles
         
@@ -59,91 +70,172 @@ class SentinelParcelAnalyzer:
             date_from: Date début (datetime)
             date_to: Date fin (datetime)
             resolution: Résolution en mètres (10, 20, 60)
+            raster: garder les indices pixel par pixel (voir _raster_result)
         
         Returns:
             dict avec bandes spectrales
         """
         if not self.use_sentinel:
+            if raster:
+                return self._raster_result(synthetic_bands(bbox, resolution), 'simulation')
             return self._simulate_sentinel_data(bbox)
         
         try:
-            # Créer bbox Sentinel Hub
-            bbox_sh = BBox(bbox=bbox, crs=CRS.WGS84)
-            size = bbox_to_dimensions(bbox_sh, resolution=resolution)
+            fetch = lambda: self._fetch_bands(bbox, date_from, date_to, resolution)
+            if self.tile_cache is not None:
+                key = TileCache.key(bbox, date_from, date_to, resolution, SENTINEL_BANDS)
+                data = self.tile_cache.get_or_fetch(key, fetch)
+            else:
+                data = fetch()
             
-            # Script pour récupérer bandes
-            evalscript = """
-            //VERSION=3
-            function setup() {
-                return {
-                    input: [{
-                        bands: ["B02", "B03", "B04", "B08", "B11", "B12"],
-                        units: "DN"
-                    }],
-                    output: {
-                        bands: 6,
-                        sampleType: "INT16"
-                    }
-                };
-            }
-            
-            function evaluatePixel(sample) {
-                return [sample.B02, sample.B03, sample.B04, 
-                        sample.B08, sample.B11, sample.B12];
-            }
-            """
-            
-            # Requête
-            request = SentinelHubRequest(
-                evalscript=evalscript,
-                input_data=[
-                    SentinelHubRequest.input_data(
-                        data_collection=DataCollection.SENTINEL2_L2A,
-                        time_interval=(date_from, date_to),
-                    )
-                ],
-                responses=[
-                    SentinelHubRequest.output_response('default', MimeType.TIFF)
-                ],
-                bbox=bbox_sh,
-                size=size,
-                config=self.config
-            )
-            
-            # Récupérer données
-            data = request.get_data()[0]
-            
-            # Extraire bandes
-            blue = data[:, :, 0] / 10000.0
-            green = data[:, :, 1] / 10000.0
-            red = data[:, :, 2] / 10000.0
-            nir = data[:, :, 3] / 10000.0
-            swir1 = data[:, :, 4] / 10000.0
-            swir2 = data[:, :, 5] / 10000.0
-            
-            # Calculer indices
-            ndvi = (nir - red) / (nir + red + 1e-10)
-            ndwi = (green - nir) / (green + nir + 1e-10)
-            ndmi = (nir - swir1) / (nir + swir1 + 1e-10)  # Moisture index
-            
-            return {
-                'ndvi': np.nanmean(ndvi),
-                'ndwi': np.nanmean(ndwi),
-                'ndmi': np.nanmean(ndmi),
-                'blue': np.nanmean(blue),
-                'green': np.nanmean(green),
-                'red': np.nanmean(red),
-                'nir': np.nanmean(nir),
-                'swir1': np.nanmean(swir1),
-                'swir2': np.nanmean(swir2),
-                'source': 'sentinel-2'
-            }
+            if raster:
+                return self._raster_result(data, 'sentinel-2')
+            return self._scene_means(data, 'sentinel-2')
             
         except Exception as e:
             print(f"⚠️ Erreur Sentinel Hub : {e}")
             print("   Utilisation données simulées...")
+            if raster:
+                return self._raster_result(synthetic_bands(bbox, resolution), 'simulation')
             return self._simulate_sentinel_data(bbox)
     
+    def get_sentinel_data_many(self, bboxes, date_from, date_to, resolution=10, raster=False,
+                               fetch_url=None, concurrency=16, rate=50.0):
+        """
+        Données Sentinel de plusieurs bbox
+        
+        Avec fetch_url (service de bandes, p. ex. StandInBandServer), les
+        rasters sont téléchargés en parallèle par AsyncSentinelFetcher
+        (concurrence plafonnée, débit limité, reprises) en passant par le
+        cache de tuiles ; sans, chaque bbox suit get_sentinel_data.
+        
+        Args:
+            bboxes: liste de [min_lon, min_lat, max_lon, max_lat]
+            date_from, date_to, resolution, raster: comme get_sentinel_data
+            fetch_url: URL du service de bandes (optionnel)
+            concurrency: requêtes simultanées au plus
+            rate: requêtes par seconde
+        
+        Returns:
+            liste de dicts, dans l'ordre des bbox
+        """
+        if fetch_url is None:
+            return [self.get_sentinel_data(bbox, date_from, date_to, resolution, raster) for bbox in bboxes]
+        
+        fetcher = AsyncSentinelFetcher(fetch_url, concurrency=concurrency, rate=rate,
+                                       tile_cache=self.tile_cache)
+        rasters = fetcher.fetch_many_sync(bboxes, date_from, date_to, resolution)
+        stats = fetcher.stats
+        print(f"   📡 {len(bboxes)} bbox : {stats['requests']} requêtes, {stats['cache_hits']} en cache, "
+              f"{stats['failures']} échecs ({stats['seconds']:.1f}s)")
+        
+        results = []
+        for bbox, data in zip(bboxes, rasters):
+            source = fetch_url
+            if data is None:
+                data, source = synthetic_bands(bbox, resolution), 'simulation'
+            results.append(self._raster_result(data, source) if raster else self._scene_means(data, source))
+        return results
+    
+    @staticmethod
+    def _scene_means(data, source):
+        """Moyennes de scène des bandes et indices d'un raster (h, w, bandes) en DN"""
+        # Extraire bandes
+        blue = data[:, :, 0] / 10000.0
+        green = data[:, :, 1] / 10000.0
+        red = data[:, :, 2] / 10000.0
+        nir = data[:, :, 3] / 10000.0
+        swir1 = data[:, :, 4] / 10000.0
+        swir2 = data[:, :, 5] / 10000.0
+        
+        # Calculer indices
+        ndvi = (nir - red) / (nir + red + 1e-10)
+        ndwi = (green - nir) / (green + nir + 1e-10)
+        ndmi = (nir - swir1) / (nir + swir1 + 1e-10)  # Moisture index
+        
+        return {
+            'ndvi': np.nanmean(ndvi),
+            'ndwi': np.nanmean(ndwi),
+            'ndmi': np.nanmean(ndmi),
+            'blue': np.nanmean(blue),
+            'green': np.nanmean(green),
+            'red': np.nanmean(red),
+            'nir': np.nanmean(nir),
+            'swir1': np.nanmean(swir1),
+            'swir2': np.nanmean(swir2),
+            'source': source
+        }
+    
+    def _raster_result(self, data, source):
+        """
+        Indices pleine résolution + résumé de scène
+        
+        Même clés scalaires que le mode moyenne (calculées sur les pixels
+        valides, nodata exclu), plus 'rasters' (NDVI/NDWI/NDMI float32,
+        NaN hors pixels valides) et 'stats' (moyenne, écart-type,
+        percentiles, histogramme, taux de pixels valides par indice).
+        """
+        rasters, stats, band_means = index_rasters(data)
+        return {
+            **{name: summary['mean'] for name, summary in stats.items()},
+            **band_means,
+            'rasters': rasters,
+            'stats': stats,
+            'source': source
+        }
+    
+    def _fetch_bands(self, bbox, date_from, date_to, resolution):
+        """Requête Sentinel Hub : raster INT16 (h, w, bandes) en DN"""
+        # Créer bbox Sentinel Hub
+        bbox_sh = BBox(bbox=bbox, crs=CRS.WGS84)
+        size = bbox_to_dimensions(bbox_sh, resolution=resolution)
+        
+        # Script pour récupérer bandes
+        evalscript = """
+        //VERSION=3
+        function setup() {
+            return {
+                input: [{
+                    bands: %s,
+                    units: "DN"
+                }],
+                output: {
+                    bands: %d,
+                    sampleType: "INT16"
+                }
+            };
+        }
+        
+        function evaluatePixel(sample) {
+            return [%s];
+        }
+        """ % (json.dumps(SENTINEL_BANDS), len(SENTINEL_BANDS),
+               ", ".join(f"sample.{band}" for band in SENTINEL_BANDS))
+        
+        # Requête
+        request = SentinelHubRequest(
+            evalscript=evalscript,
+            input_data=[
+                SentinelHubRequest.input_data(
+                    data_collection=DataCollection.SENTINEL2_L2A,
+                    time_interval=(date_from, date_to),
+                )
+            ],
+            responses=[
+                SentinelHubRequest.output_response('default', MimeType.TIFF)
+            ],
+            bbox=bbox_sh,
+            size=size,
+            config=self.config
+        )
+        
+        # Récupérer données
+        return request.get_data()[0]
+    
+    def tile_cache_stats(self):
+        """Compteurs du cache de tuiles (hits, misses, taux de succès...) ou None s'il est inactif"""
+        return self.tile_cache.stats() if self.tile_cache is not None else None
+    
     def _simulate_sentinel_data(self, bbox):
         """Simule données satellite réalistes"""
         # Générer valeurs cohérentes basées sur localisation
@@ -251,6 +343,186 @@ class SentinelParcelAnalyzer:
         
         return result
     
+    def analyze_parcels_batch(self, parcels, size_km=1.0, pays='tunisie', region='centre', resolution=10,
+                              max_gap_m=200.0, fetch_url=None, concurrency=16, rate=50.0):
+        """
+        Analyse groupée de parcelles voisines (coopérative, exploitation...)
+        
+        Au lieu d'une requête par parcelle, les bbox proches sont fusionnées
+        (plan_batches) : un raster couvrant par groupe, puis statistiques
+        zonales de toutes ses parcelles en une passe (image d'étiquettes +
+        np.bincount) et scoring IA vectorisé de tout le lot.
+        
+        Args:
+            parcels: DataFrame ou liste de dicts (lat, lon ; optionnellement
+                     size_km, pays, region par parcelle)
+            size_km, pays, region: valeurs par défaut
+            resolution: résolution en mètres
+            max_gap_m: écart maximal entre parcelles d'une même requête
+            fetch_url, concurrency, rate: service de bandes (voir
+                     get_sentinel_data_many)
+        
+        Returns:
+            DataFrame : analyse IA + statistiques zonales (moyenne et
+            écart-type des indices, pixels valides), groupe et source.
+            Une parcelle sans pixel valide (source 'aucun pixel' ou
+            'aucun pixel valide') n'est pas analysée : ses colonnes
+            restent à NaN. Pente, altitude et distances simulées sont
+            tirées d'une graine propre à chaque bbox (résultats stables
+            d'un appel à l'autre).
+        """
+        df = pd.DataFrame(parcels).reset_index(drop=True)
+        n = len(df)
+        lat = df['lat'].to_numpy(dtype=float)
+        lon = df['lon'].to_numpy(dtype=float)
+        delta = (df['size_km'].to_numpy(dtype=float) if 'size_km' in df else np.full(n, size_km)) / 111.0
+        boxes = np.column_stack([lon - delta / 2, lat - delta / 2, lon + delta / 2, lat + delta / 2])
+        
+        date_to = datetime.now()
+        date_from = date_to - timedelta(days=30)
+        batches = plan_batches(boxes, resolution, max_gap_m)
+        print(f"\n🛰️ Analyse groupée : {n} parcelles → {len(batches)} requêtes raster")
+        rasters = self._fetch_covers([batch['bbox'] for batch in batches], date_from, date_to,
+                                     resolution, fetch_url, concurrency, rate)
+        
+        zonal = {}
+        batch_id = np.empty(n, dtype=np.int32)
+        source = np.empty(n, dtype=object)
+        for b, (batch, (data, origin)) in enumerate(zip(batches, rasters)):
+            members = batch['members']
+            labels = label_image(batch['bbox'], data.shape[:2], boxes[members])
+            for name, values in zonal_statistics(data, labels, len(members)).items():
+                zonal.setdefault(name, np.full(n, np.nan))[members] = values
+            batch_id[members] = b
+            source[members] = origin
+        
+        fetched = sum(data.shape[0] * data.shape[1] for data, _ in rasters)
+        separate = sum(np.prod(raster_shape(box, resolution)) for box in boxes)
+        print(f"   📡 {fetched / 1e6:.2f} Mpx récupérés (requêtes séparées : {separate / 1e6:.2f} Mpx)")
+        
+        # Parcelle sans mesure : signalée et non analysée (jamais de valeurs inventées)
+        measured = np.isfinite(zonal['ndvi'])
+        source[zonal['n_pixels'] == 0] = 'aucun pixel'
+        source[(zonal['n_pixels'] > 0) & ~measured] = 'aucun pixel valide'
+        if not measured.all():
+            print(f"   ⚠️ {np.count_nonzero(~measured)} parcelles sans pixel valide (non analysées)")
+        
+        # Attributs de terrain simulés : une graine par bbox, comme synthetic_bands
+        rngs = [np.random.default_rng(bbox_seed(box)) for box in boxes]
+        parcel_data = pd.DataFrame({
+            'pays': df['pays'] if 'pays' in df else pays,
+            'region': df['region'] if 'region' in df else region,
+            'lat': lat,
+            'lon': lon,
+            'ndvi': zonal['ndvi'],
+            'ndwi': zonal['ndwi'],
+            'temp_surface': [self._estimate_temperature(y, {'ndvi': v}) for y, v in zip(lat, zonal['ndvi'])],
+            'albedo': (zonal['red'] + zonal['green'] + zonal['blue']) / 3,
+            'soil_texture': 1.0 - zonal['ndmi'],
+            'slope': [rng.exponential(5) for rng in rngs],  # Simulé (nécessiterait DEM)
+            'altitude': [self._estimate_altitude(y, x, rng) for y, x, rng in zip(lat, lon, rngs)],
+            'distance_water': [self._estimate_water_distance(v, rng) for v, rng in zip(zonal['ndwi'], rngs)],
+            'distance_road': [rng.exponential(3) for rng in rngs],  # Simulé
+            'surface': (delta * 111.0) ** 2 * 100
+        })
+        
+        print("   🤖 Analyse IA en cours...")
+        if measured.any():
+            results = self.ai_analyzer.analyze_parcels(parcel_data[measured].reset_index(drop=True))
+            results.index = np.flatnonzero(measured)
+            results = results.reindex(range(n))
+        else:
+            results = pd.DataFrame(index=range(n))
+        results.insert(0, 'lat', lat)
+        results.insert(1, 'lon', lon)
+        for name in ('ndvi', 'ndvi_std', 'ndwi', 'ndwi_std', 'ndmi', 'ndmi_std', 'valid_ratio', 'n_pixels'):
+            results[name] = zonal[name]
+        results['groupe'] = batch_id
+        results['source'] = source
+        print(f"   ✅ {np.count_nonzero(measured)}/{n} parcelles analysées")
+        return results
+    
+    def _fetch_covers(self, covers, date_from, date_to, resolution, fetch_url, concurrency, rate):
+        """Raster de bandes et source de chaque bbox couvrante"""
+        if fetch_url is not None:
+            fetcher = AsyncSentinelFetcher(fetch_url, concurrency=concurrency, rate=rate,
+                                           tile_cache=self.tile_cache)
+            fetched = fetcher.fetch_many_sync(covers, date_from, date_to, resolution)
+            return [(data, fetch_url) if data is not None
+                    else (synthetic_bands(cover, resolution, max_side=MAX_REQUEST_SIDE_PX), 'simulation')
+                    for cover, data in zip(covers, fetched)]
+        
+        rasters = []
+        for cover in covers:
+            if self.use_sentinel:
+                try:
+                    fetch = lambda: self._fetch_bands(cover, date_from, date_to, resolution)
+                    if self.tile_cache is not None:
+                        key = TileCache.key(cover, date_from, date_to, resolution, SENTINEL_BANDS)
+                        rasters.append((self.tile_cache.get_or_fetch(key, fetch), 'sentinel-2'))
+                    else:
+                        rasters.append((fetch(), 'sentinel-2'))
+                    continue
+                except Exception as e:
+                    print(f"⚠️ Erreur Sentinel Hub : {e}")
+            rasters.append((synthetic_bands(cover, resolution, max_side=MAX_REQUEST_SIDE_PX), 'simulation'))
+        return rasters
+    
+    def refresh_timeseries(self, lat, lon, date_from, date_to, size_km=1.0, step_days=5, resolution=10,
+                           fetch_url=None, concurrency=16, rate=50.0):
+        """
+        Met à jour la série temporelle NDVI/NDWI/NDMI d'une parcelle
+        
+        Une date tous les step_days jours (revisite Sentinel-2), chacune
+        composée sur sa fenêtre de step_days jours ; seules les dates
+        absentes du stockage sont récupérées.
+        
+        Args:
+            lat, lon: centre de la parcelle
+            date_from, date_to: période voulue
+            size_km: taille de la parcelle en km
+            step_days: pas entre deux dates
+            resolution: résolution en mètres
+            fetch_url, concurrency, rate: service de bandes (voir
+                     get_sentinel_data_many)
+        
+        Returns:
+            (clé de la série, nombre de dates ajoutées)
+        """
+        delta = size_km / 111.0
+        bbox = [lon - delta / 2, lat - delta / 2, lon + delta / 2, lat + delta / 2]
+        key = IndexTimeSeriesStore.series_key(bbox, resolution)
+        dates = pd.date_range(pd.Timestamp(date_from).normalize(), pd.Timestamp(date_to).normalize(),
+                              freq=f'{step_days}D')
+        
+        def fetch(days):
+            windows = [(bbox, day, (pd.Timestamp(day) + timedelta(days=step_days - 1)).strftime('%Y-%m-%d'))
+                       for day in days]
+            print(f"   📡 {len(days)} dates à récupérer ({len(dates) - len(days)} déjà stockées)")
+            if fetch_url is not None:
+                fetcher = AsyncSentinelFetcher(fetch_url, concurrency=concurrency, rate=rate,
+                                               tile_cache=self.tile_cache)
+                return fetcher.fetch_windows_sync(windows, resolution)
+            return [self._fetch_window(*window, resolution) for window in windows]
+        
+        added = self.timeseries.refresh(key, bbox, dates, fetch, resolution)
+        print(f"   🗓️ Série {key} : {added} dates ajoutées, {len(self.timeseries.dates(key))} au total")
+        return key, added
+    
+    def _fetch_window(self, bbox, date_from, date_to, resolution):
+        """Raster de bandes d'une fenêtre de dates (None si indisponible)"""
+        if not self.use_sentinel:
+            return synthetic_bands(bbox, resolution, day_of_year=pd.Timestamp(date_from).dayofyear)
+        try:
+            fetch = lambda: self._fetch_bands(bbox, date_from, date_to, resolution)
+            if self.tile_cache is not None:
+                key = TileCache.key(bbox, date_from, date_to, resolution, SENTINEL_BANDS)
+                return self.tile_cache.get_or_fetch(key, fetch)
+            return fetch()
+        except Exception as e:
+            print(f"⚠️ Erreur Sentinel Hub ({date_from}) : {e}")
+            return None
+    
     def _estimate_temperature(self, lat, sentinel_data):
         """Estime température surface"""
         # Température basée sur latitude et saison
@@ -277,27 +549,27 @@ class SentinelParcelAnalyzer:
         
         return np.clip(temp, 10, 45)
     
-    def _estimate_altitude(self, lat, lon):
-        """Estime altitude (simulée)"""
+    def _estimate_altitude(self, lat, lon, rng=np.random):
+        """Estime altitude (simulée ; rng = générateur des tirages)"""
         # Altitude basée sur position géographique
         if lat > 45:  # Zones montagneuses Europe
-            return np.random.uniform(200, 800)
+            return rng.uniform(200, 800)
         elif lat < 35:  # Zones désertiques
-            return np.random.uniform(50, 400)
+            return rng.uniform(50, 400)
         else:
-            return np.random.uniform(0, 600)
+            return rng.uniform(0, 600)
     
-    def _estimate_water_distance(self, ndwi):
-        """Estime distance à l'eau basé sur NDWI"""
+    def _estimate_water_distance(self, ndwi, rng=np.random):
+        """Estime distance à l'eau basé sur NDWI (rng = générateur des tirages)"""
         # NDWI élevé = eau proche
         if ndwi > 0.5:
-            return np.random.uniform(0.5, 2)
+            return rng.uniform(0.5, 2)
         elif ndwi > 0.3:
-            return np.random.uniform(2, 5)
+            return rng.uniform(2, 5)
         elif ndwi > 0.1:
-            return np.random.uniform(5, 10)
+            return rng.uniform(5, 10)
         else:
-            return np.random.uniform(10, 20)
+            return rng.uniform(10, 20)
     
     def _print_analysis_summary(self, result):
         """Affiche résumé de l'analyse"""
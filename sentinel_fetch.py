@@ -0,0 +1,480 @@
+"""
+Feralyx V2.0 - Récupération concurrente des rasters de bandes
+Client asyncio (plafond de concurrence, seau à jetons, reprises avec
+backoff, connexions HTTP keep-alive réutilisées) et serveur local de
+substitution servant des bandes synthétiques pour les tests de charge
+
+Usage :
+    python sentinel_fetch.py serve --port 8765
+    python sentinel_fetch.py bench --parcels 500 --concurrency 32 --rate 200
+"""
+
+import argparse
+import asyncio
+import io
+import random
+import ssl
+import time
+from datetime import datetime
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import numpy as np
+
+from sentinel_rasters import SENTINEL_BANDS, synthetic_bands
+from tile_cache import TileCache
+
+# Codes HTTP qui méritent une nouvelle tentative
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class HTTPStatusError(Exception):
+    """Réponse HTTP hors 2xx"""
+
+    def __init__(self, status, reason='', retry_after=None):
+        super().__init__(f"HTTP {status} {reason}".strip())
+        self.status = status
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Limiteur de débit : rate jetons par seconde, au plus capacity en réserve
+
+    Chaque requête consomme un jeton ; sans jeton disponible, acquire()
+    attend exactement le temps de recharge nécessaire.
+    """
+
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError("rate doit être > 0")
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ConnectionPool:
+    """
+    Connexions HTTP/1.1 keep-alive vers un hôte, réutilisées entre requêtes
+
+    Une connexion rendue après une réponse complète repart dans la pile
+    des connexions libres ; une connexion en erreur, ou dont le corps de
+    réponse était délimité par la fermeture, est fermée.
+    """
+
+    def __init__(self, url, max_idle=64):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.secure = parts.scheme == 'https'
+        self.port = parts.port or (443 if self.secure else 80)
+        self.max_idle = max_idle
+        self._idle = []
+        self.opened = 0
+
+    async def request(self, method, path, headers=None, body=b'', timeout=30.0):
+        """
+        Envoie une requête et lit la réponse complète
+
+        Returns:
+            (status, en-têtes en minuscules, corps)
+        """
+        reader, writer = await self._acquire()
+        try:
+            lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}",
+                     "Connection: keep-alive", f"Content-Length: {len(body)}"]
+            lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+            writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + body)
+            await writer.drain()
+            status, response_headers, content, reusable = await asyncio.wait_for(
+                _read_response(reader), timeout)
+        except BaseException:
+            writer.close()
+            raise
+        if not reusable or response_headers.get('connection', '').lower() == 'close' \
+                or len(self._idle) >= self.max_idle:
+            writer.close()
+        else:
+            self._idle.append((reader, writer))
+        return status, response_headers, content
+
+    async def _acquire(self):
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return reader, writer
+            writer.close()
+        self.opened += 1
+        context = ssl.create_default_context() if self.secure else None
+        return await asyncio.open_connection(self.host, self.port, ssl=context)
+
+    async def close(self):
+        for _, writer in self._idle:
+            writer.close()
+        for _, writer in self._idle:
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+        self._idle = []
+
+
+async def _read_response(reader):
+    """
+    Lit une réponse HTTP/1.1 complète
+
+    Corps délimité par Content-Length, en Transfer-Encoding: chunked, ou
+    à défaut par la fermeture de la connexion (lu jusqu'à la fin du flux).
+
+    Returns:
+        (status, en-têtes en minuscules, corps, connexion réutilisable)
+    """
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionResetError("Connexion fermée par le serveur")
+    _, status, *reason = status_line.decode('latin-1').split(' ', 2)
+    status = int(status)
+    headers = await _read_headers(reader)
+
+    if status < 200 or status in (204, 304):
+        return status, headers, b'', True
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        return status, headers, await _read_chunked(reader), True
+    if 'content-length' in headers:
+        return status, headers, await reader.readexactly(int(headers['content-length'])), True
+    # Ni longueur ni découpage : le corps s'arrête à la fermeture par le serveur
+    return status, headers, await reader.read(), False
+
+
+async def _read_headers(reader):
+    """En-têtes (ou trailers) jusqu'à la ligne vide, noms en minuscules"""
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            return headers
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+
+async def _read_chunked(reader):
+    """Corps en Transfer-Encoding: chunked (extensions et trailers ignorés)"""
+    parts = []
+    while True:
+        size_line = await reader.readline()
+        if not size_line:
+            raise asyncio.IncompleteReadError(b''.join(parts), None)
+        try:
+            size = int(size_line.split(b';', 1)[0].strip(), 16)
+        except ValueError:
+            raise ConnectionError(f"Taille de bloc HTTP invalide : {size_line!r}") from None
+        if size == 0:
+            await _read_headers(reader)
+            return b''.join(parts)
+        parts.append(await reader.readexactly(size))
+        await reader.readexactly(2)  # CRLF de fin de bloc
+
+
+class AsyncSentinelFetcher:
+    """
+    Récupération concurrente de rasters de bandes (int16, h x w x bandes)
+
+    Les requêtes partent en parallèle dans la limite de concurrency, au
+    rythme du seau à jetons ; les échecs réseau, délais dépassés et
+    réponses 429/5xx sont retentés avec un backoff exponentiel à gigue
+    (Retry-After respecté). Le protocole par défaut est celui du serveur
+    de substitution (GET /bands -> .npy) ; build_request permet de viser
+    un autre service.
+    """
+
+    def __init__(self, base_url, concurrency=16, rate=50.0, burst=None, retries=4, backoff=0.2,
+                 max_backoff=5.0, timeout=30.0, tile_cache=None, build_request=None, random_state=None):
+        """
+        Args:
+            base_url: URL du service (http://hôte:port)
+            concurrency: requêtes simultanées au plus
+            rate: requêtes par seconde (seau à jetons)
+            burst: capacité du seau (défaut : rate)
+            retries: nouvelles tentatives par raster
+            backoff: délai de base du backoff (s), doublé à chaque tentative
+            max_backoff: plafond du délai (s)
+            timeout: délai maximal d'une réponse (s)
+            tile_cache: TileCache consulté avant le réseau (optionnel)
+            build_request: fonction (bbox, date_from, date_to, resolution)
+                           -> (méthode, chemin, en-têtes, corps)
+        """
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.tile_cache = tile_cache
+        self.build_request = build_request or band_request
+        self.random = random.Random(random_state)
+        self.stats = {'requests': 0, 'retries': 0, 'failures': 0, 'cache_hits': 0, 'bytes': 0,
+                      'connections': 0, 'seconds': 0.0}
+
+    async def fetch_many(self, bboxes, date_from, date_to, resolution=10):
+        """
+        Rasters de toutes les bbox, dans l'ordre
+
+        Returns:
+            liste de tableaux (None pour une bbox en échec après reprises)
+        """
+        return await self.fetch_windows([(bbox, date_from, date_to) for bbox in bboxes], resolution)
+
+    async def fetch_windows(self, windows, resolution=10):
+        """
+        Rasters d'une liste de (bbox, date_from, date_to), dans l'ordre
+
+        Returns:
+            liste de tableaux (None pour une requête en échec après reprises)
+        """
+        start = time.perf_counter()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        bucket = TokenBucket(self.rate, self.burst)
+        pool = ConnectionPool(self.base_url, max_idle=self.concurrency)
+        try:
+            tasks = [self._fetch_one(pool, semaphore, bucket, bbox, date_from, date_to, resolution)
+                     for bbox, date_from, date_to in windows]
+            results = await asyncio.gather(*tasks)
+        finally:
+            await pool.close()
+        self.stats['connections'] += pool.opened
+        self.stats['seconds'] += time.perf_counter() - start
+        return results
+
+    def fetch_many_sync(self, bboxes, date_from, date_to, resolution=10):
+        """fetch_many depuis du code synchrone"""
+        return asyncio.run(self.fetch_many(bboxes, date_from, date_to, resolution))
+
+    def fetch_windows_sync(self, windows, resolution=10):
+        """fetch_windows depuis du code synchrone"""
+        return asyncio.run(self.fetch_windows(windows, resolution))
+
+    async def _fetch_one(self, pool, semaphore, bucket, bbox, date_from, date_to, resolution):
+        key = None
+        if self.tile_cache is not None:
+            key = TileCache.key(bbox, date_from, date_to, resolution, SENTINEL_BANDS, source=self.base_url)
+            cached = self.tile_cache.get(key)
+            if cached is not None:
+                self.stats['cache_hits'] += 1
+                return cached
+
+        method, path, headers, body = self.build_request(bbox, date_from, date_to, resolution)
+        async with semaphore:
+            for attempt in range(self.retries + 1):
+                await bucket.acquire()
+                self.stats['requests'] += 1
+                try:
+                    status, response_headers, content = await pool.request(
+                        method, path, headers, body, timeout=self.timeout)
+                    if status >= 300:
+                        raise HTTPStatusError(status, retry_after=response_headers.get('retry-after'))
+                    data = np.load(io.BytesIO(content), allow_pickle=False)
+                    self.stats['bytes'] += len(content)
+                    if key is not None:
+                        self.tile_cache.put(key, data)
+                    return data
+                except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, HTTPStatusError) as e:
+                    retryable = not isinstance(e, HTTPStatusError) or e.status in RETRY_STATUS
+                    if not retryable or attempt == self.retries:
+                        self.stats['failures'] += 1
+                        print(f"⚠️ Échec récupération {bbox} : {e}")
+                        return None
+                    self.stats['retries'] += 1
+                    await asyncio.sleep(self._delay(attempt, e))
+
+    def _delay(self, attempt, error):
+        """Backoff exponentiel à gigue complète, ou Retry-After du serveur"""
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_backoff)
+            except ValueError:
+                pass
+        return self.random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+
+def band_request(bbox, date_from, date_to, resolution):
+    """Requête du serveur de substitution : GET /bands?bbox=...&from=...&to=...&resolution=..."""
+    query = urlencode({
+        'bbox': ','.join(f"{v:.6f}" for v in bbox),
+        'from': str(date_from)[:10],
+        'to': str(date_to)[:10],
+        'resolution': resolution
+    })
+    return 'GET', f"/bands?{query}", {}, b''
+
+
+class StandInBandServer:
+    """
+    Serveur HTTP local imitant un service de bandes Sentinel
+
+    GET /bands renvoie le raster synthétique de la bbox (synthetic_bands)
+    au format .npy, après une latence simulée ; une fraction des réponses
+    peut échouer (503 ou 429 avec Retry-After) pour exercer les reprises.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.05, failure_rate=0.0, max_side=512,
+                 random_state=None):
+        """
+        Args:
+            host, port: adresse d'écoute (port 0 = choisi par le système)
+            latency: délai simulé par réponse (s)
+            failure_rate: part des réponses en erreur
+            max_side: côté maximal des rasters servis (pixels)
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.max_side = max_side
+        self.random = random.Random(random_state)
+        self.served = 0
+        self.failed = 0
+        self.connections = 0
+        self._server = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    if name.strip().lower() == 'content-length':
+                        length = int(value)
+                if length:
+                    await reader.readexactly(length)
+                status, headers, body = await self._respond(request_line.decode('latin-1').split(' ')[1])
+                head = [f"HTTP/1.1 {status}", f"Content-Length: {len(body)}", "Connection: keep-alive"]
+                head += [f"{name}: {value}" for name, value in headers.items()]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + body)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # Client parti ou serveur arrêté pendant l'attente de la requête suivante
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, target):
+        parts = urlsplit(target)
+        if parts.path != '/bands':
+            return '404 Not Found', {}, b''
+        await asyncio.sleep(self.latency)
+        if self.random.random() < self.failure_rate:
+            self.failed += 1
+            if self.random.random() < 0.5:
+                return '429 Too Many Requests', {'Retry-After': '0.05'}, b''
+            return '503 Service Unavailable', {}, b''
+
+        query = parse_qs(parts.query)
+        try:
+            bbox = [float(v) for v in query['bbox'][0].split(',')]
+            resolution = float(query.get('resolution', ['10'])[0])
+            day_of_year = None
+            if 'from' in query:
+                day_of_year = datetime.strptime(query['from'][0], '%Y-%m-%d').timetuple().tm_yday
+        except (KeyError, ValueError):
+            return '400 Bad Request', {}, b''
+        buffer = io.BytesIO()
+        np.save(buffer, synthetic_bands(bbox, resolution, max_side=self.max_side, day_of_year=day_of_year))
+        self.served += 1
+        return '200 OK', {'Content-Type': 'application/x-npy'}, buffer.getvalue()
+
+
+async def _benchmark(args):
+    rng = np.random.default_rng(0)
+    lat = rng.uniform(33, 37, args.parcels)
+    lon = rng.uniform(8, 11, args.parcels)
+    delta = args.size_km / 111.0
+    bboxes = [[x - delta / 2, y - delta / 2, x + delta / 2, y + delta / 2] for y, x in zip(lat, lon)]
+
+    async with StandInBandServer(latency=args.latency, failure_rate=args.failure_rate) as server:
+        fetcher = AsyncSentinelFetcher(server.url, concurrency=args.concurrency, rate=args.rate,
+                                       random_state=0)
+        results = await fetcher.fetch_many(bboxes, '2024-06-01', '2024-06-30')
+        stats = fetcher.stats
+        ok = sum(r is not None for r in results)
+        print(f"   ✅ {ok}/{len(bboxes)} rasters en {stats['seconds']:.2f}s "
+              f"({ok / stats['seconds']:.0f} rasters/s, {stats['bytes'] / 1e6:.1f} Mo)")
+        print(f"   🔁 {stats['requests']} requêtes, {stats['retries']} reprises, {stats['failures']} échecs, "
+              f"{stats['connections']} connexions ouvertes")
+        print(f"   ⏱️ Séquentiel estimé : {len(bboxes) * args.latency:.1f}s (latence seule)")
+
+
+async def _serve(args):
+    async with StandInBandServer(port=args.port, latency=args.latency,
+                                 failure_rate=args.failure_rate) as server:
+        print(f"   🌐 Serveur de bandes synthétiques : {server.url}/bands (Ctrl+C pour arrêter)")
+        await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Récupération concurrente de rasters Sentinel (test de charge)")
+    sub = parser.add_subparsers(dest='command', required=True)
+    serve = sub.add_parser('serve', help="lancer le serveur de substitution")
+    serve.add_argument('--port', type=int, default=8765)
+    bench = sub.add_parser('bench', help="test de charge contre un serveur local")
+    bench.add_argument('--parcels', type=int, default=500)
+    bench.add_argument('--concurrency', type=int, default=32)
+    bench.add_argument('--rate', type=float, default=200.0, help="requêtes par seconde")
+    bench.add_argument('--size-km', type=float, default=0.5)
+    for command in (serve, bench):
+        command.add_argument('--latency', type=float, default=0.05, help="latence simulée (s)")
+        command.add_argument('--failure-rate', type=float, default=0.0, help="part de réponses en erreur")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("📡 FERALYX V2.0 - RÉCUPÉRATION CONCURRENTE SENTINEL")
+    print("=" * 70)
+    try:
+        asyncio.run(_serve(args) if args.command == 'serve' else _benchmark(args))
+    except KeyboardInterrupt:
+        print("\n   🛑 Arrêt")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Feralyx V2.0 - Rasters d'indices Sentinel-2 pleine résolution
+Calcul NDVI/NDWI/NDMI en une passe par blocs de lignes (tampons
+préalloués) avec statistiques de scène accumulées au passage
+"""
+
+import numpy as np
+
+# Bandes Sentinel-2 demandées (ordre des canaux du raster renvoyé)
+SENTINEL_BANDS = ["B02", "B03", "B04", "B08", "B11", "B12"]
+BAND_NAMES = {"B02": 'blue', "B03": 'green', "B04": 'red', "B08": 'nir', "B11": 'swir1', "B12": 'swir2'}
+
+# Indice normalisé → (bande a, bande b) : (a - b) / (a + b)
+INDEX_BANDS = {
+    'ndvi': ("B08", "B04"),
+    'ndwi': ("B03", "B08"),
+    'ndmi': ("B08", "B11"),
+}
+
+RASTER_PERCENTILES = (5, 25, 50, 75, 95)
+HISTOGRAM_BINS = 20
+# Histogramme fin sur [-1, 1] : percentiles à 0.001 près sans tri
+FINE_BINS = 2000
+DN_SCALE = 10000.0  # DN Sentinel-2 L2A → réflectance
+
+
+def index_rasters(data, bands=SENTINEL_BANDS, indices=INDEX_BANDS, block_pixels=1 << 20):
+    """
+    Rasters float32 des indices normalisés et statistiques de scène
+
+    Un seul parcours du raster de bandes, par blocs de lignes : chaque
+    bloc est converti dans des tampons float32 réutilisés, les indices
+    sont écrits directement dans les rasters de sortie et les compteurs
+    (histogramme fin, sommes) sont cumulés tant que le bloc est en cache.
+    Un pixel est invalide (NaN) quand a + b <= 0 (nodata = DN 0).
+
+    Args:
+        data: raster (h, w, n_bandes) en DN (int16 de Sentinel Hub)
+        bands: nom des canaux de data
+        indices: dict {indice: (bande a, bande b)}
+        block_pixels: pixels par bloc
+
+    Returns:
+        (rasters {indice: float32 (h, w)}, stats {indice: résumé},
+         band_means {nom de bande: réflectance moyenne des pixels valides})
+    """
+    h, w = data.shape[:2]
+    channel = {band: k for k, band in enumerate(bands)}
+    rasters = {name: np.empty((h, w), dtype=np.float32) for name in indices}
+    histograms = {name: np.zeros(FINE_BINS, dtype=np.int64) for name in indices}
+    sums = {name: np.zeros(2) for name in indices}
+
+    block_rows = max(1, block_pixels // max(w, 1))
+    numerator = np.empty((block_rows, w), dtype=np.float32)
+    denominator = np.empty((block_rows, w), dtype=np.float32)
+    valid = np.empty((block_rows, w), dtype=bool)
+    band_sums = np.zeros(len(bands))
+    valid_pixels = 0
+
+    for start in range(0, h, block_rows):
+        block = data[start:start + block_rows]
+        rows = len(block)
+        num, den, ok = numerator[:rows], denominator[:rows], valid[:rows]
+
+        # Pixels nodata : toutes les bandes à 0, sans effet sur les sommes
+        band_sums += block.sum(axis=(0, 1), dtype=np.int64)
+        valid_pixels += np.count_nonzero(block.any(axis=2))
+
+        for name, (a, b) in indices.items():
+            band_a, band_b = block[:, :, channel[a]], block[:, :, channel[b]]
+            np.subtract(band_a, band_b, out=num, dtype=np.float32)
+            np.add(band_a, band_b, out=den, dtype=np.float32)
+            np.greater(den, 0, out=ok)
+            out = rasters[name][start:start + rows]
+            out.fill(np.nan)
+            np.divide(num, den, out=out, where=ok)
+
+            values = out[ok]
+            bins = ((values + 1.0) * (FINE_BINS / 2)).astype(np.int64)
+            histograms[name] += np.bincount(np.clip(bins, 0, FINE_BINS - 1), minlength=FINE_BINS)
+            sums[name] += (values.sum(dtype=np.float64), np.square(values, dtype=np.float64).sum())
+
+    stats = {name: _summary(histograms[name], sums[name], h * w) for name in indices}
+    band_means = {BAND_NAMES.get(band, band):
+                  float(band_sums[k] / valid_pixels / DN_SCALE) if valid_pixels else np.nan
+                  for k, band in enumerate(bands)}
+    return rasters, stats, band_means
+
+
+def _summary(histogram, sums, n_pixels, percentiles=RASTER_PERCENTILES, bins=HISTOGRAM_BINS):
+    """Moyenne, écart-type, percentiles, histogramme et taux de pixels valides"""
+    count = int(histogram.sum())
+    edges = np.linspace(-1.0, 1.0, bins + 1)
+    summary = {
+        'valid_ratio': count / n_pixels if n_pixels else 0.0,
+        'histogram': {'edges': edges, 'counts': histogram.reshape(bins, -1).sum(axis=1)}
+    }
+    if not count:
+        summary.update(mean=np.nan, std=np.nan, percentiles={f'p{p}': np.nan for p in percentiles})
+        return summary
+    mean = sums[0] / count
+    summary['mean'] = float(mean)
+    summary['std'] = float(np.sqrt(max(sums[1] / count - mean ** 2, 0.0)))
+
+    # Interpolation linéaire dans la classe fine qui contient le rang
+    cumulative = np.cumsum(histogram)
+    fine_width = 2.0 / len(histogram)
+    summary['percentiles'] = {}
+    for p in percentiles:
+        rank = p / 100 * count
+        i = int(np.searchsorted(cumulative, rank, side='left'))
+        i = min(i, len(histogram) - 1)
+        below = cumulative[i - 1] if i else 0
+        inside = (rank - below) / histogram[i] if histogram[i] else 0.0
+        summary['percentiles'][f'p{p}'] = float(-1.0 + (i + inside) * fine_width)
+    return summary
+
+
+def bbox_seed(bbox):
+    """Graine déterministe d'une bbox (tirages simulés reproductibles par parcelle)"""
+    lat_center = (bbox[1] + bbox[3]) / 2
+    lon_center = (bbox[0] + bbox[2]) / 2
+    return int(abs(lat_center * 1000 + lon_center * 1000)) % 1000000
+
+
+def synthetic_bands(bbox, resolution=10, seed=None, max_side=4096, day_of_year=None):
+    """
+    Raster de bandes simulé (int16 DN, h x w x 6) pour le mode simulation
+
+    Taille déduite de la bbox et de la résolution ; végétation et
+    humidité varient en champs lisses pour donner une hétérogénéité
+    intra-parcelle réaliste. Déterministe pour une bbox donnée ; avec
+    day_of_year, la végétation suit un cycle saisonnier (pic fin avril)
+    et le bruit change d'une date à l'autre.
+    """
+    lat_center = (bbox[1] + bbox[3]) / 2
+    height = int(np.clip(round((bbox[3] - bbox[1]) * 111000 / resolution), 1, max_side))
+    width = int(np.clip(round((bbox[2] - bbox[0]) * 111000 * np.cos(np.radians(lat_center)) / resolution),
+                        1, max_side))
+    if seed is None:
+        seed = bbox_seed(bbox)
+    rng = np.random.default_rng(seed)
+
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, np.newaxis]
+    x = np.linspace(0, 1, width, dtype=np.float32)[np.newaxis, :]
+
+    def field(scale):
+        fx, fy, px, py = rng.uniform(1, 4), rng.uniform(1, 4), rng.uniform(0, 6.3), rng.uniform(0, 6.3)
+        return scale * np.sin(fx * 6.283 * x + px) * np.cos(fy * 6.283 * y + py)
+
+    vegetation_field, moisture_field = field(0.15), field(0.15)
+    season = 0.0
+    if day_of_year is not None:
+        season = 0.2 * np.cos(2 * np.pi * (day_of_year - 120) / 365)
+        rng = np.random.default_rng([seed, day_of_year])
+    vegetation = np.clip(0.7 - abs(lat_center - 35) * 0.02 + season + vegetation_field, 0.05, 0.95)
+    moisture = np.clip(0.4 + season / 2 + moisture_field, 0.05, 0.9)
+    red = 0.12 - 0.09 * vegetation
+    nir = 0.15 + 0.35 * vegetation
+    bands = [
+        0.05 + 0.05 * (1 - vegetation),          # B02
+        0.06 + 0.1 * moisture,                   # B03
+        red,                                      # B04
+        nir,                                      # B08
+        nir * (1.1 - 0.8 * moisture),            # B11
+        nir * (0.9 - 0.6 * moisture),            # B12
+    ]
+    data = np.empty((height, width, len(SENTINEL_BANDS)), dtype=np.int16)
+    for k, band in enumerate(bands):
+        noise = rng.normal(0, 0.01, (height, width)).astype(np.float32)
+        data[:, :, k] = np.clip((band + noise) * DN_SCALE, 1, 32767)
+    return data
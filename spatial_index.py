@@ -0,0 +1,265 @@
+"""
+Feralyx V2.0 - Index spatial des parcelles scorées
+Grille régulière lat/lon : requêtes rectangle, rayon et k plus proches
+voisins sur des millions de parcelles, avec insertion incrémentale
+"""
+
+import numpy as np
+import pandas as pd
+
+from model_artifacts import ModelArtifact, save_artifact
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.0
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Distance grand cercle (km), vectorisée"""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class ParcelSpatialIndex:
+    """
+    Index spatial sur grille pour parcelles scorées
+
+    Les points sont triés par clé de cellule (ligne de latitude, puis
+    colonne de longitude) : les cellules d'une même ligne sont contiguës,
+    donc un rectangle se résout en une tranche par ligne de grille via
+    searchsorted. Les insertions vont dans un tampon parcouru en force
+    brute, fusionné dans la partie triée au-delà de merge_threshold points.
+    """
+
+    def __init__(self, cell_size=0.05, merge_threshold=100000):
+        """
+        Args:
+            cell_size: taille d'une cellule en degrés
+            merge_threshold: taille du tampon d'insertion avant fusion
+        """
+        self.cell_size = float(cell_size)
+        self.merge_threshold = merge_threshold
+        self._n_cols = int(np.ceil(360.0 / self.cell_size)) + 1
+
+        self.keys = np.empty(0, dtype=np.int64)
+        self.lat = np.empty(0)
+        self.lon = np.empty(0)
+        self.columns = {}
+        self._pending = []
+
+    def __len__(self):
+        return len(self.keys) + sum(len(p['lat']) for p in self._pending)
+
+    # ------------------------------------------------------------------
+    # Insertion
+    # ------------------------------------------------------------------
+
+    def insert(self, lat, lon, **columns):
+        """
+        Ajoute des parcelles
+
+        Args:
+            lat, lon: tableaux de coordonnées
+            **columns: attributs par parcelle (score, fertilite, culture...)
+                       Toutes les insertions doivent fournir les mêmes colonnes.
+        """
+        lat = np.asarray(lat, dtype=np.float64).ravel()
+        lon = np.asarray(lon, dtype=np.float64).ravel()
+        expected = self._column_names()
+        if expected is not None and set(columns) != expected:
+            raise ValueError(f"Colonnes attendues : {sorted(expected)}")
+
+        batch = {
+            'lat': lat,
+            'lon': lon,
+            'columns': {name: np.asarray(values).ravel() for name, values in columns.items()}
+        }
+        for name, values in batch['columns'].items():
+            if len(values) != len(lat):
+                raise ValueError(f"Colonne {name} : {len(values)} valeurs pour {len(lat)} points")
+        self._pending.append(batch)
+
+        if sum(len(p['lat']) for p in self._pending) >= self.merge_threshold:
+            self._merge_pending()
+        return self
+
+    def insert_frame(self, df, columns=None):
+        """Ajoute les lignes d'un DataFrame ayant des colonnes lat/lon"""
+        columns = columns or [c for c in df.columns if c not in ('lat', 'lon')]
+        return self.insert(df['lat'].to_numpy(), df['lon'].to_numpy(),
+                           **{c: df[c].to_numpy() for c in columns})
+
+    def insert_heatmap(self, heatmap_data):
+        """Ajoute la sortie de SatelliteParcelAnalyzer.generate_heatmap_data()"""
+        return self.insert(heatmap_data['lat'], heatmap_data['lon'],
+                           **{k: v for k, v in heatmap_data.items() if k not in ('lat', 'lon')})
+
+    def insert_analyses(self, results):
+        """Ajoute des analyses SentinelParcelAnalyzer (dicts ou JSON save_analysis)"""
+        df = pd.DataFrame({
+            'lat': [r['coordinates']['lat'] for r in results],
+            'lon': [r['coordinates']['lon'] for r in results],
+            'score': [r['score_opportunite'] for r in results],
+            'fertilite': [r['fertilite'] for r in results],
+            'valeur_totale': [r['valeur_totale'] for r in results],
+            'culture': [r['culture_recommandee'] for r in results]
+        })
+        return self.insert_frame(df)
+
+    def _column_names(self):
+        if len(self.keys):
+            return set(self.columns)
+        if self._pending:
+            return set(self._pending[0]['columns'])
+        return None
+
+    def _cell_keys(self, lat, lon):
+        row = np.floor((np.asarray(lat) + 90.0) / self.cell_size).astype(np.int64)
+        col = np.floor((np.asarray(lon) + 180.0) / self.cell_size).astype(np.int64)
+        return row * self._n_cols + col
+
+    def _merge_pending(self):
+        """Fusionne le tampon dans la partie triée"""
+        if not self._pending:
+            return
+        lat = np.concatenate([self.lat] + [p['lat'] for p in self._pending])
+        lon = np.concatenate([self.lon] + [p['lon'] for p in self._pending])
+        names = self._pending[0]['columns'].keys()
+        columns = {
+            name: np.concatenate(([self.columns[name]] if name in self.columns else [])
+                                 + [p['columns'][name] for p in self._pending])
+            for name in names
+        }
+        keys = self._cell_keys(lat, lon)
+        order = np.argsort(keys, kind='stable')
+
+        self.keys = keys[order]
+        self.lat = lat[order]
+        self.lon = lon[order]
+        self.columns = {name: values[order] for name, values in columns.items()}
+        self._pending = []
+
+    # ------------------------------------------------------------------
+    # Requêtes
+    # ------------------------------------------------------------------
+
+    def query_bbox(self, min_lat, min_lon, max_lat, max_lon, top_k=None, by='score'):
+        """
+        Parcelles dans un rectangle
+
+        Args:
+            min_lat, min_lon, max_lat, max_lon: rectangle en degrés
+            top_k: ne garder que les top_k meilleures selon by
+            by: colonne de classement (décroissant)
+
+        Returns:
+            dict de tableaux (lat, lon + colonnes)
+        """
+        lat, lon, columns = self._candidates(min_lat, min_lon, max_lat, max_lon)
+        mask = (lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)
+        return self._result(lat[mask], lon[mask], {k: v[mask] for k, v in columns.items()},
+                            top_k=top_k, by=by)
+
+    def query_radius(self, lat, lon, radius_km, top_k=None, by='score'):
+        """Parcelles à moins de radius_km du point (colonne distance_km ajoutée)"""
+        d_lat = radius_km / KM_PER_DEGREE
+        d_lon = radius_km / (KM_PER_DEGREE * max(np.cos(np.radians(lat)), 1e-6))
+        c_lat, c_lon, columns = self._candidates(lat - d_lat, lon - d_lon, lat + d_lat, lon + d_lon)
+        distance = haversine_km(lat, lon, c_lat, c_lon)
+        mask = distance <= radius_km
+        columns = {k: v[mask] for k, v in columns.items()}
+        columns['distance_km'] = distance[mask]
+        return self._result(c_lat[mask], c_lon[mask], columns, top_k=top_k, by=by)
+
+    def query_knn(self, lat, lon, k=10):
+        """
+        k parcelles les plus proches (triées par distance)
+
+        Le rayon de recherche double jusqu'à ce que le cercle contienne au
+        moins k parcelles : les k plus proches sont alors forcément dedans.
+        """
+        n_total = len(self)
+        k = min(k, n_total)
+        radius_km = self.cell_size * KM_PER_DEGREE
+        while True:
+            result = self.query_radius(lat, lon, radius_km)
+            if len(result['lat']) >= k or radius_km > np.pi * EARTH_RADIUS_KM:
+                break
+            radius_km *= 2
+
+        order = np.argsort(result['distance_km'], kind='stable')[:k]
+        return {name: values[order] for name, values in result.items()}
+
+    def _candidates(self, min_lat, min_lon, max_lat, max_lon):
+        """Points des cellules couvrant le rectangle (partie triée + tampon)"""
+        row_lo, col_lo = self._row_col(min_lat, min_lon)
+        row_hi, col_hi = self._row_col(max_lat, max_lon)
+        rows = np.arange(row_lo, row_hi + 1, dtype=np.int64)
+        starts = np.searchsorted(self.keys, rows * self._n_cols + col_lo, side='left')
+        stops = np.searchsorted(self.keys, rows * self._n_cols + col_hi, side='right')
+
+        lengths = stops - starts
+        if lengths.sum():
+            # Concaténation des tranches [start, stop) sans boucle Python
+            idx = np.repeat(stops - lengths.cumsum(), lengths) + np.arange(lengths.sum())
+        else:
+            idx = np.empty(0, dtype=np.int64)
+
+        lat = [self.lat[idx]]
+        lon = [self.lon[idx]]
+        columns = {name: [values[idx]] for name, values in self.columns.items()}
+        for batch in self._pending:
+            lat.append(batch['lat'])
+            lon.append(batch['lon'])
+            for name, values in batch['columns'].items():
+                columns.setdefault(name, []).append(values)
+        return (np.concatenate(lat), np.concatenate(lon),
+                {name: np.concatenate(parts) for name, parts in columns.items()})
+
+    def _row_col(self, lat, lon):
+        row = int(np.floor((np.clip(lat, -90.0, 90.0) + 90.0) / self.cell_size))
+        col = int(np.floor((np.clip(lon, -180.0, 180.0) + 180.0) / self.cell_size))
+        return row, col
+
+    @staticmethod
+    def _result(lat, lon, columns, top_k=None, by='score'):
+        result = {'lat': lat, 'lon': lon, **columns}
+        if top_k is not None:
+            order = np.argsort(-result[by], kind='stable')[:top_k]
+            result = {name: values[order] for name, values in result.items()}
+        return result
+
+    # ------------------------------------------------------------------
+    # Persistance
+    # ------------------------------------------------------------------
+
+    def save(self, path='models/parcel_index.artifact'):
+        """Sauvegarde (tableaux .npy mappables + manifeste)"""
+        self._merge_pending()
+        arrays = {'keys': self.keys, 'lat': self.lat, 'lon': self.lon}
+        for name, values in self.columns.items():
+            if values.dtype == object:
+                values = values.astype(str)
+            arrays[f"col.{name}"] = values
+        save_artifact(path, arrays=arrays, meta={
+            'kind': 'parcel_spatial_index',
+            'cell_size': self.cell_size,
+            'merge_threshold': self.merge_threshold,
+            'columns': list(self.columns)
+        })
+        print(f"   💾 Index spatial sauvegardé : {path} ({len(self.keys)} parcelles)")
+        return path
+
+    @classmethod
+    def load(cls, path='models/parcel_index.artifact'):
+        """Charge un index ; les tableaux restent mappés en mémoire"""
+        artifact = ModelArtifact(path)
+        meta = artifact.meta
+        index = cls(cell_size=meta['cell_size'], merge_threshold=meta['merge_threshold'])
+        index.keys = artifact.array('keys')
+        index.lat = artifact.array('lat')
+        index.lon = artifact.array('lon')
+        index.columns = {name: artifact.array(f"col.{name}") for name in meta['columns']}
+        print(f"   📂 Index spatial chargé : {path} ({len(index.keys)} parcelles)")
+        return index
@@ -0,0 +1,128 @@
+"""
+Feralyx V2.0 - Substitut rapide des modèles par table de correspondance
+Table multi-dimensionnelle précalculée sur les features les plus
+influentes, évaluée par interpolation multilinéaire
+"""
+
+import time
+
+import numpy as np
+
+
+class LookupTableSurrogate:
+    """
+    Approximation tabulée de plusieurs sorties de modèles
+
+    Chaque nœud de la grille (features retenues) stocke la dépendance
+    partielle des modèles : moyenne des prédictions sur un échantillon de
+    fond où seules les features retenues sont fixées à la valeur du nœud.
+    Les nœuds suivent les quantiles de l'échantillon (plus fins là où les
+    points sont nombreux) ; hors de la grille, la valeur du bord est
+    utilisée. Une évaluation = recherche des cellules + 2^d lectures
+    pondérées, sans appel aux modèles.
+    """
+
+    def __init__(self, feature_index, nodes, tables, outputs):
+        """
+        Args:
+            feature_index: colonnes de la matrice brute utilisées par la table
+            nodes: liste de tableaux croissants (nœuds de chaque feature)
+            tables: tableau (n_sorties, b1, ..., bd)
+            outputs: noms des sorties
+        """
+        self.feature_index = list(feature_index)
+        self.nodes = [np.asarray(n, dtype=np.float64) for n in nodes]
+        self.tables = np.asarray(tables, dtype=np.float64)
+        self.outputs = list(outputs)
+        self.errors = {}
+        self._flat = self.tables.reshape(len(self.outputs), -1)
+        shape = self.tables.shape[1:]
+        self._strides = np.array([int(np.prod(shape[k + 1:])) for k in range(len(shape))], dtype=np.int64)
+
+    @classmethod
+    def fit(cls, predict_fn, sample, feature_index, outputs, n_bins=12, n_background=32,
+            max_rows=500000):
+        """
+        Précalcule la table
+
+        Args:
+            predict_fn: fonction X brut (n, n_features) → (n, n_sorties)
+            sample: échantillon brut de la distribution à servir
+            feature_index: colonnes retenues pour la grille (au moins deux
+                           valeurs distinctes dans l'échantillon)
+            outputs: noms des sorties de predict_fn
+            n_bins: nœuds par feature
+            n_background: lignes de fond moyennées par nœud
+            max_rows: lignes prédites par appel à predict_fn
+        """
+        quantiles = np.linspace(0.005, 0.995, n_bins)
+        nodes = [np.unique(np.quantile(sample[:, j], quantiles)) for j in feature_index]
+        constant = [j for j, n in zip(feature_index, nodes) if len(n) < 2]
+        if constant:
+            raise ValueError(f"Features constantes dans l'échantillon, non tabulables : {constant}")
+        background = sample[:n_background]
+
+        # Toutes les combinaisons de nœuds, ligne par ligne
+        grid = np.stack(np.meshgrid(*nodes, indexing='ij'), axis=-1).reshape(-1, len(feature_index))
+        shape = tuple(len(n) for n in nodes)
+        values = np.empty((len(grid), len(outputs)))
+        nodes_per_call = max(1, max_rows // len(background))
+        for start in range(0, len(grid), nodes_per_call):
+            block = grid[start:start + nodes_per_call]
+            X = np.repeat(background[np.newaxis], len(block), axis=0)
+            X[:, :, feature_index] = block[:, np.newaxis, :]
+            predictions = np.asarray(predict_fn(X.reshape(-1, sample.shape[1])))
+            values[start:start + len(block)] = predictions.reshape(len(block), len(background), -1).mean(axis=1)
+        return cls(feature_index, nodes, values.T.reshape((len(outputs),) + shape), outputs)
+
+    def predict(self, X, chunk_size=65536):
+        """Sorties interpolées (n, n_sorties) pour une matrice brute"""
+        X = np.asarray(X)
+        result = np.empty((len(X), len(self.outputs)))
+        for start in range(0, len(X), chunk_size):
+            result[start:start + chunk_size] = self._interpolate(X[start:start + chunk_size])
+        return result
+
+    def _interpolate(self, X):
+        """Somme pondérée sur les 2^d coins de la cellule de chaque ligne"""
+        n = len(X)
+        cells = np.zeros(n, dtype=np.int64)
+        # Poids et décalages des coins, doublés à chaque dimension
+        weights = np.ones((n, 1))
+        offsets = np.zeros(1, dtype=np.int64)
+        for k, (j, nodes) in enumerate(zip(self.feature_index, self.nodes)):
+            x = X[:, j]
+            cell = np.clip(np.searchsorted(nodes, x, side='right') - 1, 0, len(nodes) - 2)
+            low = nodes[cell]
+            fraction = np.clip((x - low) / (nodes[cell + 1] - low), 0.0, 1.0)[:, np.newaxis]
+            cells += cell * self._strides[k]
+            weights = np.hstack([weights * (1.0 - fraction), weights * fraction])
+            offsets = np.concatenate([offsets, offsets + self._strides[k]])
+        corners = np.take(self._flat, cells[:, np.newaxis] + offsets, axis=1)
+        return np.einsum('onc,nc->no', corners, weights)
+
+    def evaluate(self, predict_fn, X_holdout):
+        """
+        Erreur du substitut face aux modèles sur un échantillon de contrôle
+
+        Returns:
+            dict {sortie: {'mae', 'rmse', 'max_abs', 'r2'}} + débit mesuré
+        """
+        exact = np.asarray(predict_fn(X_holdout))
+        start = time.perf_counter()
+        approx = self.predict(X_holdout)
+        seconds = time.perf_counter() - start
+
+        errors = {}
+        for k, name in enumerate(self.outputs):
+            residual = approx[:, k] - exact[:, k]
+            variance = exact[:, k].var()
+            errors[name] = {
+                'mae': float(np.abs(residual).mean()),
+                'rmse': float(np.sqrt((residual ** 2).mean())),
+                'max_abs': float(np.abs(residual).max()),
+                'r2': float(1 - (residual ** 2).mean() / variance) if variance > 0 else 1.0
+            }
+        errors['rows_per_sec'] = len(X_holdout) / seconds if seconds > 0 else float('inf')
+        self.errors = errors
+        return errors
@@ -0,0 +1,170 @@
+"""
+Feralyx V2.0 - Cache disque des tuiles satellite
+Bandes brutes par (bbox, fenêtre de dates, résolution, bandes), stockées en
+.npy (mappé en mémoire à la lecture) ou .npz compressé, éviction LRU sous
+un budget d'octets
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+TILE_CACHE_DIR = 'data/tile_cache'
+TILE_CACHE_MAX_BYTES = 512 * 1024 ** 2
+
+
+class TileCache:
+    """
+    Cache LRU persistant de rasters de bandes
+
+    Le répertoire sert d'index : un fichier par tuile, nommé par le
+    hachage de sa clé, dont la date de modification tient lieu d'horloge
+    LRU (rafraîchie à chaque lecture). Les écritures passent par un
+    fichier temporaire renommé, si bien qu'une tuile lue est toujours
+    complète, même après une interruption.
+    """
+
+    def __init__(self, directory=TILE_CACHE_DIR, max_bytes=TILE_CACHE_MAX_BYTES, compress=False):
+        """
+        Args:
+            directory: répertoire du cache (créé si absent)
+            max_bytes: budget disque ; les tuiles les moins récemment lues
+                       sont supprimées au-delà
+            compress: .npz compressé (moins de disque) au lieu de .npy
+                      mappable (lecture sans copie)
+        """
+        if max_bytes < 1:
+            raise ValueError("max_bytes doit être >= 1")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(bbox, date_from, date_to, resolution, bands, source=None):
+        """
+        Clé d'une tuile
+
+        Les dates sont ramenées au jour (une fenêtre « 30 derniers jours »
+        recalculée dans la journée retombe sur la même tuile) et la bbox
+        arrondie au micro-degré. source distingue les services autres que
+        Sentinel Hub (serveur de substitution...).
+        """
+        payload = {
+            'bbox': [round(float(v), 6) for v in bbox],
+            'dates': [_day(date_from), _day(date_to)],
+            'resolution': resolution,
+            'bands': list(bands)
+        }
+        if source is not None:
+            payload['source'] = source
+        return hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def get(self, key):
+        """Raster en cache (mappé en mémoire pour .npy) ou None"""
+        path = self._path(key)
+        if path is None:
+            self.misses += 1
+            return None
+        try:
+            if path.endswith('.npz'):
+                with np.load(path) as archive:
+                    data = archive['data']
+            else:
+                data = np.load(path, mmap_mode='r')
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            # Fichier illisible (copie externe interrompue...) : traité comme absent
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """Enregistre un raster puis évince au-delà du budget"""
+        data = np.asarray(data)
+        final = os.path.join(self.directory, key + ('.npz' if self.compress else '.npy'))
+        tmp = final + '.tmp'
+        with open(tmp, 'wb') as f:
+            if self.compress:
+                np.savez_compressed(f, data=data)
+            else:
+                np.save(f, data)
+        os.replace(tmp, final)
+        self._evict(keep=final)
+        return final
+
+    def get_or_fetch(self, key, fetch):
+        """Raster en cache, sinon fetch() puis mise en cache"""
+        data = self.get(key)
+        if data is None:
+            data = fetch()
+            self.put(key, data)
+        return data
+
+    def clear(self):
+        """Supprime toutes les tuiles (les compteurs sont conservés)"""
+        for path, _, _ in self._entries():
+            os.remove(path)
+
+    def size_bytes(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def stats(self):
+        """Compteurs d'utilisation"""
+        entries = self._entries()
+        lookups = self.hits + self.misses
+        return {
+            'tiles': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+    def _path(self, key):
+        for ext in ('.npy', '.npz'):
+            path = os.path.join(self.directory, key + ext)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _entries(self):
+        """(chemin, taille, dernière lecture) des tuiles du répertoire"""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(('.npy', '.npz')):
+                    stat = entry.stat()
+                    entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _evict(self, keep=None):
+        """Supprime les tuiles les moins récemment lues jusqu'à tenir dans le budget"""
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.evictions += 1
+
+
+def _day(value):
+    """Date au jour près (datetime, date ou texte ISO)"""
+    if hasattr(value, 'date') and callable(value.date):
+        value = value.date()
+    return str(value)[:10]
@@ -0,0 +1,230 @@
+"""
+Feralyx V2.0 - Séries temporelles d'indices Sentinel par parcelle
+Stockage disque par blocs de dates (date x y x x, int16 mis à l'échelle),
+en ajout seul, lu par mappage mémoire
+"""
+
+import hashlib
+import json
+import os
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from sentinel_rasters import INDEX_BANDS, index_rasters
+
+TIMESERIES_DIR = 'data/timeseries'
+INDEX_SCALE = 10000  # indice [-1, 1] → int16
+NODATA = np.iinfo(np.int16).min
+CHUNK_DATES = 16
+
+
+class IndexTimeSeriesStore:
+    """
+    Cubes d'indices (date, y, x) par parcelle
+
+    Chaque parcelle a son répertoire : un fichier .npy int16 de
+    CHUNK_DATES dates par indice et par bloc, préalloué à NODATA puis
+    rempli en place (ajout seul), et un meta.json qui liste les dates
+    écrites. meta.json est réécrit atomiquement après les données : une
+    date n'existe qu'une fois entièrement écrite, et un emplacement
+    orphelin après une interruption est simplement réutilisé.
+    """
+
+    def __init__(self, directory=TIMESERIES_DIR, chunk_dates=CHUNK_DATES, indices=tuple(INDEX_BANDS)):
+        """
+        Args:
+            directory: racine du stockage
+            chunk_dates: dates par bloc (fichier)
+            indices: indices stockés
+        """
+        self.directory = directory
+        self.chunk_dates = chunk_dates
+        self.indices = list(indices)
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def series_key(bbox, resolution=10):
+        """Identifiant d'une parcelle : bbox arrondie au micro-degré + résolution"""
+        payload = json.dumps({'bbox': [round(float(v), 6) for v in bbox], 'resolution': resolution})
+        return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+    def dates(self, key):
+        """Dates stockées (ordre chronologique)"""
+        meta = self._meta(key)
+        return sorted(meta['dates']) if meta else []
+
+    def missing_dates(self, key, dates):
+        """Dates demandées absentes du stockage"""
+        stored = set(self.dates(key))
+        return [d for d in (_day(d) for d in dates) if d not in stored]
+
+    def append(self, key, day, rasters, bbox=None, resolution=None):
+        """
+        Ajoute les rasters d'indices d'une date
+
+        Args:
+            key: identifiant de la parcelle (series_key)
+            day: date d'acquisition
+            rasters: dict {indice: float (h, w), NaN = invalide}
+            bbox, resolution: géoréférencement, enregistré à la création
+        """
+        day = _day(day)
+        meta = self._meta(key)
+        shape = rasters[self.indices[0]].shape
+        if meta is None:
+            meta = {'bbox': bbox, 'resolution': resolution, 'shape': list(shape),
+                    'indices': self.indices, 'scale': INDEX_SCALE, 'chunk_dates': self.chunk_dates,
+                    'dates': []}
+            os.makedirs(self._dir(key), exist_ok=True)
+        elif list(shape) != meta['shape']:
+            raise ValueError(f"Raster {shape} incompatible avec la série {key} {tuple(meta['shape'])}")
+        if day in meta['dates']:
+            return False
+
+        slot = len(meta['dates'])
+        chunk, position = divmod(slot, meta['chunk_dates'])
+        for name in meta['indices']:
+            path = self._chunk_path(key, name, chunk)
+            if position == 0 or not os.path.exists(path):
+                block = np.lib.format.open_memmap(path, mode='w+', dtype=np.int16,
+                                                  shape=(meta['chunk_dates'],) + shape)
+                block[:] = NODATA
+            else:
+                block = np.lib.format.open_memmap(path, mode='r+')
+            block[position] = quantize(rasters[name])
+            block.flush()
+            del block
+
+        meta['dates'].append(day)
+        self._write_meta(key, meta)
+        return True
+
+    def read(self, key, index, start=None, end=None):
+        """
+        Cube d'un indice sur une période
+
+        Returns:
+            (dates, tableau float32 (n_dates, h, w), NaN = invalide)
+        """
+        order, dates = self._selection(key, start, end)
+        cube = np.empty((len(order),) + tuple(self._meta(key)['shape']), dtype=np.float32)
+        for i, raw in enumerate(self._slices(key, index, order)):
+            cube[i] = dequantize(raw)
+        return dates, cube
+
+    def curve(self, key, index='ndvi', start=None, end=None, stat='mean'):
+        """
+        Courbe saisonnière d'un indice : statistique spatiale par date
+
+        Lecture bloc par bloc (mappée), une date à la fois : rien n'est
+        téléchargé ni chargé en entier.
+
+        Args:
+            stat: 'mean', 'median', 'std' ou 'valid_ratio'
+
+        Returns:
+            Series indexée par date
+        """
+        order, dates = self._selection(key, start, end)
+        values = np.empty(len(order))
+        for i, raw in enumerate(self._slices(key, index, order)):
+            valid = raw != NODATA
+            pixels = raw[valid].astype(np.float64) / INDEX_SCALE
+            if stat == 'valid_ratio':
+                values[i] = valid.mean()
+            elif not len(pixels):
+                values[i] = np.nan
+            elif stat == 'median':
+                values[i] = np.median(pixels)
+            elif stat == 'std':
+                values[i] = pixels.std()
+            else:
+                values[i] = pixels.mean()
+        return pd.Series(values, index=pd.to_datetime(dates), name=f'{index}_{stat}')
+
+    def refresh(self, key, bbox, dates, fetch, resolution=10):
+        """
+        Complète la série : seules les dates absentes sont récupérées
+
+        Args:
+            fetch: fonction (dates manquantes) -> liste de rasters de bandes
+                   (None si indisponible), dans le même ordre
+        Returns:
+            nombre de dates ajoutées
+        """
+        missing = self.missing_dates(key, dates)
+        if not missing:
+            return 0
+        added = 0
+        for day, data in zip(missing, fetch(missing)):
+            if data is None:
+                continue
+            rasters, _, _ = index_rasters(data, indices={name: INDEX_BANDS[name] for name in self.indices})
+            added += self.append(key, day, rasters, bbox=list(bbox), resolution=resolution)
+        return added
+
+    def _selection(self, key, start, end):
+        """Emplacements des dates de [start, end] en ordre chronologique"""
+        meta = self._meta(key)
+        if meta is None:
+            raise KeyError(f"Série inconnue : {key}")
+        stored = meta['dates']
+        order = sorted(range(len(stored)), key=stored.__getitem__)
+        start, end = (_day(start) if start else None), (_day(end) if end else None)
+        order = [slot for slot in order
+                 if (start is None or stored[slot] >= start) and (end is None or stored[slot] <= end)]
+        return order, [stored[slot] for slot in order]
+
+    def _slices(self, key, index, order):
+        """Rasters int16 bruts des emplacements demandés (chaque bloc mappé une fois)"""
+        chunk_dates = self._meta(key)['chunk_dates']
+        blocks = {}
+        for slot in order:
+            chunk, position = divmod(slot, chunk_dates)
+            if chunk not in blocks:
+                blocks[chunk] = np.load(self._chunk_path(key, index, chunk), mmap_mode='r')
+            yield blocks[chunk][position]
+
+    def _dir(self, key):
+        return os.path.join(self.directory, key)
+
+    def _chunk_path(self, key, index, chunk):
+        return os.path.join(self._dir(key), f'{index}_{chunk:05d}.npy')
+
+    def _meta(self, key):
+        path = os.path.join(self._dir(key), 'meta.json')
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_meta(self, key, meta):
+        path = os.path.join(self._dir(key), 'meta.json')
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(path + '.tmp', path)
+
+
+def quantize(raster):
+    """Indice float → int16 mis à l'échelle (NaN → NODATA)"""
+    raster = np.asarray(raster, dtype=np.float32)
+    out = np.full(raster.shape, NODATA, dtype=np.int16)
+    valid = ~np.isnan(raster)
+    out[valid] = np.rint(np.clip(raster[valid], -1.0, 1.0) * INDEX_SCALE)
+    return out
+
+
+def dequantize(raw):
+    """int16 mis à l'échelle → float32 (NODATA → NaN)"""
+    values = raw.astype(np.float32) / INDEX_SCALE
+    values[raw == NODATA] = np.nan
+    return values
+
+
+def _day(value):
+    """Date ISO (AAAA-MM-JJ)"""
+    if isinstance(value, (datetime, date)):
+        return value.strftime('%Y-%m-%d')
+    return str(value)[:10]
@@ -0,0 +1,412 @@
+"""
+Feralyx V2.0 - Moteur d'inférence compilé pour ensembles d'arbres
+Aplatit GradientBoostingRegressor / RandomForestRegressor en tableaux NumPy
+contigus et évalue tous les arbres d'un lot en une seule traversée
+"""
+
+from math import factorial
+
+import numpy as np
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor, HistGradientBoostingRegressor
+
+
+class CompiledTreeEnsemble:
+    """
+    Ensemble d'arbres aplati en tableaux contigus
+
+    Tous les nœuds de tous les arbres sont concaténés dans feature,
+    threshold, left, right et value ; roots donne l'index de la racine de
+    chaque arbre. Les feuilles pointent vers elles-mêmes, ce qui permet de
+    descendre tous les arbres en parallèle pendant max_depth itérations.
+
+    prediction = baseline + scale * somme(valeurs des feuilles atteintes)
+
+    input_dtype reproduit la précision de comparaison du modèle d'origine :
+    float32 pour les arbres sklearn classiques, float64 pour le boosting
+    par histogrammes (sans valeurs manquantes ni features catégorielles).
+
+    cover (optionnel) : nombre d'échantillons d'entraînement par nœud,
+    nécessaire aux explications shap_values().
+    """
+
+    ARRAY_FIELDS = ('feature', 'threshold', 'left', 'right', 'value', 'roots')
+
+    def __init__(self, feature, threshold, left, right, value, roots,
+                 baseline=0.0, scale=1.0, max_depth=0, n_features=0,
+                 input_dtype='float32', children=None, cover=None):
+        self.feature = np.ascontiguousarray(feature, dtype=np.intp)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        self.left = np.ascontiguousarray(left, dtype=np.intp)
+        self.right = np.ascontiguousarray(right, dtype=np.intp)
+        self.value = np.ascontiguousarray(value, dtype=np.float64)
+        self.roots = np.ascontiguousarray(roots, dtype=np.intp)
+        self.baseline = float(baseline)
+        self.scale = float(scale)
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.input_dtype = str(input_dtype)
+        # Enfants entrelacés [gauche, droite] : un seul gather par niveau
+        if children is None:
+            children = np.column_stack([self.left, self.right]).ravel()
+        self._children = np.ascontiguousarray(children, dtype=np.intp)
+        self.cover = None if cover is None else np.ascontiguousarray(cover, dtype=np.float64)
+        self._leaf_paths = None
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """
+        Exporte un modèle sklearn entraîné
+
+        Args:
+            model: GradientBoostingRegressor, RandomForestRegressor ou
+                   HistGradientBoostingRegressor
+
+        Returns:
+            CompiledTreeEnsemble équivalent à model.predict()
+        """
+        if isinstance(model, HistGradientBoostingRegressor):
+            return cls._from_hist_gradient_boosting(model)
+        if isinstance(model, GradientBoostingRegressor):
+            if model.init_ == 'zero':
+                baseline = 0.0
+            else:
+                baseline = float(np.ravel(model.init_.predict(np.zeros((1, model.n_features_in_))))[0])
+            scale = model.learning_rate
+            trees = [est.tree_ for est in model.estimators_[:, 0]]
+        elif isinstance(model, RandomForestRegressor):
+            baseline = 0.0
+            scale = 1.0 / len(model.estimators_)
+            trees = [est.tree_ for est in model.estimators_]
+        else:
+            raise TypeError(f"Modèle non supporté : {type(model).__name__}")
+
+        feature, threshold, left, right, value, roots, cover = [], [], [], [], [], [], []
+        offset = 0
+        for tree in trees:
+            n = tree.node_count
+            nodes = np.arange(offset, offset + n)
+            is_leaf = tree.children_left < 0
+
+            feature.append(np.where(is_leaf, 0, tree.feature))
+            # Feuilles : seuil +inf et enfants = soi-même (point fixe)
+            threshold.append(np.where(is_leaf, np.inf, tree.threshold))
+            left.append(np.where(is_leaf, nodes, tree.children_left + offset))
+            right.append(np.where(is_leaf, nodes, tree.children_right + offset))
+            value.append(tree.value[:, 0, 0])
+            cover.append(tree.weighted_n_node_samples)
+            roots.append(offset)
+            offset += n
+
+        return cls(
+            np.concatenate(feature), np.concatenate(threshold),
+            np.concatenate(left), np.concatenate(right),
+            np.concatenate(value), np.array(roots),
+            baseline=baseline, scale=scale,
+            max_depth=max(tree.max_depth for tree in trees),
+            n_features=model.n_features_in_,
+            cover=np.concatenate(cover)
+        )
+
+    @classmethod
+    def _from_hist_gradient_boosting(cls, model):
+        """Export d'un HistGradientBoostingRegressor (valeurs de feuilles déjà réduites)"""
+        feature, threshold, left, right, value, roots, cover = [], [], [], [], [], [], []
+        max_depth = 0
+        offset = 0
+        for predictors in model._predictors:
+            nodes = predictors[0].nodes
+            if nodes['is_categorical'].any():
+                raise TypeError("Features catégorielles non supportées")
+            n = len(nodes)
+            idx = np.arange(offset, offset + n)
+            is_leaf = nodes['is_leaf'].astype(bool)
+
+            feature.append(np.where(is_leaf, 0, nodes['feature_idx']))
+            threshold.append(np.where(is_leaf, np.inf, nodes['num_threshold']))
+            left.append(np.where(is_leaf, idx, nodes['left'].astype(np.intp) + offset))
+            right.append(np.where(is_leaf, idx, nodes['right'].astype(np.intp) + offset))
+            value.append(nodes['value'])
+            cover.append(nodes['count'])
+            roots.append(offset)
+            max_depth = max(max_depth, int(nodes['depth'].max()))
+            offset += n
+
+        return cls(
+            np.concatenate(feature), np.concatenate(threshold),
+            np.concatenate(left), np.concatenate(right),
+            np.concatenate(value), np.array(roots),
+            baseline=float(np.ravel(model._baseline_prediction)[0]), scale=1.0,
+            max_depth=max_depth, n_features=model.n_features_in_,
+            input_dtype='float64', cover=np.concatenate(cover)
+        )
+
+    def predict(self, X, batch_size=2048):
+        """
+        Prédit un lot (ou une seule ligne) de features normalisées
+
+        Args:
+            X: tableau (n, n_features) ou (n_features,)
+            batch_size: nombre de lignes traversées simultanément
+                        (mémoire ~ batch_size x n_trees index)
+
+        Returns:
+            np.ndarray (n,)
+        """
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X[np.newaxis, :]
+        # Même arrondi que le modèle d'origine (float32 pour les arbres sklearn)
+        X = X.astype(self.input_dtype).astype(np.float64)
+
+        n = X.shape[0]
+        out = np.empty(n, dtype=np.float64)
+        for start in range(0, n, batch_size):
+            stop = min(start + batch_size, n)
+            out[start:stop] = self._predict_block(X[start:stop])
+        return out
+
+    def _predict_block(self, X):
+        """Descend tous les arbres pour toutes les lignes du bloc"""
+        n = X.shape[0]
+        X_flat = X.ravel()
+        row_offset = (np.arange(n, dtype=np.intp) * X.shape[1])[:, np.newaxis]
+        node = np.broadcast_to(self.roots, (n, self.n_trees)).copy()
+        for _ in range(self.max_depth):
+            go_right = X_flat.take(row_offset + self.feature.take(node)) > self.threshold.take(node)
+            node = self._children.take(2 * node + go_right)
+        return self.baseline + self.scale * self.value.take(node).sum(axis=1)
+
+    def shap_values(self, X, max_block_elements=1 << 22):
+        """
+        Contributions SHAP exactes (TreeSHAP « path-dependent ») par lot
+
+        Pour une feuille dont le chemin teste les features j (regroupées si
+        répétées), chaque ligne x ne diffère que par le motif o_j ∈ {0, 1}
+        « x satisfait toutes les conditions sur j » ; z_j est la part des
+        échantillons d'entraînement qui suit le chemin sur j. La
+        contribution de la feuille à la feature i vaut alors
+
+            v * (o_i - z_i) * Σ_k w(k, m) [t^k] Π_{j≠i} (o_j t + z_j)
+
+
+        avec w(k, m) = k! (m-k-1)! / m!. Elle ne dépend que du couple
+        (feuille, motif) : chaque couple distinct du lot est calculé une
+        seule fois, vectorisé sur tous les couples d'un arbre (arbre par
+        arbre : les tableaux d'un arbre restent en cache).
+
+        Args:
+            X: tableau (n, n_features) (ou une ligne) de features normalisées
+            max_block_elements: taille max des tableaux intermédiaires
+                                (conditions des chemins x lignes)
+
+        Returns:
+            (contributions (n, n_features), valeur de base) :
+            base + contributions.sum(axis=1) == predict(X)
+        """
+        if self.cover is None:
+            raise ValueError("Couverture des nœuds absente : recompilez avec from_sklearn()")
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X[np.newaxis, :]
+        X = X.astype(self.input_dtype).astype(np.float64)
+
+        if self._leaf_paths is None:
+            self._leaf_paths = [self._tree_leaf_paths(root) for root in self.roots]
+
+        n = X.shape[0]
+        X_t = np.ascontiguousarray(X.T)
+        contributions = np.zeros((n, self.n_features))
+        expected = 0.0
+        for paths in self._leaf_paths:
+            expected += paths['expected']
+            # Tableaux (conditions x lignes) dans _tree_shap_block
+            block = max(1, max_block_elements // max(1, len(paths['cond_feature'])))
+            for start in range(0, n, block):
+                stop = min(start + block, n)
+                contributions[start:stop] += self._tree_shap_block(paths, X_t[:, start:stop])
+        return self.scale * contributions, self.baseline + self.scale * expected
+
+    def _tree_leaf_paths(self, root):
+        """Chemins racine → feuille d'un arbre, conditions regroupées par feature"""
+        leaves = []
+        stack = [(root, [])]
+        while stack:
+            node, path = stack.pop()
+            if self.left[node] == node:
+                leaves.append((node, path))
+                continue
+            parent_cover = self.cover[node]
+            for child, goes_left in ((self.left[node], True), (self.right[node], False)):
+                step = (self.feature[node], self.threshold[node], goes_left,
+                        self.cover[child] / parent_cover)
+                stack.append((child, path + [step]))
+
+        n_leaves = len(leaves)
+        slots_per_leaf = [sorted({step[0] for step in path}) for _, path in leaves]
+        n_slots = max(1, max(len(slots) for slots in slots_per_leaf))
+
+        slot_feature = np.full((n_leaves, n_slots), self.n_features, dtype=np.intp)
+        zero_fraction = np.ones((n_leaves, n_slots))
+        cond_feature, cond_threshold, cond_left, cond_slot = [], [], [], []
+        for l, ((_, path), slots) in enumerate(zip(leaves, slots_per_leaf)):
+            position = {f: k for k, f in enumerate(slots)}
+            slot_feature[l, :len(slots)] = slots
+            for f, threshold, goes_left, ratio in path:
+                k = position[f]
+                zero_fraction[l, k] *= ratio
+                cond_feature.append(f)
+                cond_threshold.append(threshold)
+                cond_left.append(goes_left)
+                cond_slot.append(l * n_slots + k)
+
+        # Conditions triées par emplacement (feuille, feature) pour reduceat
+        order = np.argsort(cond_slot, kind='stable')
+        cond_slot = np.asarray(cond_slot, dtype=np.intp)[order]
+        slot_ids, slot_starts = np.unique(cond_slot, return_index=True)
+
+        leaf_nodes = np.array([node for node, _ in leaves], dtype=np.intp)
+        value = self.value[leaf_nodes]
+        n_used = np.array([len(slots) for slots in slots_per_leaf], dtype=np.intp)
+        # Clé (feuille, motif) = key_offset[feuille] + motif, motif < 2**n_used
+        key_offset = np.concatenate([[0], np.cumsum(1 << n_used.astype(np.int64))])
+        return {
+            'value': value,
+            'expected': float(np.dot(value, self.cover[leaf_nodes]) / self.cover[root]),
+            'n_used': n_used,
+            'slot_feature': slot_feature,
+            'zero_fraction': zero_fraction,
+            'cond_feature': np.asarray(cond_feature, dtype=np.intp)[order],
+            'cond_threshold': np.asarray(cond_threshold, dtype=np.float64)[order, np.newaxis],
+            'cond_left': np.asarray(cond_left, dtype=bool)[order, np.newaxis],
+            'slot_starts': slot_starts,
+            'slot_bit': (1 << (slot_ids % n_slots)).astype(np.int64)[:, np.newaxis],
+            'leaf_starts': np.flatnonzero(np.diff(slot_ids // n_slots, prepend=-1)),
+            'key_offset': key_offset
+        }
+
+    def _tree_shap_block(self, paths, X_t):
+        """Contributions (n, n_features) d'un arbre ; X_t = bloc transposé (n_features, n)"""
+        n = X_t.shape[1]
+        if not len(paths['cond_feature']):
+            return np.zeros((n, self.n_features))
+
+        # Motif par (feuille, ligne) : bit k = la ligne satisfait toutes les
+        # conditions du chemin portant sur sa k-ième feature
+        x = X_t[paths['cond_feature']]
+        threshold = paths['cond_threshold']
+        satisfied = np.where(paths['cond_left'], x <= threshold, x > threshold)
+        slot_satisfied = np.logical_and.reduceat(satisfied, paths['slot_starts'], axis=0)
+        pattern = np.add.reduceat(slot_satisfied * paths['slot_bit'], paths['leaf_starts'], axis=0)
+
+        # Couples (feuille, motif) distincts, sans tri si l'espace des clés est petit
+        key_offset = paths['key_offset']
+        keys = pattern + key_offset[:-1, np.newaxis]
+        if key_offset[-1] <= 8 * keys.size:
+            present = np.zeros(key_offset[-1], dtype=bool)
+            present[keys.ravel()] = True
+            unique_keys = np.flatnonzero(present)
+            inverse = (np.cumsum(present) - 1)[keys]
+        else:
+            unique_keys, inverse = np.unique(keys, return_inverse=True)
+            inverse = inverse.reshape(keys.shape)
+
+        leaf = np.searchsorted(key_offset, unique_keys, side='right') - 1
+        patterns = unique_keys - key_offset[leaf]
+        n_used = paths['n_used'][leaf]
+        phi_features = np.zeros((len(unique_keys), self.n_features + 1))
+        # Regroupement par nombre de features du chemin : boucles en m²
+        for m in np.unique(n_used):
+            rows = np.flatnonzero(n_used == m)
+            group_leaf = leaf[rows]
+            o = ((patterns[rows, np.newaxis] >> np.arange(m)) & 1).astype(np.float64)
+            phi = _leaf_shap(o, paths['zero_fraction'][group_leaf, :m], paths['value'][group_leaf])
+            phi_features[rows[:, np.newaxis], paths['slot_feature'][group_leaf, :m]] = phi
+        # Colonne n_features = remplissage
+        return phi_features[inverse].sum(axis=0)[:, :self.n_features]
+
+    def to_arrays(self):
+        """Tableaux et métadonnées pour sérialisation"""
+        arrays = {name: getattr(self, name) for name in self.ARRAY_FIELDS}
+        arrays['children'] = self._children
+        if self.cover is not None:
+            arrays['cover'] = self.cover
+        meta = {
+            'baseline': self.baseline,
+            'scale': self.scale,
+            'max_depth': self.max_depth,
+            'n_features': self.n_features,
+            'input_dtype': self.input_dtype
+        }
+        return arrays, meta
+
+    @classmethod
+    def from_arrays(cls, arrays, meta):
+        """Reconstruit l'ensemble à partir de to_arrays()"""
+        return cls(*(arrays[name] for name in cls.ARRAY_FIELDS),
+                   children=arrays.get('children'), cover=arrays.get('cover'), **meta)
+
+    def save(self, path):
+        """Sauvegarde au format .npz"""
+        arrays, meta = self.to_arrays()
+        np.savez(path, **arrays, **{k: np.array(v) for k, v in meta.items()})
+
+    @classmethod
+    def load(cls, path):
+        """Charge un fichier écrit par save()"""
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in cls.ARRAY_FIELDS + ('children', 'cover')
+                      if name in data}
+            meta = {
+                'baseline': float(data['baseline']),
+                'scale': float(data['scale']),
+                'max_depth': int(data['max_depth']),
+                'n_features': int(data['n_features']),
+                'input_dtype': str(data['input_dtype'])
+            }
+        return cls.from_arrays(arrays, meta)
+
+
+def _shapley_weights(max_features):
+    """w[m, k] = k! (m-k-1)! / m! (0 si k >= m)"""
+    weights = np.zeros((max_features + 1, max_features + 1))
+    for m in range(1, max_features + 1):
+        for k in range(m):
+            weights[m, k] = factorial(k) * factorial(m - k - 1) / factorial(m)
+    return weights
+
+
+def _leaf_shap(o, z, value):
+    """
+    Contributions d'une feuille pour des motifs o (k, m) et fractions z (k, m)
+
+    P(t) = Π_j (o_j t + z_j) est calculé une fois, puis chaque facteur i en
+    est retiré par division : synthétique par (t + z_i) si o_i = 1, par z_i
+    sinon (même principe que « unwind » dans TreeSHAP).
+    """
+    k, m = o.shape
+    weights = _shapley_weights(m)[m]
+    poly = np.zeros((k, m + 1))
+    poly[:, 0] = 1.0
+    for j in range(m):
+        shifted = np.zeros_like(poly)
+        shifted[:, 1:] = poly[:, :-1] * o[:, j:j + 1]
+        poly = poly * z[:, j:j + 1] + shifted
+
+    # Division synthétique par (t + z_i) pour tous les i à la fois : seule
+    # Σ_d q_d w_d sert, accumulée du degré m - 1 au degré 0
+    quotient = np.zeros((k, m))
+    divided = np.zeros((k, m))
+    for degree in range(m, 0, -1):
+        quotient = poly[:, degree:degree + 1] - z * quotient
+        divided += quotient * weights[degree - 1]
+    reduced = np.where(o > 0, divided, (poly @ weights)[:, np.newaxis] / z)
+    phi = (o - z) * reduced
+    return phi * value[:, np.newaxis]